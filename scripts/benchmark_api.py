@@ -0,0 +1,216 @@
+# benchmark_api.py
+#
+# Service-level benchmarks (processes, memory, HTTP throughput).
+# Run from the repo root, e.g.:
+#   python -m scripts.benchmark_api prefork --workers 1 2 4
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import httpx
+import numpy as np
+
+from scripts.benchmark_emotion import load_texts
+
+# --- Config ---
+HOST = "127.0.0.1"
+PORT = 8765
+# Every request must reach the model, so the prediction cache is turned off
+SERVER_ENV = {"EMOTION_CACHE_SIZE": "0"}
+
+# --- Process helpers ---
+def start_server(cmd: List[str], ready_url: str, env: dict = None, timeout: float = 300) -> subprocess.Popen:
+    proc = subprocess.Popen(cmd, env={**os.environ, **SERVER_ENV, **(env or {})})
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with {proc.returncode}: {' '.join(cmd)}")
+        try:
+            if httpx.get(ready_url, timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise TimeoutError(f"Server not ready after {timeout}s: {' '.join(cmd)}")
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def descendants(pid: int) -> List[int]:
+    children = []
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        children += [int(c) for c in (task / "children").read_text().split()]
+    return children + [d for c in children for d in descendants(c)]
+
+def memory_mb(pid: int) -> dict:
+    """Rss, Pss and USS (private pages) of one process, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":", 1)
+        fields[key] = int(value.split()[0]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+# --- Load generator ---
+def http_load(url: str, texts: List[str], concurrency: int, seconds: float):
+    latencies, errors = [], [0]
+    stop_at = time.monotonic() + seconds
+
+    def client(worker_id: int):
+        with httpx.Client(timeout=60) as c:
+            i = worker_id
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                r = c.post(url, json={"text": texts[i % len(texts)]})
+                if r.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors[0] += 1
+                i += concurrency
+
+    threads = [threading.Thread(target=client, args=(w,)) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return len(latencies) / seconds, np.percentile(lat_ms, 50), np.percentile(lat_ms, 99), errors[0]
+
+# --- Benchmarks ---
+def bench_prefork(args):
+    texts = load_texts()
+    base = f"http://{HOST}:{PORT}"
+    layouts = {
+        "prefork": lambda w: [sys.executable, "-m", "src.api.serve_prefork", "--host", HOST, "--port", str(PORT),
+                              "--workers", str(w), "--log-level", "warning"],
+        "uvicorn": lambda w: [sys.executable, "-m", "uvicorn", "src.api.emotion_api:app", "--host", HOST,
+                              "--port", str(PORT), "--workers", str(w), "--log-level", "warning"],
+    }
+    print(f"{'layout':<9}{'workers':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'PSS MB':>9}{'PSS/wkr':>9}{'USS/wkr':>9}")
+    for layout in args.layouts:
+        for workers in args.workers:
+            proc = start_server(layouts[layout](workers), f"{base}/readyz")
+            try:
+                throughput, p50, p99, errors = http_load(f"{base}/predict_emotions", texts, args.concurrency, args.seconds)
+                workers_pids = [p for p in descendants(proc.pid) if Path(f"/proc/{p}").exists()]
+                # Whole tree: the pre-fork parent holds the shared weights too
+                mem = [memory_mb(p) for p in [proc.pid] + workers_pids]
+            finally:
+                stop_server(proc)
+            total_pss = sum(m["pss"] for m in mem)
+            uss = np.mean([m["uss"] for m in mem[1:]]) if len(mem) > 1 else mem[0]["uss"]
+            print(f"{layout:<9}{workers:>8}{throughput:>9.1f}{p50:>9.1f}{p99:>9.1f}{total_pss:>9.0f}"
+                  f"{total_pss / workers:>9.0f}{uss:>9.0f}" + (f"  ({errors} errors)" if errors else ""))
+
+def wait_for(url: str, start: float, proc: subprocess.Popen, timeout: float = 300) -> float:
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(url)
+
+def import_seconds(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    return float(subprocess.check_output([sys.executable, "-c", code], env={**os.environ, **SERVER_ENV}).split()[-1])
+
+def bench_startup(args):
+    base = f"http://{HOST}:{PORT}"
+    print(f"{'module':<38}{'import s':>10}{'healthz s':>11}{'readyz s':>10}")
+    for module in args.modules:
+        imported = import_seconds(module)
+        if module not in args.apps:
+            print(f"{module:<38}{imported:>10.2f}{'-':>11}{'-':>10}")
+            continue
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", f"{module}:app", "--host", HOST, "--port", str(PORT), "--log-level", "warning"],
+            env={**os.environ, **SERVER_ENV},
+        )
+        try:
+            healthy = wait_for(f"{base}/healthz", start, proc)
+            ready = wait_for(f"{base}/readyz", start, proc)
+        finally:
+            stop_server(proc)
+        print(f"{module:<38}{imported:>10.2f}{healthy:>11.2f}{ready:>10.2f}")
+
+# The four single-service apps vs one process mounting them all as routers
+SERVICE_APPS = [
+    ("src.api.emotion_api:app", "/readyz"),
+    ("src.api.generate_prompt_api:app", "/readyz"),
+    ("src.api.generate_summary_api:app", "/readyz"),
+    ("src.api.main:journal_app", "/openapi.json"),
+]
+COMBINED_APP = ("src.api.main:app", "/readyz")
+
+def uvicorn_cmd(app: str, port: int) -> List[str]:
+    return [sys.executable, "-m", "uvicorn", app, "--host", HOST, "--port", str(port), "--log-level", "warning"]
+
+def bench_consolidated(args):
+    texts = load_texts()
+    # Clients are only constructed here, never called; summaries and prompts are not exercised
+    env = {"OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "unused-by-benchmark")}
+    layouts = {"split": SERVICE_APPS, "combined": [COMBINED_APP]}
+    print(f"{'layout':<10}{'procs':>6}{'ready s':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'PSS MB':>9}")
+    for layout in args.layouts:
+        procs = []
+        start = time.perf_counter()
+        try:
+            for i, (app, ready_path) in enumerate(layouts[layout]):
+                procs.append(start_server(uvicorn_cmd(app, PORT + i), f"http://{HOST}:{PORT + i}{ready_path}", env))
+            ready = time.perf_counter() - start
+            # The emotion service is first in both layouts
+            throughput, p50, p99, errors = http_load(
+                f"http://{HOST}:{PORT}/predict_emotions", texts, args.concurrency, args.seconds
+            )
+            mem = [memory_mb(p.pid) for p in procs]
+        finally:
+            for proc in procs:
+                stop_server(proc)
+        print(f"{layout:<10}{len(procs):>6}{ready:>9.1f}{throughput:>9.1f}{p50:>9.1f}{p99:>9.1f}"
+              f"{sum(m['rss'] for m in mem):>9.0f}{sum(m['pss'] for m in mem):>9.0f}"
+              + (f"  ({errors} errors)" if errors else ""))
+
+# --- CLI Entry Point ---
+def main():
+    parser = argparse.ArgumentParser(description="Service-level benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prefork = subparsers.add_parser("prefork", help="Memory per worker and throughput vs workers")
+    prefork.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to try")
+    prefork.add_argument("--layouts", nargs="+", default=["prefork", "uvicorn"], choices=["prefork", "uvicorn"])
+    prefork.add_argument("--concurrency", type=int, default=16, help="Concurrent HTTP clients")
+    prefork.add_argument("--seconds", type=float, default=15, help="Load duration per configuration")
+    prefork.set_defaults(func=bench_prefork)
+
+    apps = ["src.api.emotion_api", "src.api.generate_summary_api"]
+    startup = subparsers.add_parser("startup", help="Import time and time-to-healthy/ready per app")
+    startup.add_argument("--modules", nargs="+", default=apps + ["src.evaluation.evaluate_reframes"])
+    startup.add_argument("--apps", nargs="+", default=apps, help="Modules that expose a FastAPI `app`")
+    startup.set_defaults(func=bench_startup)
+
+    consolidated = subparsers.add_parser("consolidated", help="Four single-service processes vs one combined app")
+    consolidated.add_argument("--layouts", nargs="+", default=["split", "combined"], choices=["split", "combined"])
+    consolidated.add_argument("--concurrency", type=int, default=8, help="Concurrent HTTP clients")
+    consolidated.add_argument("--seconds", type=float, default=10, help="Load duration per layout")
+    consolidated.set_defaults(func=bench_consolidated)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
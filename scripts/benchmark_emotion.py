@@ -0,0 +1,204 @@
+# benchmark_emotion.py
+#
+# Latency/throughput benchmarks for the emotion classifier.
+# Run from the repo root, e.g.:
+#   python -m scripts.benchmark_emotion batching --concurrency 16 --requests 50
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+
+# --- Config ---
+DATA_PATH = Path("data/interim/journals.jsonl")
+FALLBACK_DATA_PATH = Path("data/metadata/journals.jsonl")
+
+# --- Load benchmark texts ---
+def load_texts(limit: int = 1000) -> List[str]:
+    path = DATA_PATH if DATA_PATH.exists() else FALLBACK_DATA_PATH
+    texts = []
+    with open(path, "r") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("entry"):
+                texts.append(row["entry"])
+            if len(texts) >= limit:
+                break
+    return texts
+
+def summarize_latencies(name: str, latencies: List[float], wall: float):
+    lat_ms = np.array(latencies) * 1000
+    print(
+        f"{name:<16} n={len(lat_ms):<6} throughput={len(lat_ms) / wall:8.1f} req/s  "
+        f"p50={np.percentile(lat_ms, 50):7.1f} ms  p99={np.percentile(lat_ms, 99):7.1f} ms"
+    )
+
+# --- Closed-loop load generator ---
+def run_concurrent(fn: Callable[[str], object], texts: List[str], concurrency: int, requests: int):
+    def client(worker_id: int):
+        latencies = []
+        for i in range(requests):
+            text = texts[(worker_id * requests + i) % len(texts)]
+            start = time.perf_counter()
+            fn(text)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - start
+    return [lat for worker in results for lat in worker], wall
+
+def time_calls(fn: Callable[[], object], repeats: int) -> List[float]:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+# --- Benchmarks ---
+def bench_batching(args):
+    from src.api import emotion_api
+
+    emotion_api.readiness.run()
+    texts = load_texts()
+    if emotion_api.batcher is None:
+        raise SystemExit("Set EMOTION_MICRO_BATCHING=1 to compare against the batched path")
+    emotion_api.cache = None  # repeated texts would otherwise be served from the cache
+
+    # Warm up both paths
+    emotion_api.predict_probabilities(texts[:1])
+    emotion_api.predict_emotions(texts[0])
+
+    def per_request(text):
+        return emotion_api.labels_above(emotion_api.predict_probabilities([text])[0], 0.5)
+
+    latencies, wall = run_concurrent(per_request, texts, args.concurrency, args.requests)
+    summarize_latencies("per-request", latencies, wall)
+
+    latencies, wall = run_concurrent(emotion_api.predict_emotions, texts, args.concurrency, args.requests)
+    summarize_latencies("micro-batched", latencies, wall)
+    print(f"batcher stats: {emotion_api.batcher.stats()}")
+
+def bench_backends(args):
+    from src.models.emotion_backends import load_backend
+
+    texts = load_texts()
+    batch = texts[:args.batch_size]
+    for name in args.backends:
+        backend = load_backend(name)
+        backend.predict_proba(texts[:1])  # warm-up
+
+        single = iter(texts * (args.requests // len(texts) + 1))
+        latencies = time_calls(lambda: backend.predict_proba([next(single)]), args.requests)
+        summarize_latencies(f"{name} x1", latencies, sum(latencies))
+
+        latencies = time_calls(lambda: backend.predict_proba(batch), args.repeats)
+        summarize_latencies(f"{name} x{len(batch)}", latencies, sum(latencies))
+
+def make_long_texts(texts: List[str], n: int, words: int) -> List[str]:
+    pool = " ".join(texts).split()
+    return [" ".join(pool[(i * 37 + j) % len(pool)] for j in range(words)) for i in range(n)]
+
+def bench_chunking(args):
+    from src.models.emotion_backends import load_backend
+
+    backend = load_backend()
+    texts = make_long_texts(load_texts(), args.entries, args.words)
+    tokens = [len(ids) for ids in backend.tokenizer(texts)["input_ids"]]
+    print(f"{len(texts)} entries, mean {np.mean(tokens):.0f} tokens (model window {backend.tokenizer.model_max_length})")
+
+    def truncating():
+        for i in range(0, len(texts), args.batch_size):
+            backend.predict_proba(texts[i:i + args.batch_size])
+
+    backend.predict_proba(texts[:1])  # warm-up
+    for name, fn in [
+        ("truncate", truncating),
+        ("windows-max", lambda: backend.predict_proba_windows(texts, "max", args.stride, args.batch_size)),
+        ("windows-mean", lambda: backend.predict_proba_windows(texts, "mean", args.stride, args.batch_size)),
+    ]:
+        seconds = min(time_calls(fn, args.repeats))
+        print(f"{name:<14} {len(texts) / seconds:8.1f} entries/s  {sum(tokens) / seconds:10.0f} tokens/s")
+
+def make_mixed_texts(texts: List[str], n: int, seed: int = 0) -> List[str]:
+    # Journal lengths are long-tailed: mostly a few sentences, occasionally pages
+    rng = np.random.default_rng(seed)
+    pool = " ".join(texts).split()
+    words = np.clip(rng.lognormal(mean=np.log(40), sigma=1.0, size=n), 3, 1500).astype(int)
+    starts = rng.integers(0, len(pool), size=n)
+    return [" ".join(pool[(s + j) % len(pool)] for j in range(w)) for s, w in zip(starts, words)]
+
+def bench_padding(args):
+    from src.models.emotion_backends import load_backend, sigmoid
+    from src.models.token_batching import padding_stats, plan_batches
+
+    backend = load_backend()
+    tokenizer = backend.tokenizer
+    texts = make_mixed_texts(load_texts(), args.entries)
+    lengths = [len(ids) for ids in tokenizer(texts, truncation=True)["input_ids"]]
+    print(f"{len(texts)} entries, tokens p50={np.percentile(lengths, 50):.0f} "
+          f"p95={np.percentile(lengths, 95):.0f} max={max(lengths)}")
+
+    fixed = [list(range(i, min(i + args.batch_size, len(texts)))) for i in range(0, len(texts), args.batch_size)]
+    budgeted = plan_batches(lengths, args.max_tokens, args.batch_size)
+
+    def fixed_batches():
+        # The old call-site pattern: arrival order, each batch padded to its longest text
+        for batch in fixed:
+            inputs = tokenizer([texts[i] for i in batch], return_tensors="np", truncation=True, padding=True)
+            sigmoid(backend.forward(inputs))
+
+    def budgeted_batches():
+        backend.predict_proba(texts, args.batch_size, args.max_tokens)
+
+    backend.predict_proba(texts[:1])  # warm-up
+    for name, batches, fn in [("fixed", fixed, fixed_batches), ("token-budget", budgeted, budgeted_batches)]:
+        stats = padding_stats(lengths, batches)
+        seconds = min(time_calls(fn, args.repeats))
+        print(f"{name:<14} batches={stats['batches']:<5} padded_tokens={stats['padded_tokens']:<8} "
+              f"waste={stats['padding_waste']:6.1%}  {len(texts) / seconds:8.1f} entries/s")
+
+# --- CLI Entry Point ---
+def main():
+    parser = argparse.ArgumentParser(description="Emotion classifier benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batching = subparsers.add_parser("batching", help="Per-request vs micro-batched inference under concurrency")
+    batching.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    batching.add_argument("--requests", type=int, default=50, help="Requests per client")
+    batching.set_defaults(func=bench_batching)
+
+    backends = subparsers.add_parser("backends", help="CPU latency of torch vs onnxruntime backends")
+    backends.add_argument("--backends", nargs="+", default=["torch", "onnxruntime"], help="Backends to compare")
+    backends.add_argument("--requests", type=int, default=200, help="Single-text calls per backend")
+    backends.add_argument("--batch-size", type=int, default=32, help="Texts per batched call")
+    backends.add_argument("--repeats", type=int, default=20, help="Batched calls per backend")
+    backends.set_defaults(func=bench_backends)
+
+    chunking = subparsers.add_parser("chunking", help="Sliding-window vs truncating inference on long entries")
+    chunking.add_argument("--entries", type=int, default=64, help="Number of synthetic long entries")
+    chunking.add_argument("--words", type=int, default=1500, help="Words per entry")
+    chunking.add_argument("--stride", type=int, default=128, help="Tokens shared by consecutive windows")
+    chunking.add_argument("--batch-size", type=int, default=32, help="Windows per forward pass")
+    chunking.add_argument("--repeats", type=int, default=3, help="Best-of repeats")
+    chunking.set_defaults(func=bench_chunking)
+
+    padding = subparsers.add_parser("padding", help="Padding waste of fixed-size vs token-budgeted batches")
+    padding.add_argument("--entries", type=int, default=512, help="Synthetic entries with long-tailed lengths")
+    padding.add_argument("--batch-size", type=int, default=32, help="Max texts per forward pass")
+    padding.add_argument("--max-tokens", type=int, default=8192, help="Padded-token budget per forward pass")
+    padding.add_argument("--repeats", type=int, default=3, help="Best-of repeats")
+    padding.set_defaults(func=bench_padding)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,602 @@
+# benchmark_retrieval.py
+#
+# Latency benchmarks for journal retrieval (embedding + FAISS search).
+# Run from the repo root, e.g.:
+#   python -m scripts.benchmark_retrieval warm --queries 200
+#   python -m scripts.benchmark_retrieval partition --vectors 100000 1000000 --users 1000 50000
+#   python -m scripts.benchmark_retrieval metadata --rows 1000000 10000000
+#   python -m scripts.benchmark_retrieval embed-scaling --texts 20000
+#   python -m scripts.benchmark_retrieval storage --corpus synthetic --vectors 1000000
+#   python -m scripts.benchmark_retrieval ann --corpus synthetic --vectors 10000000 --types ivf-pq hnsw
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from scripts.benchmark_emotion import DATA_PATH, FALLBACK_DATA_PATH, run_concurrent, summarize_latencies, time_calls
+
+# --- Index fixture ---
+def load_entries(limit: int = 0) -> List[dict]:
+    from src.rag.build_faiss_index import load_journal_entries
+
+    entries = load_journal_entries(DATA_PATH if DATA_PATH.exists() else FALLBACK_DATA_PATH)
+    return entries[:limit] if limit else entries
+
+def build_temp_index(entries: List[dict], index_dir: Path):
+    from src.rag.build_faiss_index import build_faiss_index, embed_entries, save_index
+
+    embeddings = np.asarray(embed_entries(entries), dtype=np.float32)
+    save_index(build_faiss_index(embeddings), entries, index_dir)
+
+def synthetic_corpus(n_vectors: int, n_users: int, dim: int, seed: int = 0):
+    """Random vectors with Zipf-skewed history sizes: a few heavy users, a long tail of light ones."""
+    import faiss
+
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, n_users + 1) ** 0.8
+    owners = rng.choice(n_users, size=n_vectors, p=weights / weights.sum())
+    index = faiss.IndexFlatL2(dim)
+    for start in range(0, n_vectors, 100_000):  # add in chunks to bound peak memory
+        index.add(rng.standard_normal((min(100_000, n_vectors - start), dim), dtype=np.float32))
+    metadata = [{"user_id": f"user_{u}"} for u in owners]
+    return index, metadata
+
+def clustered_chunks(n_vectors: int, dim: int, seed: int = 0, chunk: int = 100_000, n_clusters: int = 1000):
+    """Reproducible Gaussian-mixture vectors, yielded in chunks so 10M-vector corpora never sit in memory twice.
+
+    Pure noise has no neighbourhood structure for an ANN index to exploit, so
+    points are drawn around random centres, which is closer to real embeddings.
+    """
+    centres = np.random.default_rng(seed).standard_normal((n_clusters, dim), dtype=np.float32)
+    for i, start in enumerate(range(0, n_vectors, chunk)):
+        rng = np.random.default_rng([seed, i])
+        size = min(chunk, n_vectors - start)
+        yield centres[rng.integers(n_clusters, size=size)] + 0.5 * rng.standard_normal((size, dim), dtype=np.float32)
+
+def exact_neighbours(chunks, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground-truth ids by brute force over the chunks, without holding a flat copy of the corpus."""
+    import faiss
+
+    heap = faiss.ResultHeap(len(queries), k)
+    offset = 0
+    for vectors in chunks:
+        distances, ids = faiss.knn(queries, vectors, min(k, len(vectors)))
+        heap.add_result(distances, np.where(ids >= 0, ids + offset, -1))
+        offset += len(vectors)
+    heap.finalize()
+    return heap.I
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    k = expected.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(e)) / k for f, e in zip(found, expected)]))
+
+# --- Benchmarks ---
+def bench_warm(args):
+    from src.models.registry import EMBED_MODEL, registry
+    from src.rag.retrieve_user_history import Retriever
+
+    entries = load_entries(args.entries)
+    queries = [e["entry"] for e in entries]
+    users = [e["user_id"] for e in entries]
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = Path(tmp)
+        build_temp_index(entries, index_dir)
+        paths = (index_dir / "journal_index.faiss", index_dir / "journal_metadata.cols")
+        print(f"{len(entries)} indexed entries")
+
+        # Cold: what every call used to pay, i.e. model construction plus reading the index files
+        def cold():
+            registry.unload("sentence-transformer", EMBED_MODEL)
+            Retriever(*paths).search(queries[0], users[0])
+
+        latencies = time_calls(cold, args.cold_repeats)
+        summarize_latencies("cold", latencies, sum(latencies))
+
+        retriever = Retriever(*paths)
+        retriever.search(queries[0], users[0])  # load once
+        it = iter(range(10**9))
+
+        def warm():
+            i = next(it) % len(queries)
+            retriever.search(queries[i], users[i])
+
+        latencies = time_calls(warm, args.queries)
+        summarize_latencies("warm", latencies, sum(latencies))
+
+        latencies, wall = run_concurrent(lambda q: retriever.search(q), queries, args.concurrency,
+                                         args.queries // args.concurrency)
+        summarize_latencies(f"warm x{args.concurrency}", latencies, wall)
+
+        # Hot reload: rewrite the files and check queries keep flowing while the new snapshot loads
+        build_temp_index(entries, index_dir)
+        retriever.reload_check_seconds = 0
+        latencies = time_calls(warm, args.queries)
+        summarize_latencies("during reload", latencies, sum(latencies))
+        time.sleep(0.5)
+        print(f"retriever stats: {retriever.stats()}")
+
+def bench_partition(args):
+    from src.rag.retrieve_user_history import IndexSnapshot
+
+    print(f"{'vectors':>10}{'users':>8}{'hist p50':>9}{'hist max':>9}"
+          f"{'filter p50':>12}{'filter full':>12}{'part p50':>10}{'part p99':>10}{'part full':>10}{'build s':>9}")
+    for n_vectors in args.vectors:
+        for n_users in args.users:
+            index, metadata = synthetic_corpus(n_vectors, n_users, args.dim)
+            start = time.perf_counter()
+            snapshot = IndexSnapshot(index, metadata)
+            build_seconds = time.perf_counter() - start
+
+            rng = np.random.default_rng(1)
+            # Query users drawn like entries are, so heavy users are queried more often
+            users = [metadata[i]["user_id"] for i in rng.integers(n_vectors, size=args.queries)]
+            queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+            expected = [min(args.top_k, len(snapshot.metadata.user_rows(u))) for u in users]
+
+            # Before: global search for top_k * 2 neighbours, then keep the user's rows
+            filter_lat, filter_full = [], 0
+            for q, user, want in zip(queries, users, expected):
+                t = time.perf_counter()
+                _, ids = index.search(q[None], args.top_k * 2)
+                hits = [i for i in ids[0] if i >= 0 and metadata[i]["user_id"] == user][:args.top_k]
+                filter_lat.append(time.perf_counter() - t)
+                filter_full += len(hits) == want
+
+            part_lat, part_full = [], 0
+            for q, user, want in zip(queries, users, expected):
+                t = time.perf_counter()
+                hits = snapshot.search(q, user, args.top_k)
+                part_lat.append(time.perf_counter() - t)
+                part_full += len(hits) == want
+
+            sizes = snapshot.metadata.user_counts()
+            filter_ms, part_ms = np.array(filter_lat) * 1000, np.array(part_lat) * 1000
+            print(
+                f"{n_vectors:>10}{n_users:>8}{int(np.median(sizes)):>9}{sizes.max():>9}"
+                f"{np.percentile(filter_ms, 50):>10.2f}ms{filter_full / args.queries:>12.1%}"
+                f"{np.percentile(part_ms, 50):>8.2f}ms{np.percentile(part_ms, 99):>8.2f}ms"
+                f"{part_full / args.queries:>10.1%}{build_seconds:>9.2f}"
+            )
+            del index, metadata, snapshot
+
+def bench_delta(args):
+    from src.rag.build_faiss_index import save_index
+    from src.rag.incremental_index import IncrementalIndex
+    from src.rag.retrieve_user_history import IndexSnapshot, Retriever, load_index_and_metadata
+
+    index, metadata = synthetic_corpus(args.vectors, args.users, args.dim)
+    for i, row in enumerate(metadata):
+        row.update(id=f"base-{i}", entry=f"entry {i}")
+    rng = np.random.default_rng(3)
+
+    def batch(start):
+        rows = [{"id": f"new-{start + j}", "user_id": "user_0", "entry": f"new {start + j}"} for j in range(args.batch)]
+        return rng.standard_normal((args.batch, args.dim), dtype=np.float32), rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = Path(tmp)
+        save_index(index, metadata, index_dir)
+        print(f"[+] base: {args.vectors} vectors, dim {args.dim}; batches of {args.batch}")
+
+        # Before: every batch re-saves the whole index and metadata
+        latencies = []
+        for b in range(args.batches):
+            vectors, rows = batch(b * args.batch)
+            t = time.perf_counter()
+            index.add(vectors)
+            metadata.extend(rows)
+            save_index(index, metadata, index_dir)
+            latencies.append(time.perf_counter() - t)
+        summarize_latencies("full rewrite", latencies, sum(latencies))
+
+        save_index(*synthetic_corpus(args.vectors, args.users, args.dim), index_dir)
+        writer = IncrementalIndex(index_dir, compact_bytes=2**62)
+        latencies = []
+        for b in range(args.batches):
+            vectors, rows = batch(b * args.batch)
+            t = time.perf_counter()
+            writer.upsert(vectors, rows)
+            latencies.append(time.perf_counter() - t)
+        summarize_latencies("delta append", latencies, sum(latencies))
+
+        # Time until a running Retriever serves an entry written after it loaded
+        retriever = Retriever(index_dir / "journal_index.faiss", index_dir / "journal_metadata.cols",
+                              reload_check_seconds=args.reload_check)
+        retriever.load()
+        retriever._last_check = time.monotonic()  # worst case: the write lands just after a check
+        vectors, rows = batch(10**9)
+        t = time.perf_counter()
+        writer.upsert(vectors, rows)
+        while not len(retriever._snapshot.delta) or retriever._snapshot.delta.rows[-1]["id"] != rows[-1]["id"]:
+            retriever._maybe_reload()
+            time.sleep(0.01)
+        print(f"visible after     {time.perf_counter() - t:.2f} s (reload check every {args.reload_check:g} s)")
+        print(f"delta reload      {retriever.stats()}")
+
+        t = time.perf_counter()
+        writer.compact()
+        print(f"compaction        {time.perf_counter() - t:.2f} s for {args.batches * args.batch + args.batch} entries")
+
+        t = time.perf_counter()
+        IndexSnapshot(*load_index_and_metadata(index_dir / "journal_index.faiss", index_dir / "journal_metadata.cols"))
+        print(f"snapshot rebuild  {time.perf_counter() - t:.2f} s (what a base reload costs)")
+
+def synthetic_rows(start: int, count: int, n_users: int) -> List[dict]:
+    rng = np.random.default_rng(start)
+    words = ["work", "sleep", "anxious", "grateful", "family", "walk", "tired", "friend", "deadline", "calm"]
+    return [
+        {
+            "id": f"{start + i:024x}", "user_id": f"user_{u}", "date": "2024-05-01",
+            "entry": " ".join(rng.choice(words, size=40)), "emotions": ["nervousness", "gratitude"],
+        }
+        for i, u in enumerate(rng.integers(n_users, size=count))
+    ]
+
+def rss_breakdown_mb() -> dict:
+    """Private (anonymous) and file-backed resident memory; mapped file pages are shared and reclaimable."""
+    sizes = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon", "RssFile")):
+                name, value = line.split(":")
+                sizes[name] = int(value.split()[0]) / 1024
+    return sizes
+
+def measure_metadata_open(kind: str, path: str, n_rows: int, lookups: int) -> dict:
+    """Run in a fresh process: time to open, memory it costs, and per-row lookup latency."""
+    from src.rag.metadata_store import MetadataStore
+
+    before = rss_breakdown_mb()
+    start = time.perf_counter()
+    if kind == "pickle":
+        import pickle
+        with open(path, "rb") as f:
+            metadata = pickle.load(f)
+    else:
+        metadata = MetadataStore.open(Path(path))
+    open_seconds = time.perf_counter() - start
+    opened = rss_breakdown_mb()
+
+    rows = np.random.default_rng(4).integers(n_rows, size=lookups)
+    start = time.perf_counter()
+    for i in rows:
+        metadata[i]["entry"] if kind == "pickle" else metadata.entry(i)  # what the Retriever reads
+    lookup_us = (time.perf_counter() - start) / lookups * 1e6
+    after = rss_breakdown_mb()
+    return {
+        "open_s": open_seconds,
+        "anon_open_mb": opened["RssAnon"] - before["RssAnon"],
+        "anon_after_reads_mb": after["RssAnon"] - before["RssAnon"],
+        "file_after_reads_mb": after["RssFile"] - before["RssFile"],
+        "lookup_us": lookup_us,
+    }
+
+def bench_metadata(args):
+    import multiprocessing
+    import pickle
+    from src.rag.metadata_store import Columns, write_metadata
+
+    ctx = multiprocessing.get_context("spawn")
+    # "anon" is private heap; "mapped" is page cache mapped into the process, shared and reclaimable
+    print(f"{'format':<8}{'rows':>11}{'file MB':>9}{'write s':>9}{'open s':>9}{'anon MB':>9}"
+          f"{'+reads':>8}{'mapped MB':>11}{'lookup us':>11}")
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            chunks = range(0, n_rows, 500_000)
+            formats = [("columnar", Path(tmp) / "journal_metadata.cols")]
+            if n_rows <= args.pickle_max:
+                formats.insert(0, ("pickle", Path(tmp) / "journal_metadata.pkl"))
+            else:
+                print(f"{'pickle':<8}{n_rows:>11}  skipped: above --pickle-max (needs every row dict in memory)")
+
+            for kind, path in formats:
+                start = time.perf_counter()
+                if kind == "pickle":
+                    rows = [row for s in chunks for row in synthetic_rows(s, min(500_000, n_rows - s), args.users)]
+                    with open(path, "wb") as f:
+                        pickle.dump(rows, f)
+                    del rows
+                else:
+                    parts = [Columns.from_rows(synthetic_rows(s, min(500_000, n_rows - s), args.users)) for s in chunks]
+                    write_metadata(path, Columns.concat(parts))
+                    del parts
+                write_seconds = time.perf_counter() - start
+
+                with ctx.Pool(1) as pool:
+                    r = pool.apply(measure_metadata_open, (kind, str(path), n_rows, args.lookups))
+                print(f"{kind:<8}{n_rows:>11}{path.stat().st_size / 2**20:>9.0f}{write_seconds:>9.1f}{r['open_s']:>9.3f}"
+                      f"{r['anon_open_mb']:>9.0f}{r['anon_after_reads_mb']:>8.0f}{r['file_after_reads_mb']:>11.0f}"
+                      f"{r['lookup_us']:>11.1f}")
+
+def bench_embed_cache(args):
+    from src.models.embedding_cache import EmbeddingCache
+    from src.models.registry import get_sentence_transformer
+
+    texts = [e["entry"] for e in load_entries(args.entries)]
+    get_sentence_transformer().encode(texts[:8])  # load the model outside the timings
+    print(f"[+] {len(texts)} journal entries ({len(set(texts))} distinct)")
+    print(f"{'pass':<24}{'seconds':>9}{'texts/s':>10}{'hit rate':>10}{'encoded':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(cache_dir=Path(tmp))
+        passes = [
+            ("uncached", None),
+            ("cold cache", cache),
+            ("warm, memory tier", cache),
+            ("warm, disk tier", EmbeddingCache(cache_dir=Path(tmp))),  # a fresh process: nothing in memory
+        ]
+        for name, c in passes:
+            start = time.perf_counter()
+            if c is None:
+                get_sentence_transformer().encode(texts, batch_size=32)
+                stats = {"hit_rate": 0.0, "misses": len(texts)}
+            else:
+                before = c.stats()
+                c.encode(texts)
+                after = c.stats()
+                lookups = sum(after[k] - before[k] for k in ("hits", "misses"))
+                stats = {"hit_rate": 1 - (after["misses"] - before["misses"]) / lookups,
+                         "misses": after["misses"] - before["misses"]}
+            seconds = time.perf_counter() - start
+            print(f"{name:<24}{seconds:>9.3f}{len(texts) / seconds:>10.0f}{stats['hit_rate']:>10.1%}{stats['misses']:>9}")
+
+def scaling_splits(cpus: int) -> List[tuple]:
+    """(processes, threads) pairs using at most `cpus` cores, in powers of two."""
+    sizes = [2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus]
+    return [(w, t) for w in sizes for t in sizes if w * t <= cpus]
+
+def bench_embed_scaling(args):
+    from src.models.parallel_embedding import EmbeddingPool, available_cpus, choose_split
+
+    entries = [e["entry"] for e in load_entries()]
+    # Distinct texts, so nothing is served by a tokenizer or model-side cache
+    texts = [f"{entries[i % len(entries)]} ({i})" for i in range(args.texts)]
+    cpus = args.cpus or available_cpus()
+    auto = choose_split(cpus)
+    splits = sorted(set(scaling_splits(cpus) + [auto]))
+    print(f"[+] {len(texts)} texts, {cpus} CPUs; auto split {auto[0]} x {auto[1]}")
+    print(f"{'processes':>10}{'threads':>9}{'startup s':>11}{'seconds':>9}{'texts/s':>10}{'speedup':>9}")
+    results, baseline = [], None
+    for workers, threads in splits:
+        start = time.perf_counter()
+        with EmbeddingPool(workers=workers, threads=threads) as pool:
+            if workers == 1:
+                import torch
+
+                torch.set_num_threads(threads)
+            pool.encode(texts[:workers * 8])  # load every worker's model outside the timing
+            startup = time.perf_counter() - start
+            start = time.perf_counter()
+            pool.encode(texts, batch_size=args.batch_size)
+            seconds = time.perf_counter() - start
+        rate = len(texts) / seconds
+        baseline = baseline or rate
+        results.append({"processes": workers, "threads": threads, "startup_s": startup, "texts_per_s": rate})
+        marker = "  <- auto" if (workers, threads) == auto else ""
+        print(f"{workers:>10}{threads:>9}{startup:>11.1f}{seconds:>9.2f}{rate:>10.0f}{rate / baseline:>8.2f}x{marker}")
+    if args.report:
+        args.report.write_text(json.dumps({"cpus": cpus, "auto": auto, "results": results}, indent=2))
+        print(f"[✓] Report written to {args.report}")
+
+ANN_SWEEPS = {
+    "flat": [None],
+    "ivf-flat": [1, 4, 16, 64],
+    "ivf-pq": [1, 4, 16, 64],
+    "hnsw": [16, 32, 64, 128],
+}
+
+def bench_ann(args):
+    import faiss
+    from src.rag.build_faiss_index import make_index, set_search_params, train_index
+
+    if args.corpus == "journal":
+        from src.rag.build_faiss_index import embed_entries
+
+        vectors = np.asarray(embed_entries(load_entries()), dtype=np.float32)
+        # Hold out the queries so none of them is its own nearest neighbour
+        queries, vectors = vectors[:args.queries], vectors[args.queries:]
+        chunks = lambda: iter([vectors])
+        n_vectors, dim = vectors.shape
+    else:
+        n_vectors, dim = args.vectors, args.dim
+        chunks = lambda: clustered_chunks(n_vectors, dim)
+        queries = next(clustered_chunks(args.queries, dim, seed=0, chunk=args.queries))
+        queries = queries + 0.1 * np.random.default_rng(2).standard_normal(queries.shape, dtype=np.float32)
+
+    print(f"[+] {args.corpus}: {n_vectors} vectors, dim {dim}, {len(queries)} queries, k={args.top_k}")
+    expected = exact_neighbours(chunks(), queries, args.top_k)
+
+    results = []
+    print(f"{'index':<10}{'param':>8}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}{'size MB':>9}")
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = make_index(dim, index_type, n_vectors)
+        if not index.is_trained:
+            sample = []
+            for vectors_chunk in chunks():
+                sample.append(vectors_chunk)
+                if sum(len(v) for v in sample) >= args.train_sample:
+                    break
+            train_index(index, np.concatenate(sample), args.train_sample)
+        for vectors_chunk in chunks():
+            index.add(vectors_chunk)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+
+        for param in ANN_SWEEPS[index_type]:
+            if param is not None:
+                set_search_params(index, nprobe=param, ef_search=param)
+            found, latencies = [], []
+            for q in queries:  # one query at a time, as the API serves them
+                t = time.perf_counter()
+                _, ids = index.search(q[None], args.top_k)
+                latencies.append(time.perf_counter() - t)
+                found.append(ids[0])
+            lat_ms = np.array(latencies) * 1000
+            row = {
+                "index": index_type, "param": param, "recall_at_k": recall_at_k(np.array(found), expected),
+                "latency_p50_ms": float(np.percentile(lat_ms, 50)), "latency_p99_ms": float(np.percentile(lat_ms, 99)),
+                "build_seconds": build_seconds, "size_mb": size_mb,
+            }
+            results.append(row)
+            print(f"{index_type:<10}{str(param or '-'):>8}{row['recall_at_k']:>10.3f}{row['latency_p50_ms']:>9.2f}"
+                  f"{row['latency_p99_ms']:>9.2f}{build_seconds:>9.1f}{size_mb:>9.1f}")
+        del index
+
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w") as f:
+            json.dump({"corpus": args.corpus, "vectors": n_vectors, "dim": dim, "k": args.top_k, "results": results}, f, indent=2)
+        print(f"[✓] Saved report to {args.report}")
+
+def storage_variants(dim: int, pq_ms: List[int]) -> List[tuple]:
+    """(index type, metric, pq_m): the current index, then cosine with progressively smaller codes."""
+    variants = [("flat", "l2", None), ("flat", "cosine", None), ("flat-fp16", "cosine", None), ("flat-sq8", "cosine", None)]
+    return variants + [("flat-pq", "cosine", m) for m in pq_ms if dim % m == 0]
+
+def bench_storage(args):
+    import faiss
+    from src.rag.build_faiss_index import make_index, prepare_vectors, train_index
+    from src.rag.retrieve_user_history import IndexSnapshot
+
+    if args.corpus == "journal":
+        from src.rag.build_faiss_index import embed_entries
+
+        entries = load_entries()
+        vectors = np.asarray(embed_entries(entries), dtype=np.float32)
+        users = [e["user_id"] for e in entries]
+    else:
+        vectors = np.concatenate(list(clustered_chunks(args.vectors, args.dim)))
+        faiss.normalize_L2(vectors)  # MiniLM's outputs are unit length too
+        users = [f"u{u}" for u in np.random.default_rng(1).zipf(1.3, len(vectors)) % args.users]
+    queries, vectors, users = vectors[:args.queries], vectors[args.queries:], users[args.queries:]
+    query_users = [users[i] for i in np.random.default_rng(2).integers(len(users), size=len(queries))]
+    metadata = [{"user_id": u} for u in users]
+    n, dim = vectors.shape
+    print(f"[+] {args.corpus}: {n} vectors, dim {dim}, {len(set(users))} users, {len(queries)} queries, k={args.top_k}")
+
+    def run(snapshot, user_ids):
+        found, latencies = [], []
+        for q, user_id in zip(queries, user_ids):
+            t = time.perf_counter()
+            found.append(snapshot.search(q, user_id, args.top_k))
+            latencies.append(time.perf_counter() - t)
+        return found, np.array(latencies) * 1000
+
+    def recall(found, expected):
+        return float(np.mean([len(set(f) & set(e)) / len(e) if len(e) else 1.0 for f, e in zip(found, expected)]))
+
+    expected = None
+    results = []
+    print(f"{'storage':<10}{'metric':>7}{'pq_m':>6}{'B/vec':>7}{'size MB':>9}{'smaller':>8}"
+          f"{'recall':>8}{'p50 ms':>8}{'user recall':>12}{'user p50':>9}")
+    for index_type, metric, pq_m in storage_variants(dim, args.pq_m):
+        index = make_index(dim, index_type, n, pq_m=pq_m or 16, metric=metric)
+        if not index.is_trained:
+            train_index(index, prepare_vectors(index, vectors), args.train_sample)
+        for start in range(0, n, 100_000):
+            index.add(prepare_vectors(index, vectors[start:start + 100_000]))
+        size_mb = faiss.serialize_index(index).nbytes / 2**20
+        snapshot = IndexSnapshot(index, metadata)
+        found, latency = run(snapshot, [None] * len(queries))
+        user_found, user_latency = run(snapshot, query_users)
+        if expected is None:  # the first variant is the current exact L2 index
+            expected, user_expected = found, user_found
+        row = {
+            "storage": index_type, "metric": metric, "pq_m": pq_m, "bytes_per_vector": size_mb * 2**20 / n,
+            "size_mb": size_mb, "recall_at_k": recall(found, expected), "latency_p50_ms": float(np.median(latency)),
+            "user_recall_at_k": recall(user_found, user_expected), "user_latency_p50_ms": float(np.median(user_latency)),
+        }
+        results.append(row)
+        print(f"{index_type:<10}{metric:>7}{str(pq_m or '-'):>6}{row['bytes_per_vector']:>7.0f}{size_mb:>9.1f}"
+              f"{results[0]['size_mb'] / size_mb:>7.1f}x{row['recall_at_k']:>8.3f}{row['latency_p50_ms']:>8.2f}"
+              f"{row['user_recall_at_k']:>12.3f}{row['user_latency_p50_ms']:>9.2f}")
+        del snapshot, index
+
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w") as f:
+            json.dump({"corpus": args.corpus, "vectors": n, "dim": dim, "k": args.top_k, "results": results}, f, indent=2)
+        print(f"[✓] Saved report to {args.report}")
+
+# --- CLI Entry Point ---
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm = subparsers.add_parser("warm", help="Cold (load per call) vs warm Retriever query latency")
+    warm.add_argument("--entries", type=int, default=0, help="Entries to index (0 = all)")
+    warm.add_argument("--cold-repeats", type=int, default=3, help="Cold calls to time")
+    warm.add_argument("--queries", type=int, default=200, help="Warm queries to time")
+    warm.add_argument("--concurrency", type=int, default=8, help="Concurrent query threads")
+    warm.set_defaults(func=bench_warm)
+
+    partition = subparsers.add_parser("partition", help="Global search + user filter vs per-user partitioned search")
+    partition.add_argument("--vectors", type=int, nargs="+", default=[100_000, 1_000_000], help="Corpus sizes")
+    partition.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 50_000], help="User counts")
+    partition.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    partition.add_argument("--queries", type=int, default=50, help="Queries per configuration")
+    partition.add_argument("--top-k", type=int, default=3)
+    partition.set_defaults(func=bench_partition)
+
+    delta = subparsers.add_parser("delta", help="Incremental delta-log writes vs re-saving the whole index")
+    delta.add_argument("--vectors", type=int, default=200_000, help="Base corpus size")
+    delta.add_argument("--users", type=int, default=10_000)
+    delta.add_argument("--dim", type=int, default=384)
+    delta.add_argument("--batch", type=int, default=32, help="Entries per write (the pipeline's batch size)")
+    delta.add_argument("--batches", type=int, default=20)
+    delta.add_argument("--reload-check", type=float, default=5.0, help="Retriever reload check interval (s)")
+    delta.set_defaults(func=bench_delta)
+
+    metadata = subparsers.add_parser("metadata", help="Open time and RSS of pickled vs columnar metadata")
+    metadata.add_argument("--rows", type=int, nargs="+", default=[1_000_000], help="e.g. 1000000 10000000")
+    metadata.add_argument("--users", type=int, default=50_000)
+    metadata.add_argument("--lookups", type=int, default=1000, help="Random row reads after opening")
+    metadata.add_argument("--pickle-max", type=int, default=10_000_000,
+                          help="Skip the pickle above this many rows (it must fit in memory)")
+    metadata.set_defaults(func=bench_metadata)
+
+    embed_cache = subparsers.add_parser("embed-cache", help="Corpus embedding time with a cold vs warm embedding cache")
+    embed_cache.add_argument("--entries", type=int, default=0, help="Entries to embed (0 = all)")
+    embed_cache.set_defaults(func=bench_embed_cache)
+
+    scaling = subparsers.add_parser("embed-scaling", help="Embedding throughput vs processes x torch threads")
+    scaling.add_argument("--texts", type=int, default=5000, help="Distinct texts to embed per split")
+    scaling.add_argument("--cpus", type=int, default=0, help="Cores to spread over (0 = all available)")
+    scaling.add_argument("--batch-size", type=int, default=32)
+    scaling.add_argument("--report", type=Path, default=None, help="Optional JSON output path")
+    scaling.set_defaults(func=bench_embed_scaling)
+
+    ann = subparsers.add_parser("ann", help="Recall@k vs latency of IVF-Flat / IVF-PQ / HNSW against the exact index")
+    ann.add_argument("--corpus", choices=["journal", "synthetic"], default="journal")
+    ann.add_argument("--vectors", type=int, default=1_000_000, help="Synthetic corpus size (e.g. 10000000)")
+    ann.add_argument("--dim", type=int, default=384, help="Synthetic embedding dimension")
+    ann.add_argument("--types", nargs="+", default=list(ANN_SWEEPS), choices=list(ANN_SWEEPS))
+    ann.add_argument("--queries", type=int, default=200, help="Held-out queries")
+    ann.add_argument("--top-k", type=int, default=10)
+    ann.add_argument("--train-sample", type=int, default=100_000, help="Vectors to train IVF on")
+    ann.add_argument("--report", type=Path, default=None, help="Optional JSON output path")
+    ann.set_defaults(func=bench_ann)
+
+    storage = subparsers.add_parser("storage", help="Recall/latency/size of normalized fp16, SQ8 and PQ storage "
+                                                      "against the current flat L2 index")
+    storage.add_argument("--corpus", choices=["journal", "synthetic"], default="journal")
+    storage.add_argument("--vectors", type=int, default=200_000, help="Synthetic corpus size")
+    storage.add_argument("--dim", type=int, default=384, help="Synthetic embedding dimension")
+    storage.add_argument("--users", type=int, default=5000, help="Synthetic users (Zipf-sized histories)")
+    storage.add_argument("--pq-m", type=int, nargs="+", default=[192, 96, 48], help="PQ bytes per vector to try")
+    storage.add_argument("--queries", type=int, default=200, help="Held-out queries")
+    storage.add_argument("--top-k", type=int, default=10)
+    storage.add_argument("--train-sample", type=int, default=100_000, help="Vectors to train SQ8/PQ on")
+    storage.add_argument("--report", type=Path, default=None, help="Optional JSON output path")
+    storage.set_defaults(func=bench_storage)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,319 @@
 # emotion_api.py
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import os
+import json
+import queue
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, confloat
 import numpy as np
+from src.api.readiness import Readiness, add_health_routes
+from src.models.emotion_backends import LABELS
+from src.models.emotion_cache import ProbabilityCache
+from src.models.inference_executor import ExecutorSaturated, InferenceExecutor
+from src.models.micro_batcher import MicroBatcher
+from src.models.registry import get_emotion_backend, registry
 
-# --- Load model and tokenizer ---
-MODEL_PATH = "models/emotion_classifier"
-LABELS = [
-    "admiration", "amusement", "anger", "annoyance", "approval", "caring", "confusion", "curiosity",
-    "desire", "disappointment", "disapproval", "disgust", "embarrassment", "excitement", "fear",
-    "gratitude", "grief", "joy", "love", "nervousness", "optimism", "pride", "realization",
-    "relief", "remorse", "sadness", "surprise", "neutral"
-]
+# --- Micro-batching config ---
+MICRO_BATCHING = os.getenv("EMOTION_MICRO_BATCHING", "1") == "1"
+BATCH_MAX_WAIT_MS = float(os.getenv("EMOTION_BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("EMOTION_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_TOKENS = int(os.getenv("EMOTION_BATCH_MAX_TOKENS", "8192"))
+BATCH_QUEUE_SIZE = int(os.getenv("EMOTION_BATCH_QUEUE_SIZE", "1024"))
 
-app = FastAPI(title="Emotion Classifier API", description="Predict emotions from journal text")
+# --- Bulk classification config ---
+BUCKET_BATCH_SIZE = int(os.getenv("EMOTION_BUCKET_BATCH_SIZE", "32"))
+STREAM_CHUNK_SIZE = int(os.getenv("EMOTION_STREAM_CHUNK_SIZE", "256"))
+MAX_BATCH_TEXTS = int(os.getenv("EMOTION_MAX_BATCH_TEXTS", "1024"))
 
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
-tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model.eval()
+# --- Inference executor config ---
+INFERENCE_WORKERS = int(os.getenv("EMOTION_INFERENCE_WORKERS", "1"))
+INFERENCE_MAX_PENDING = int(os.getenv("EMOTION_INFERENCE_MAX_PENDING", "64"))
+RETRY_AFTER_SECONDS = os.getenv("EMOTION_RETRY_AFTER_SECONDS", "1")
+
+# --- Long entry config ---
+LONG_TEXT_MODE = os.getenv("EMOTION_LONG_TEXT_MODE", "truncate")  # truncate | max | mean
+WINDOW_STRIDE = int(os.getenv("EMOTION_WINDOW_STRIDE", "128"))  # tokens shared by consecutive windows
+WINDOWED = LONG_TEXT_MODE != "truncate"
+
+# --- Prediction cache config ---
+CACHE_SIZE = int(os.getenv("EMOTION_CACHE_SIZE", "10000"))  # 0 disables the cache
+CACHE_PATH = os.getenv("EMOTION_CACHE_PATH")  # optional SQLite file for the persistent tier
+
+# --- Model backend (EMOTION_BACKEND=torch|onnxruntime), loaded on startup ---
+backend = None
+tokenizer = None
+cache = None
+
+def load_resources():
+    global backend, tokenizer, cache
+    backend = get_emotion_backend()
+    tokenizer = backend.tokenizer
+    cache_version = f"{backend.model_version}:{LONG_TEXT_MODE}:{WINDOW_STRIDE}" if WINDOWED else backend.model_version
+    cache = ProbabilityCache(cache_version, CACHE_SIZE, CACHE_PATH) if CACHE_SIZE > 0 or CACHE_PATH else None
+
+def warm_up():
+    predict_probabilities(["Warming up the emotion classifier."])
+
+readiness = Readiness("emotion classifier", load_resources, warm_up)
+
+# Model calls run here, never on the server's shared threadpool
+executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_MAX_PENDING, name="emotion-inference")
+
+def shutdown():
+    if batcher is not None:
+        batcher.close(timeout=5)
+    executor.shutdown(wait=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await readiness.start()
+    yield
+    shutdown()
+
+router = APIRouter(tags=["emotions"])
 
 # --- Request/Response Schema ---
+Threshold = confloat(ge=0, le=1)  # same range parse_stream_line enforces per line
+
 class EmotionRequest(BaseModel):
     text: str
-    threshold: float = 0.5
+    threshold: Threshold = 0.5
 
 class EmotionResponse(BaseModel):
     emotions: list[str]
 
+class BatchEmotionRequest(BaseModel):
+    texts: list[str]
+    threshold: Threshold = 0.5
+    thresholds: Optional[list[Threshold]] = None  # per-item override, same length as texts
+    return_probabilities: bool = False
+
+class BatchEmotionItem(BaseModel):
+    emotions: list[str]
+    probabilities: Optional[dict[str, float]] = None
+
+class BatchEmotionResponse(BaseModel):
+    results: list[BatchEmotionItem]
+
+# --- Batched inference ---
+def encode(text: str):
+    return backend.encode(text)
+
+def predict_encoded(encodings: list) -> np.ndarray:
+    return backend.predict_encoded(encodings)
+
+def predict_windows(texts: list[str], batch_size: int = BUCKET_BATCH_SIZE) -> np.ndarray:
+    return backend.predict_proba_windows(texts, LONG_TEXT_MODE, WINDOW_STRIDE, batch_size)
+
+def predict_probabilities(texts: list[str]) -> np.ndarray:
+    return predict_windows(texts) if WINDOWED else backend.predict_proba(texts)
+
+def predict_probabilities_bucketed(texts: list[str], batch_size: int = BUCKET_BATCH_SIZE) -> np.ndarray:
+    if cache is None:
+        return _predict_bucketed(texts, batch_size)
+    cached = cache.get_many(texts)
+    probs = np.zeros((len(texts), len(LABELS)), dtype=np.float32)
+    misses = [i for i, p in enumerate(cached) if p is None]
+    for i, p in enumerate(cached):
+        if p is not None:
+            probs[i] = p
+    if misses:
+        computed = _predict_bucketed([texts[i] for i in misses], batch_size)
+        probs[misses] = computed
+        cache.put_many([texts[i] for i in misses], computed)
+    return probs
+
+def _predict_bucketed(texts: list[str], batch_size: int) -> np.ndarray:
+    if WINDOWED:
+        return predict_windows(texts, batch_size)  # buckets windows by length itself
+    return backend.predict_proba(texts, batch_size)
+
+def labels_above(probs: np.ndarray, threshold: float) -> list[str]:
+    return [LABELS[i] for i, p in enumerate(probs) if p >= threshold]
+
+batcher = MicroBatcher(
+    predict_windows if WINDOWED else predict_encoded,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_batch_tokens=BATCH_MAX_TOKENS,
+    max_queue_size=BATCH_QUEUE_SIZE,
+    name="emotion-batcher",
+) if MICRO_BATCHING else None
+
 # --- Prediction logic ---
+def batch_item(text: str):
+    """Return the micro-batcher payload for `text` and its padded-token cost."""
+    if WINDOWED:
+        # Untruncated length approximates the padded tokens of all its windows
+        return text, len(tokenizer(text)["input_ids"])
+    encoding = encode(text)
+    return encoding, len(encoding["input_ids"])
+
 def predict_emotions(text: str, threshold: float = 0.5):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.sigmoid(logits).numpy()[0]
-    predicted = [LABELS[i] for i, p in enumerate(probs) if p >= threshold]
-    return predicted
+    probs = cache.get(text) if cache is not None else None
+    if probs is None:
+        if batcher is not None:
+            probs = batcher.predict(*batch_item(text))
+        else:
+            probs = predict_probabilities([text])[0]
+        if cache is not None:
+            cache.put(text, probs)
+    return labels_above(probs, threshold)
+
+async def run_inference(fn, *args):
+    return await asyncio.wrap_future(executor.submit(fn, *args))
+
+async def run_inference_when_free(fn, *args):
+    # Mid-stream a 429 is no longer possible, so wait for a slot instead; not
+    # reading the upload meanwhile pushes the backpressure onto the client.
+    future = await run_in_threadpool(executor.submit, fn, *args, block=True)
+    return await asyncio.wrap_future(future)
+
+def lookup_or_submit(text: str):
+    """(cached probs, None) on a hit, else (None, the micro-batcher's future for `text`)."""
+    probs = cache.get(text) if cache is not None else None
+    if probs is not None:
+        return probs, None
+    try:
+        return None, batcher.submit(*batch_item(text), block=False)
+    except queue.Full:
+        raise ExecutorSaturated("micro-batch queue is full")
+
+async def predict_emotions_async(text: str, threshold: float = 0.5):
+    """Like predict_emotions, but awaits the model instead of holding a thread.
+
+    The cache (SQLite on its disk tier) and the tokenizer block too, so they
+    run off the event loop as well.
+    """
+    if batcher is None:
+        return await run_inference(predict_emotions, text, threshold)
+    probs, future = await run_in_threadpool(lookup_or_submit, text)
+    if probs is None:
+        probs = await asyncio.wrap_future(future)
+        if cache is not None:
+            await run_in_threadpool(cache.put, text, probs)
+    return labels_above(probs, threshold)
+
+def format_result(probs: np.ndarray, threshold: float, return_probabilities: bool = False) -> dict:
+    result = {"emotions": labels_above(probs, threshold)}
+    if return_probabilities:
+        result["probabilities"] = {label: float(p) for label, p in zip(LABELS, probs)}
+    return result
+
+def classify_stream_chunk(items: list[dict], threshold: float, return_probabilities: bool) -> list[dict]:
+    valid = [item for item in items if "error" not in item]
+    probs = iter(predict_probabilities_bucketed([item["text"] for item in valid]) if valid else [])
+    results = []
+    for item in items:
+        if "error" in item:
+            results.append(item)
+            continue
+        result = format_result(next(probs), item.get("threshold", threshold), return_probabilities)
+        if "id" in item:
+            result = {"id": item["id"], **result}
+        results.append(result)
+    return results
+
+def parse_stream_line(line: bytes, line_no: int) -> Optional[dict]:
+    if not line.strip():
+        return None
+    try:
+        item = json.loads(line)
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str) or not item["text"]:
+            raise ValueError("expected an object with a non-empty 'text'")
+        threshold = item.get("threshold", 0.5)
+        # bool is an int; anything else non-numeric would only fail later, inside the chunk's inference
+        if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+            error = {"line": line_no, "error": "'threshold' must be a number between 0 and 1"}
+            return {"id": item["id"], **error} if "id" in item else error
+        return item
+    except ValueError as e:
+        return {"line": line_no, "error": str(e)}
+
+class DuplexStreamingResponse(StreamingResponse):
+    # The body generator keeps reading the upload via request.stream(), so the
+    # default disconnect listener must not compete with it for receive().
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
 
 # --- API Route ---
-@app.post("/predict_emotions", response_model=EmotionResponse)
-def predict(request: EmotionRequest):
+async def saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Emotion service is saturated: {exc}"},
+        headers={"Retry-After": RETRY_AFTER_SECONDS},
+    )
+
+@router.post("/predict_emotions", response_model=EmotionResponse, dependencies=[Depends(readiness.require)])
+async def predict(request: EmotionRequest):
     if not request.text:
         raise HTTPException(status_code=400, detail="Text input is required")
-    emotions = predict_emotions(request.text, request.threshold)
-    return {"emotions": emotions}
\ No newline at end of file
+    emotions = await predict_emotions_async(request.text, request.threshold)
+    return {"emotions": emotions}
+
+@router.post(
+    "/predict_emotions/batch",
+    response_model=BatchEmotionResponse,
+    response_model_exclude_none=True,
+    dependencies=[Depends(readiness.require)],
+)
+async def predict_batch(request: BatchEmotionRequest):
+    if not request.texts or any(not t for t in request.texts):
+        raise HTTPException(status_code=400, detail="A non-empty list of non-empty texts is required")
+    if len(request.texts) > MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_TEXTS} texts per batch; use /predict_emotions/stream")
+    if request.thresholds is not None and len(request.thresholds) != len(request.texts):
+        raise HTTPException(status_code=400, detail="thresholds must have one value per text")
+
+    thresholds = request.thresholds or [request.threshold] * len(request.texts)
+    probs = await run_inference(predict_probabilities_bucketed, request.texts)
+    results = [format_result(p, t, request.return_probabilities) for p, t in zip(probs, thresholds)]
+    return {"results": results}
+
+@router.post("/predict_emotions/stream", dependencies=[Depends(readiness.require)])
+async def predict_stream(request: Request, threshold: float = Query(0.5, ge=0, le=1), return_probabilities: bool = False):
+    """Classify an NDJSON upload of {"text", "id"?, "threshold"?} objects, streaming NDJSON results."""
+    async def results():
+        pending, buffer, line_no = [], b"", 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                item = parse_stream_line(line, line_no)
+                if item is not None:
+                    pending.append(item)
+            if len(pending) >= STREAM_CHUNK_SIZE:
+                for result in await run_inference_when_free(classify_stream_chunk, pending, threshold, return_probabilities):
+                    yield json.dumps(result) + "\n"
+                pending = []
+
+        item = parse_stream_line(buffer, line_no + 1)
+        if item is not None:
+            pending.append(item)
+        if pending:
+            for result in await run_inference_when_free(classify_stream_chunk, pending, threshold, return_probabilities):
+                yield json.dumps(result) + "\n"
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/metrics")
+def metrics():
+    return {
+        "backend": backend.model_version if backend is not None else None,
+        "cache": cache.stats() if cache is not None else None,
+        "batcher": batcher.stats() if batcher is not None else None,
+        "executor": executor.stats(),
+        "models": registry.stats(),
+    }
+
+# --- Standalone app (src.api.main mounts `router` into the combined app instead) ---
+app = FastAPI(title="Emotion Classifier API", description="Predict emotions from journal text", lifespan=lifespan)
+app.include_router(router)
+app.add_exception_handler(ExecutorSaturated, saturated_handler)
+add_health_routes(app, readiness)
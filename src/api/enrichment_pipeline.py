@@ -0,0 +1,367 @@
+# enrichment_pipeline.py
+#
+# Background enrichment of submitted journal entries:
+#
+#   classify -> embed -> [reframe] -> index -> store
+#
+# Each stage is one thread draining a bounded queue in batches. A stage blocks
+# while the queue below it is full, so a slow stage backs work up towards
+# `submit`, which then refuses new entries rather than stalling the request;
+# refused entries stay `pending` in Mongo for `backfill` to pick up later.
+#
+# An entry is enriched by the process that holds its claim: `submit_entry`
+# inserts it as `processing` owned by the worker that queues it, and
+# `backfill` takes `pending` entries (and claims gone stale with a dead
+# worker) one at a time with find_one_and_update, so no two processes enrich
+# the same entry. Indexing comes last, so an entry marked `failed` is never in
+# the index; an index upsert is idempotent, so redoing a stale claim is safe.
+
+import fcntl
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional
+import numpy as np
+
+# --- Config ---
+ENABLED = os.getenv("ENRICH_ENABLED", "1") == "1"
+QUEUE_SIZE = int(os.getenv("ENRICH_QUEUE_SIZE", "1024"))  # per stage
+BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("ENRICH_MAX_WAIT_MS", "50"))  # how long a stage waits to fill a batch
+THRESHOLD = float(os.getenv("ENRICH_THRESHOLD", "0.5"))
+REFRAME = os.getenv("ENRICH_REFRAME", "0") == "1"  # one LLM call per matching entry
+BACKFILL = os.getenv("ENRICH_BACKFILL", "1") == "1"  # re-queue pending entries on startup
+BACKFILL_LOCK = Path(os.getenv("ENRICH_BACKFILL_LOCK", "/tmp/journal_enrich_backfill.lock"))  # one backfilling process per host
+CLAIM_TIMEOUT_S = float(os.getenv("ENRICH_CLAIM_TIMEOUT_S", "900"))  # a claim older than this is taken as abandoned
+REFRAME_EMOTIONS = {
+    "anger", "annoyance", "disappointment", "disapproval", "disgust", "embarrassment",
+    "fear", "grief", "nervousness", "remorse", "sadness",
+}
+
+# Sentinel passed down the stages on shutdown
+_STOP = object()
+
+
+class PipelineSaturated(Exception):
+    """Raised by `submit` when the first stage's queue is full."""
+
+
+class Stage:
+    """A thread that runs `fn` on batches of items and hands them to the next stage.
+
+    `fn(items)` enriches the items in place. If it raises, the items are
+    retried one at a time and those that still fail are marked with an
+    `error`; later stages skip them, except those created with
+    `handle_errors=True` (the final store stage), which see every item.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[dict]], None], queue_size: int = QUEUE_SIZE,
+                 batch_size: int = BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS, handle_errors: bool = False):
+        self.name = name
+        self.fn = fn
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.handle_errors = handle_errors
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next: Optional["Stage"] = None
+        self.items = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # waiting on a full downstream queue
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+        self._stopping = False
+        self.thread = threading.Thread(target=self._run, name=f"enrich-{name}", daemon=True)
+
+    def _collect(self) -> List[dict]:
+        first = self.queue.get()
+        if first is _STOP:
+            self._stopping = True
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._collect()
+            if batch:
+                self._process(batch)
+        if self.next is not None:
+            self.next.queue.put(_STOP)
+
+    def _process(self, batch: List[dict]):
+        work = batch if self.handle_errors else [item for item in batch if "error" not in item]
+        start = time.monotonic()
+        try:
+            if work:
+                self.fn(work)
+        except Exception as e:
+            traceback.print_exc()
+            # One bad entry shouldn't fail the entries batched with it
+            failures = [(item, e) for item in work] if len(work) == 1 else self._retry_each(work)
+            self.errors += len(failures)
+            for item, error in failures:
+                item.setdefault("error", f"{self.name}: {type(error).__name__}: {error}")
+        self.busy_seconds += time.monotonic() - start
+
+        # Lag: time since the entry was submitted to the pipeline
+        now = time.time()
+        lags = [now - item["enqueued_at"] for item in batch]
+        self.last_lag = max(lags)
+        self.max_lag = max(self.max_lag, self.last_lag)
+        self._lag_total += sum(lags)
+        self.items += len(batch)
+        self.batches += 1
+
+        if self.next is not None:
+            start = time.monotonic()
+            for item in batch:
+                self.next.queue.put(item)
+            self.blocked_seconds += time.monotonic() - start
+
+    def _retry_each(self, work: List[dict]) -> list:
+        failures = []
+        for item in work:
+            try:
+                self.fn([item])
+            except Exception as e:
+                failures.append((item, e))
+        return failures
+
+    def stats(self, elapsed: float) -> dict:
+        return {
+            "stage": self.name,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "items": self.items,
+            "batches": self.batches,
+            "errors": self.errors,
+            "throughput_per_s": self.items / elapsed if elapsed else 0.0,
+            "capacity_per_s": self.items / self.busy_seconds if self.busy_seconds else 0.0,
+            "busy_seconds": self.busy_seconds,
+            "blocked_seconds": self.blocked_seconds,
+            "avg_lag_ms": 1000 * self._lag_total / self.items if self.items else 0.0,
+            "last_lag_ms": 1000 * self.last_lag,
+            "max_lag_ms": 1000 * self.max_lag,
+        }
+
+
+class EnrichmentPipeline:
+    """Chains stages; threads start on the first submit so the pipeline survives a pre-fork."""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next = downstream
+        self.submitted = 0
+        self.rejected = 0
+        self._started = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._started is None:
+                self._started = time.monotonic()
+                for stage in self.stages:
+                    stage.thread.start()
+
+    def submit(self, item: dict, block: bool = False, timeout: Optional[float] = None):
+        """Queue an entry (`_id`, `entry`, optional `user_id`/`date`). Raises PipelineSaturated if full."""
+        self.start()
+        item["enqueued_at"] = time.time()
+        try:
+            self.stages[0].queue.put(item, block=block, timeout=timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise PipelineSaturated(f"{self.stages[0].name} queue holds {self.stages[0].queue.maxsize} entries")
+        self.submitted += 1
+
+    def backfill(self, collection, limit: int = 0, claim_timeout: float = CLAIM_TIMEOUT_S) -> int:
+        """Claim and queue entries left `pending` (refused while saturated) or abandoned mid-enrichment.
+
+        Each entry is claimed atomically before it is queued, so processes
+        backfilling the same collection never queue the same entry twice.
+        """
+        count = 0
+        while not limit or count < limit:
+            stale = datetime.utcnow() - timedelta(seconds=claim_timeout)
+            doc = collection.find_one_and_update(
+                {"$or": [{"enrichment_status": "pending"},
+                         {"enrichment_status": "processing", "enrichment_claimed_at": {"$lt": stale}}]},
+                {"$set": claim()},
+                projection={"entry": 1, "user_id": 1, "date": 1},
+                sort=[("_id", 1)],
+            )
+            if doc is None:
+                break
+            self.submit(doc, block=True)
+            count += 1
+        return count
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.stages[-1].items,
+            "in_flight": self.submitted - self.stages[-1].items,
+            "stages": [stage.stats(elapsed) for stage in self.stages],
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        """Let queued entries drain through every stage, then stop the threads."""
+        if self._started is None:
+            return
+        self.stages[0].queue.put(_STOP)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for stage in self.stages:
+            stage.thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+
+# --- Claims ---
+def owner() -> str:
+    # Read per call: prefork workers get their pid after import
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def claim() -> dict:
+    """Fields marking an entry as being enriched by this process."""
+    return {"enrichment_status": "processing", "enrichment_owner": owner(), "enrichment_claimed_at": datetime.utcnow()}
+
+def release(collection, _id):
+    """Hand an entry this process claimed but couldn't queue back to `backfill`."""
+    collection.update_one({"_id": _id, "enrichment_owner": owner()},
+                          {"$set": {"enrichment_status": "pending"},
+                           "$unset": {"enrichment_owner": "", "enrichment_claimed_at": ""}})
+
+
+# --- Stage functions ---
+def classify_batch(items: List[dict]):
+    # The API's path, so stored labels match /predict_emotions: same cache, same long-entry windowing
+    from src.api import emotion_api
+    from src.models.emotion_backends import LABELS
+
+    if emotion_api.backend is None:
+        emotion_api.readiness.run(warmup=False)  # a no-op once the app's lifespan has loaded it
+        if emotion_api.backend is None:
+            raise RuntimeError(f"{emotion_api.readiness.name} is {emotion_api.readiness.state}: {emotion_api.readiness.error}")
+    probs = emotion_api.predict_probabilities_bucketed([item["entry"] for item in items])
+    for item, p in zip(items, probs):
+        item["emotions"] = [LABELS[i] for i, v in enumerate(p) if v >= THRESHOLD]
+
+def embed_batch(items: List[dict]):
+    from src.models.embedding_cache import get_embedding_cache
+
+    embeddings = get_embedding_cache().encode([item["entry"] for item in items], batch_size=len(items))
+    for item, embedding in zip(items, embeddings):
+        item["embedding"] = embedding
+
+def make_index_batch(appender=None) -> Callable[[List[dict]], None]:
+    def index_batch(items: List[dict]):
+        nonlocal appender
+        if appender is None:
+            from src.rag.incremental_index import IncrementalIndex
+            appender = IncrementalIndex()
+        rows = [
+            {"id": str(item["_id"]), "user_id": item.get("user_id"), "date": item.get("date"),
+             "entry": item["entry"], "emotions": item["emotions"]}
+            for item in items
+        ]
+        appender.add(np.stack([item["embedding"] for item in items]), rows)
+    return index_batch
+
+def reframe_batch(items: List[dict]):
+    from src.generators.reframing_generator import generate_reframe
+
+    for item in items:
+        # Skip entries a failed batch already reframed, so a retry doesn't pay for them twice
+        if "reframe" not in item and REFRAME_EMOTIONS.intersection(item["emotions"]):
+            item["reframe"] = generate_reframe(item["entry"])
+
+def make_store_batch(collection=None) -> Callable[[List[dict]], None]:
+    def store_batch(items: List[dict]):
+        from pymongo import UpdateOne
+        from src.utils.mongo_utils import get_collection
+
+        updates = []
+        for item in items:
+            fields = {"enriched_at": datetime.utcnow()}
+            if "error" in item:
+                fields.update(enrichment_status="failed", enrichment_error=item["error"])
+            else:
+                fields.update(enrichment_status="done", emotions=item["emotions"])
+                if "reframe" in item:
+                    fields["reframe"] = item["reframe"]
+            updates.append(UpdateOne({"_id": item["_id"]}, {"$set": fields,
+                                                            "$unset": {"enrichment_owner": "", "enrichment_claimed_at": ""}}))
+        # One round trip for the whole batch
+        (collection if collection is not None else get_collection("journal_entries")).bulk_write(updates, ordered=False)
+    return store_batch
+
+def build_pipeline(collection=None, appender=None, reframe: bool = REFRAME, queue_size: int = QUEUE_SIZE,
+                   batch_size: int = BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS) -> EnrichmentPipeline:
+    steps = [("classify", classify_batch), ("embed", embed_batch)]
+    if reframe:
+        steps.append(("reframe", reframe_batch))
+    # Last before store: an entry that failed anywhere earlier never reaches the index
+    steps.append(("index", make_index_batch(appender)))
+    stages = [Stage(name, fn, queue_size, batch_size, max_wait_ms) for name, fn in steps]
+    stages.append(Stage("store", make_store_batch(collection), queue_size, batch_size, max_wait_ms, handle_errors=True))
+    return EnrichmentPipeline(stages)
+
+pipeline = None  # built by `start_pipeline`, from the combined app's lifespan
+_backfill_lock = None  # held for the life of the process that backfills
+
+def start_pipeline() -> Optional[EnrichmentPipeline]:
+    """Build this process's pipeline unless ENRICH_ENABLED=0; its threads start on the first submit."""
+    global pipeline
+    if ENABLED and pipeline is None:
+        pipeline = build_pipeline()
+    return pipeline
+
+def stop_pipeline(timeout: Optional[float] = None):
+    global pipeline
+    if pipeline is not None:
+        pipeline.close(timeout)
+        pipeline = None
+
+def start_backfill(lock_path: Path = BACKFILL_LOCK) -> bool:
+    """Backfill in the background unless another process on this host already does; True if started."""
+    global _backfill_lock
+
+    def run():
+        from src.utils.mongo_utils import get_collection
+        try:
+            count = pipeline.backfill(get_collection("journal_entries"))
+            print(f"[✓] Queued {count} pending journal entries for enrichment")
+        except Exception as e:
+            print(f"[!] Enrichment backfill failed: {e}")
+
+    if pipeline is None or not BACKFILL:
+        return False
+    lock = open(lock_path, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return False
+    _backfill_lock = lock
+    threading.Thread(target=run, name="enrich-backfill", daemon=True).start()
+    return True
@@ -1,12 +1,33 @@
 # generate_prompt_api.py
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from src.rag.retrieve_user_history import retrieve_similar_entries
+from src.api.readiness import Readiness, add_health_routes
+from src.models.registry import EMBED_MODEL, get_sentence_transformer
+from src.rag.retrieve_user_history import get_retriever, retrieve_similar_entries
 from src.rag.generate_prompt import generate_prompt_from_entries
+from src.utils.llm_wrapper import get_client
 
-app = FastAPI(title="Journaling Companion: Prompt Generator")
+# --- Model setup (loaded on startup, not at import) ---
+def load_resources():
+    get_client()
+    get_sentence_transformer(EMBED_MODEL)
+    if not get_retriever().load(missing_ok=True):
+        print("[!] No FAISS index yet; /generate_prompt fails until one is built")
+
+def warm_up():
+    get_sentence_transformer(EMBED_MODEL).encode(["Warming up the embedding model."])
+
+readiness = Readiness("prompt generator", load_resources, warm_up)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await readiness.start()
+    yield
+
+router = APIRouter(tags=["prompts"])
 
 # --- Request/Response Models ---
 class PromptRequest(BaseModel):
@@ -19,7 +40,7 @@ class PromptResponse(BaseModel):
     prompt: str
 
 # --- API Route ---
-@app.post("/generate_prompt", response_model=PromptResponse)
+@router.post("/generate_prompt", response_model=PromptResponse, dependencies=[Depends(readiness.require)])
 def generate_prompt_endpoint(request: PromptRequest):
     try:
         entries = retrieve_similar_entries(
@@ -34,3 +55,8 @@ def generate_prompt_endpoint(request: PromptRequest):
         return {"past_entries": entries, "prompt": prompt}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# --- Standalone app (src.api.main mounts `router` into the combined app instead) ---
+app = FastAPI(title="Journaling Companion: Prompt Generator", lifespan=lifespan)
+app.include_router(router)
+add_health_routes(app, readiness)
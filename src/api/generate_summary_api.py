@@ -1,23 +1,41 @@
 # generate_summary_api.py
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 import json
 from datetime import datetime, timedelta
-from openai import OpenAI
-from sentence_transformers import SentenceTransformer, util
 from sklearn.cluster import KMeans
 import numpy as np
+from src.api.readiness import Readiness, add_health_routes
+from src.models.embedding_cache import get_embedding_cache
+from src.models.registry import EMBED_MODEL, get_sentence_transformer
+from src.utils.llm_wrapper import get_client
 
 # --- Load journal entries (mock database) ---
 JOURNAL_PATH = "data/interim/journals.jsonl"
 
-# --- Model setup ---
-client = OpenAI()
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# --- Model setup (loaded on startup, not at import) ---
+client = None
+embedding_model = None
 
-app = FastAPI(title="Journaling Companion: Weekly Summary Generator")
+def load_resources():
+    global client, embedding_model
+    client = get_client()
+    embedding_model = get_sentence_transformer(EMBED_MODEL)
+
+def warm_up():
+    embedding_model.encode(["Warming up the embedding model."])
+
+readiness = Readiness("summary generator", load_resources, warm_up)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await readiness.start()
+    yield
+
+router = APIRouter(tags=["summaries"])
 
 # --- Request and Response Schemas ---
 class SummaryRequest(BaseModel):
@@ -51,7 +69,7 @@ def load_user_entries(user_id: str, days: int) -> List[dict]:
 def cluster_entries(entries: List[str], n_clusters: int) -> List[List[str]]:
     if len(entries) <= n_clusters:
         return [[e] for e in entries]
-    embeddings = embedding_model.encode(entries)
+    embeddings = get_embedding_cache().encode(entries)  # a user's week is mostly the same texts as last request
     kmeans = KMeans(n_clusters=n_clusters, random_state=42)
     labels = kmeans.fit_predict(embeddings)
     clustered = [[] for _ in range(n_clusters)]
@@ -89,7 +107,7 @@ def extract_emotion_trends(entries: List[dict]) -> dict:
     return dict(trends.most_common(5))
 
 # --- Route: POST /generate_summary ---
-@app.post("/generate_summary", response_model=SummaryResponse)
+@router.post("/generate_summary", response_model=SummaryResponse, dependencies=[Depends(readiness.require)])
 def generate_summary(request: SummaryRequest):
     entries = load_user_entries(request.user_id, request.days)
     if not entries:
@@ -104,4 +122,9 @@ def generate_summary(request: SummaryRequest):
         summary=summary,
         emotion_trends=emotion_summary,
         entries_used=entry_texts
-    )
\ No newline at end of file
+    )
+
+# --- Standalone app (src.api.main mounts `router` into the combined app instead) ---
+app = FastAPI(title="Journaling Companion: Weekly Summary Generator", lifespan=lifespan)
+app.include_router(router)
+add_health_routes(app, readiness)
@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
-from src.utils.mongo_utils import journal_entries
+from src.api import enrichment_pipeline
+from src.api.enrichment_pipeline import PipelineSaturated
+from src.utils.mongo_utils import get_collection
 
 router = APIRouter()
 
@@ -22,20 +24,41 @@ class JournalEntry(BaseModel):
 def submit_entry(entry: JournalEntry):
     doc = entry.dict()
     doc["timestamp"] = datetime.utcnow()
-    result = journal_entries.insert_one(doc)
-    return {"status": "success", "id": str(result.inserted_id)}
+    pipeline = enrichment_pipeline.pipeline
+    if pipeline is not None:
+        # Claimed by this worker from the start, so a backfill elsewhere can't queue it too
+        doc.update(enrichment_pipeline.claim())
+    collection = get_collection("journal_entries")
+    result = collection.insert_one(doc)
+
+    # Classification, embedding, indexing and reframing happen in the background
+    enrichment = "disabled"
+    if pipeline is not None:
+        try:
+            pipeline.submit({"_id": result.inserted_id, "entry": doc["entry"], "user_id": doc["user_id"], "date": doc["date"]})
+            enrichment = "queued"
+        except PipelineSaturated:
+            enrichment_pipeline.release(collection, result.inserted_id)
+            enrichment = "deferred"  # pending until a backfill
+    return {"status": "success", "id": str(result.inserted_id), "enrichment": enrichment}
+
+# --- GET /enrichment/metrics ---
+@router.get("/enrichment/metrics")
+def enrichment_metrics():
+    pipeline = enrichment_pipeline.pipeline
+    return pipeline.stats() if pipeline is not None else {"enabled": False}
 
 # --- GET /get_entries ---
 @router.get("/get_entries", response_model=List[JournalEntry])
 def get_entries(user_id: str, days: int = 7):
     cutoff = datetime.utcnow() - timedelta(days=days)
-    results = journal_entries.find({"user_id": user_id, "timestamp": {"$gte": cutoff}})
+    results = get_collection("journal_entries").find({"user_id": user_id, "timestamp": {"$gte": cutoff}})
     return [JournalEntry(**{k: v for k, v in r.items() if k in JournalEntry.__fields__}) for r in results]
 
 # --- GET /get_summary ---
 @router.get("/get_summary")
 def get_summary(user_id: str):
-    doc = journal_entries.find_one(
+    doc = get_collection("journal_entries").find_one(
         {"user_id": user_id, "summary": {"$exists": True}},
         sort=[("timestamp", -1)]
     )
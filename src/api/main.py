@@ -1,5 +1,67 @@
+# main.py
+#
+# One process serving every service: journal CRUD, emotion tagging, prompt
+# generation and weekly summaries. The models come from the process-wide
+# registry and the OpenAI/Mongo clients from src.utils, so each is loaded once
+# and shared by all routers instead of once per service process.
+#
+#   uvicorn src.api.main:app
+#   python -m src.api.serve_prefork --app src.api.main:app --workers 2
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from src.api import emotion_api, enrichment_pipeline, generate_prompt_api, generate_summary_api
 from src.api.journal_routes import router as journal_router
+from src.api.readiness import Readiness, add_health_routes
+from src.models.embedding_cache import cache_stats
+from src.models.inference_executor import ExecutorSaturated
+from src.models.registry import registry
+from src.utils import llm_wrapper, mongo_utils
+
+SERVICES = [emotion_api, generate_prompt_api, generate_summary_api]
+
+# --- Shared resources ---
+def load_resources():
+    # Each service keeps its own readiness, so its routes still 503 until its models are in
+    for service in SERVICES:
+        service.readiness.run(warmup=False)
+        if service.readiness.state == "failed":
+            raise RuntimeError(f"{service.readiness.name} failed to load: {service.readiness.error}")
+
+def warm_up():
+    for service in SERVICES:
+        service.readiness.run()
+
+readiness = Readiness("journaling companion", load_resources, warm_up)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    enrichment_pipeline.start_pipeline()
+    await readiness.start()
+    enrichment_pipeline.start_backfill()
+    yield
+    enrichment_pipeline.stop_pipeline(timeout=10)
+    emotion_api.shutdown()
+    llm_wrapper.close_client()
+    mongo_utils.close_client()
+
+app = FastAPI(title="Journaling Companion API", lifespan=lifespan)
+app.include_router(journal_router)
+app.include_router(emotion_api.router)
+app.include_router(generate_prompt_api.router)
+app.include_router(generate_summary_api.router)
+app.add_exception_handler(ExecutorSaturated, emotion_api.saturated_handler)
+add_health_routes(app, readiness)
+
+@app.get("/models")
+def models():
+    return {"models": registry.stats()}
+
+@app.get("/embeddings/metrics")
+def embedding_metrics():
+    return {"caches": cache_stats()}
 
-app = FastAPI(title="Journaling Companion API")
-app.include_router(journal_router)
\ No newline at end of file
+# --- Journal CRUD on its own (one of the four processes of the split layout) ---
+# No lifespan, so no enrichment pipeline: entries are stored without enrichment
+journal_app = FastAPI(title="Journaling Companion: Journal Entries")
+journal_app.include_router(journal_router)
@@ -0,0 +1,88 @@
+# readiness.py
+
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+# --- Config ---
+BACKGROUND_LOAD = os.getenv("API_BACKGROUND_LOAD", "1") == "1"  # accept traffic (503s) while loading
+WARMUP = os.getenv("API_WARMUP", "1") == "1"  # one dummy forward pass per model before ready
+
+
+class Readiness:
+    """Load/warm-up state of an app, served on /healthz and /readyz.
+
+    `/healthz` only says the process is up; `/readyz` turns 200 once `load`
+    (and `warmup`, if enabled) have finished, so orchestration can hold
+    traffic back from cold workers.
+    """
+
+    def __init__(self, name: str, load: Callable[[], None], warmup: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.load = load
+        self.warmup = warmup
+        self.state = "starting"
+        self.error = None
+        self.loaded = False
+        self.warmed = False
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def run(self, warmup: bool = WARMUP):
+        """Load and optionally warm up, each at most once; safe to call from several threads.
+
+        A pre-fork parent calls this with warmup=False so the forked workers
+        inherit loaded models but still run their own warm-up pass.
+        """
+        with self._lock:
+            try:
+                if not self.loaded:
+                    self.state = "loading"
+                    start = time.perf_counter()
+                    self.load()
+                    self.loaded = True
+                    self.timings["load_seconds"] = time.perf_counter() - start
+                if warmup and self.warmup is not None and not self.warmed:
+                    self.state = "warming_up"
+                    start = time.perf_counter()
+                    self.warmup()
+                    self.warmed = True
+                    self.timings["warmup_seconds"] = time.perf_counter() - start
+                self.state = "ready"
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+
+    async def start(self, background: bool = BACKGROUND_LOAD):
+        if background:
+            threading.Thread(target=self.run, name=f"{self.name}-loader", daemon=True).start()
+        else:
+            await run_in_threadpool(self.run)
+
+    def require(self):
+        """FastAPI dependency: 503 until the app is ready."""
+        if not self.ready:
+            raise HTTPException(status_code=503, detail=f"{self.name} is {self.state}", headers={"Retry-After": "1"})
+
+
+def add_health_routes(app: FastAPI, readiness: Readiness):
+    @app.get("/healthz")
+    def healthz():
+        return {"status": "ok"}
+
+    @app.get("/readyz")
+    def readyz():
+        body = {"status": readiness.state, **readiness.timings}
+        if readiness.error:
+            body["error"] = readiness.error
+        return JSONResponse(status_code=200 if readiness.ready else 503, content=body)
@@ -0,0 +1,122 @@
+# serve_prefork.py
+#
+# Pre-fork server: import the app and load its models once in the parent, then
+# fork workers that share the weights copy-on-write instead of each loading
+# their own copy the way `uvicorn --workers N` does.
+#
+#   python -m src.api.serve_prefork --workers 4 --port 8000
+
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import time
+import uvicorn
+from src.models.emotion_backends import configure_torch_threads
+
+# --- Config ---
+DEFAULT_APP = "src.api.emotion_api:app"
+HOST = os.getenv("API_HOST", "0.0.0.0")
+PORT = int(os.getenv("API_PORT", "8000"))
+WORKERS = int(os.getenv("API_WORKERS", "2"))
+
+# --- Parent: load once ---
+def import_app(app_path: str):
+    module_name, attr = app_path.split(":")
+    module = importlib.import_module(module_name)
+    readiness = getattr(module, "readiness", None)
+    if readiness is not None:
+        # Load in the parent so workers share the pages; each worker warms up
+        # after fork, since a forward pass here would start torch threads
+        readiness.run(warmup=False)
+    return getattr(module, attr)
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    # An explicit IPPROTO_TCP lets asyncio enable TCP_NODELAY on accepted connections
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def freeze_heap():
+    # Move every live object into a permanent generation so the collector never
+    # writes to their headers, which would un-share the pages after fork()
+    gc.collect()
+    gc.freeze()
+
+# --- Child: serve ---
+def run_worker(app, sock: socket.socket, worker_threads: int, log_level: str):
+    # Safe here because the parent never ran a forward pass, so no torch pool exists yet
+    configure_torch_threads(worker_threads)
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def spawn_worker(app, sock: socket.socket, worker_threads: int, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, worker_threads, log_level)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def serve(app_path: str = DEFAULT_APP, host: str = HOST, port: int = PORT, workers: int = WORKERS,
+          worker_threads: int = 0, log_level: str = "info"):
+    """Fork `workers` uvicorn servers on one shared listening socket; restart any that crash."""
+    app = import_app(app_path)
+    sock = bind_socket(host, port)
+    if worker_threads <= 0:
+        worker_threads = max(1, (os.cpu_count() or 1) // workers)
+    freeze_heap()
+
+    children = {spawn_worker(app, sock, worker_threads, log_level) for _ in range(workers)}
+    print(f"[✓] Serving {app_path} on {host}:{port} with {workers} forked workers: {sorted(children)}", flush=True)
+
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"[!] Worker {pid} exited with status {status}; restarting", flush=True)
+            time.sleep(1)
+            children.add(spawn_worker(app, sock, worker_threads, log_level))
+    sock.close()
+
+# --- CLI Entry Point ---
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server sharing model weights copy-on-write")
+    parser.add_argument("--app", type=str, default=DEFAULT_APP, help="module:attribute of the ASGI app")
+    parser.add_argument("--host", type=str, default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--worker-threads", type=int, default=0, help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args()
+
+    serve(args.app, args.host, args.port, args.workers, args.worker_threads, args.log_level)
+
+if __name__ == "__main__":
+    main()
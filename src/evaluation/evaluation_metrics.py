@@ -1,13 +1,17 @@
 # evaluation_metrics.py
 
 from typing import List
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 from rouge_score import rouge_scorer
 from bert_score import score as bert_score
-from detoxify import Detoxify
 import torch
 import numpy as np
+from src.models.embedding_cache import get_embedding_cache
+from src.models.registry import EMBED_MODEL, get_detoxify, get_sequence_classifier
+from src.models.token_batching import run_texts
+
+# --- Config ---
+EMPATHY_MODEL = "mrm8488/bert-tiny-finetuned-emotion"
 
 # --- ROUGE/BERTScore: Summarization quality ---
 def compute_rouge(pred: str, ref: str):
@@ -20,29 +24,30 @@ def compute_bertscore(pred: str, ref: str):
 
 # --- Empathy Score: Pretrained classifier (EmpathBERT-style) ---
 def load_empathy_classifier():
-    model_name = "mrm8488/bert-tiny-finetuned-emotion"
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    return model.eval(), tokenizer
+    return get_sequence_classifier(EMPATHY_MODEL)
+
+def compute_empathy_scores(texts: List[str], model, tokenizer) -> List[float]:
+    def forward(inputs):
+        with torch.no_grad():
+            # The registry loads the model onto MODEL_DEVICE; the padded batch is built on the CPU
+            return torch.softmax(model(**inputs.to(model.device)).logits, dim=1).cpu().numpy()
+
+    probs = run_texts(tokenizer, texts, forward, return_tensors="pt")
+    return [float(np.max(p)) for p in probs]  # Max probability of any empathetic emotion
 
 def compute_empathy_score(text: str, model, tokenizer):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.softmax(logits, dim=1).numpy()[0]
-    return float(np.max(probs))  # Max probability of any empathetic emotion
+    return compute_empathy_scores([text], model, tokenizer)[0]
 
 # --- Personalization: Cosine sim between prompt & journal embeddings ---
 def compute_personalization(prompt: str, journal_history: List[str]):
-    embedder = SentenceTransformer("all-MiniLM-L6-v2")
-    prompt_emb = embedder.encode([prompt], convert_to_tensor=True)
-    history_emb = embedder.encode(journal_history, convert_to_tensor=True)
+    embeddings = torch.from_numpy(get_embedding_cache(EMBED_MODEL).encode([prompt] + journal_history))
+    prompt_emb, history_emb = embeddings[:1], embeddings[1:]
     sim_scores = util.cos_sim(prompt_emb, history_emb)[0]
     return float(torch.max(sim_scores).item())  # Highest sim to any entry
 
 # --- Safety: Detoxify score (toxicity probability) ---
 def compute_safety_score(text: str):
-    detox = Detoxify("original")
+    detox = get_detoxify("original")
     results = detox.predict(text)
     return {"toxicity": results["toxicity"]}
 
@@ -1,13 +1,10 @@
 # reframing_generator.py
 
-from openai import OpenAI
 from typing import List
-
-# --- Initialize OpenAI ---
-client = OpenAI()
+from src.utils.llm_wrapper import get_client
 
 # --- Prompt Template with Safety Guardrails ---
-REFRAME_PROMPT_TEMPLATE = """
+REFRAME_PROMPT_TEMPLATE = '''
 You are an empathetic assistant helping users reframe negative or difficult experiences.
 
 Input journal entry:
@@ -18,14 +15,14 @@ Input journal entry:
 Extract the main concern, and then generate a gentle, encouraging reframe.
 Use this structure:
 
-"It sounds like {extracted concern}. Remember that {encouragement}. Tomorrow is a new opportunity."
-"""
+"It sounds like {{extracted concern}}. Remember that {{encouragement}}. Tomorrow is a new opportunity."
+'''
 
 # --- Generate reframe using GPT-4 ---
 def generate_reframe(entry_text: str) -> str:
     prompt = REFRAME_PROMPT_TEMPLATE.format(entry=entry_text)
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-4",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7
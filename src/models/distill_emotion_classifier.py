@@ -0,0 +1,198 @@
+# distill_emotion_classifier.py
+#
+# Distil the fine-tuned classifier (teacher) into a smaller student that
+# emotion_api can serve as a drop-in replacement:
+#
+#   python -m src.models.distill_emotion_classifier --layers 2
+#   EMOTION_MODEL_PATH=models/emotion_classifier_small uvicorn src.api.emotion_api:app
+
+import argparse
+import json
+import multiprocessing
+import random
+import re
+from pathlib import Path
+import numpy as np
+import torch
+from sklearn.metrics import f1_score
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from src.models.emotion_backends import LABELS, SMALL_MODEL_PATH, TorchEmotionBackend
+from src.models.token_batching import run_texts
+from src.models.quantize_emotion_classifier import evaluate_variant, weights_size_mb
+from src.models.train_emotion_classifier import DATA_PATH, OUTPUT_DIR, load_data, split_dataset
+
+# --- Config ---
+TEACHER_PATH = OUTPUT_DIR
+STUDENT_OUTPUT_DIR = Path(SMALL_MODEL_PATH)
+REPORT_PATH = Path("outputs/distillation_report.json")
+THRESHOLD = 0.5
+STUDENT_LAYERS = 2       # transformer layers kept from the teacher
+TEMPERATURE = 2.0        # softens teacher logits before the sigmoid
+HARD_LABEL_WEIGHT = 0.2  # share of the loss on the gold labels; the rest follows the teacher
+EPOCHS = 4
+LEARNING_RATE = 5e-5
+BATCH_SIZE = 16
+SEED = 42
+
+# --- Student ---
+def student_from_teacher(teacher, num_layers: int):
+    """Copy the teacher's embeddings, head and an evenly spaced subset of its layers into a shallower model."""
+    config = teacher.config.__class__.from_dict(teacher.config.to_dict())
+    total = config.num_hidden_layers
+    if not 0 < num_layers <= total:
+        raise ValueError(f"--layers must be between 1 and {total}")
+    config.num_hidden_layers = num_layers
+    student = AutoModelForSequenceClassification.from_config(config)
+
+    kept = [int(i) for i in np.linspace(0, total - 1, num_layers).round()]
+    state = {}
+    for key, value in teacher.state_dict().items():
+        match = re.search(r"\.layer\.(\d+)\.", key)
+        if match is None:
+            state[key] = value
+        elif int(match.group(1)) in kept:
+            new_index = kept.index(int(match.group(1)))
+            state[key.replace(match.group(0), f".layer.{new_index}.", 1)] = value
+    student.load_state_dict(state, strict=False)
+    return student
+
+def student_from_pretrained(name: str):
+    """Start from a small pretrained encoder (e.g. a MiniLM checkpoint) with a fresh multi-label head."""
+    model = AutoModelForSequenceClassification.from_pretrained(
+        name, num_labels=len(LABELS), problem_type="multi_label_classification"
+    )
+    model.config.id2label = dict(enumerate(LABELS))
+    model.config.label2id = {label: i for i, label in enumerate(LABELS)}
+    return model, AutoTokenizer.from_pretrained(name)
+
+# --- Soft labels ---
+def teacher_soft_labels(teacher_path: Path, texts: list, temperature: float = TEMPERATURE) -> np.ndarray:
+    backend = TorchEmotionBackend(str(teacher_path))
+    logits = run_texts(backend.tokenizer, texts, backend.forward)
+    return 1.0 / (1.0 + np.exp(-logits / temperature))
+
+# --- Train ---
+def distill(student, tokenizer, texts: list, soft: np.ndarray, hard: np.ndarray, epochs: int = EPOCHS,
+            temperature: float = TEMPERATURE, hard_weight: float = HARD_LABEL_WEIGHT, lr: float = LEARNING_RATE):
+    bce = torch.nn.BCEWithLogitsLoss()
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr, weight_decay=0.01)
+    order = list(range(len(texts)))
+    rng = random.Random(SEED)
+    student.train()
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        total = 0.0
+        for start in range(0, len(order), BATCH_SIZE):
+            batch = order[start:start + BATCH_SIZE]
+            inputs = tokenizer([texts[i] for i in batch], return_tensors="pt", truncation=True, padding=True)
+            logits = student(**inputs).logits
+            # Scale by T^2 so the soft-target gradients keep their magnitude as T grows
+            loss = (1 - hard_weight) * bce(logits / temperature, torch.tensor(soft[batch])) * temperature ** 2
+            if hard_weight:
+                loss = loss + hard_weight * bce(logits, torch.tensor(hard[batch], dtype=torch.float32))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(batch)
+        print(f"[+] Epoch {epoch + 1}/{epochs}: loss={total / len(texts):.4f}")
+    return student.eval()
+
+# --- Report ---
+def build_report(y_true: np.ndarray, results: dict, sizes: dict) -> dict:
+    teacher_pred = (results["teacher"]["probs"] >= THRESHOLD).astype(int)
+    student_pred = (results["student"]["probs"] >= THRESHOLD).astype(int)
+    report = {
+        "threshold": THRESHOLD,
+        "n_heldout": int(len(y_true)),
+        "exact_match_agreement": float((teacher_pred == student_pred).all(axis=1).mean()),
+        "variants": {},
+        "per_label_agreement": {},
+    }
+    for variant, result in results.items():
+        y_pred = (result.pop("probs") >= THRESHOLD).astype(int)
+        report["variants"][variant] = {
+            "micro_f1": float(f1_score(y_true, y_pred, average="micro", zero_division=0)),
+            "macro_f1": float(f1_score(y_true, y_pred, average="macro", zero_division=0)),
+            "weights_size_mb": sizes[variant],
+            **result,
+        }
+    for i, label in enumerate(LABELS):
+        report["per_label_agreement"][label] = {
+            "agreement": float((teacher_pred[:, i] == student_pred[:, i]).mean()),
+            "teacher_positives": int(teacher_pred[:, i].sum()),
+            "student_positives": int(student_pred[:, i].sum()),
+            # Teacher predictions as the reference
+            "f1_vs_teacher": float(f1_score(teacher_pred[:, i], student_pred[:, i], zero_division=1)),
+        }
+    return report
+
+def print_report(report: dict):
+    print(f"\n{'variant':<9}{'micro F1':>10}{'macro F1':>10}{'p50 ms':>9}{'p99 ms':>9}{'texts/s':>9}{'RSS MB':>9}{'size MB':>9}")
+    for variant, r in report["variants"].items():
+        print(
+            f"{variant:<9}{r['micro_f1']:>10.3f}{r['macro_f1']:>10.3f}{r['latency_p50_ms']:>9.1f}{r['latency_p99_ms']:>9.1f}"
+            f"{r['batch_throughput_per_s']:>9.1f}{r['peak_rss_mb']:>9.0f}{r['weights_size_mb']:>9.1f}"
+        )
+    print(f"\nExact-match agreement with teacher: {report['exact_match_agreement']:.3f}")
+    worst = sorted(report["per_label_agreement"].items(), key=lambda kv: kv[1]["f1_vs_teacher"])[:5]
+    print("Lowest per-label agreement (F1 vs teacher):")
+    for label, row in worst:
+        print(f"  {label:<15}{row['f1_vs_teacher']:.3f}  agreement={row['agreement']:.3f}")
+
+# --- Main ---
+def main():
+    parser = argparse.ArgumentParser(description="Distil the emotion classifier into a smaller student")
+    parser.add_argument("--teacher-path", type=Path, default=TEACHER_PATH, help="Fine-tuned teacher model directory")
+    parser.add_argument("--output-dir", type=Path, default=STUDENT_OUTPUT_DIR, help="Where to write the student")
+    parser.add_argument("--layers", type=int, default=STUDENT_LAYERS, help="Teacher layers kept in the student")
+    parser.add_argument("--student-model", type=str, default=None,
+                        help="Pretrained small encoder to start from instead of truncating the teacher")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    parser.add_argument("--hard-weight", type=float, default=HARD_LABEL_WEIGHT, help="Loss weight of gold labels")
+    parser.add_argument("--report", type=Path, default=REPORT_PATH, help="Where to write the comparison report")
+    parser.add_argument("--skip-train", action="store_true", help="Only re-run the report on an existing student")
+    args = parser.parse_args()
+
+    torch.manual_seed(SEED)
+    splits = split_dataset(load_data(DATA_PATH))
+
+    if not args.skip_train:
+        train_texts, train_hard = list(splits["train"]["text"]), np.array(splits["train"]["labels"])
+        print(f"[+] Generating teacher soft labels for {len(train_texts)} entries...")
+        soft = teacher_soft_labels(args.teacher_path, train_texts, args.temperature).astype(np.float32)
+
+        if args.student_model:
+            student, tokenizer = student_from_pretrained(args.student_model)
+        else:
+            teacher = AutoModelForSequenceClassification.from_pretrained(args.teacher_path)
+            student, tokenizer = student_from_teacher(teacher, args.layers), AutoTokenizer.from_pretrained(args.teacher_path)
+            del teacher
+        print(f"[+] Training student ({sum(p.numel() for p in student.parameters()) / 1e6:.1f}M parameters)...")
+        student = distill(student, tokenizer, train_texts, soft, train_hard, args.epochs, args.temperature, args.hard_weight)
+
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        student.save_pretrained(args.output_dir)
+        tokenizer.save_pretrained(args.output_dir)
+        print(f"[✓] Saved student model to {args.output_dir}")
+
+    heldout = splits["test"]
+    texts, y_true = list(heldout["text"]), np.array(heldout["labels"])
+    print(f"[+] Comparing teacher and student on {len(texts)} held-out entries...")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for variant, path in [("teacher", args.teacher_path), ("student", args.output_dir)]:
+        with ctx.Pool(1) as pool:
+            results[variant] = pool.apply(evaluate_variant, (str(path), False, texts))
+
+    sizes = {"teacher": weights_size_mb(args.teacher_path), "student": weights_size_mb(args.output_dir)}
+    report = build_report(y_true, results, sizes)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\n[✓] Saved report to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# embedding_cache.py
+#
+# Persistent sentence-embedding cache keyed by (model, text hash), so a text is
+# encoded once no matter how many pipelines (index builds, enrichment, weekly
+# summaries, evaluation) ask for it:
+#
+#   vectors = get_embedding_cache().encode(texts)
+#
+# Two tiers: an in-process LRU of recent vectors, and per model version on disk
+#
+#   <EMBED_CACHE_DIR>/<model>-<fingerprint>/keys.bin     16-byte hashes of the normalized texts, append-only
+#   <EMBED_CACHE_DIR>/<model>-<fingerprint>/vectors.f32  float32 rows in the same order, memory-mapped
+#
+# A local model directory is fingerprinted like the emotion classifier's
+# probability cache, so retraining it starts a fresh cache.
+#
+# Appends take an flock, so worker processes share one cache; each process
+# picks up rows written by the others when it next misses.
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from src.models.emotion_cache import artifact_fingerprint, normalize_text
+from src.models.registry import EMBED_MODEL, get_sentence_transformer
+
+# --- Config ---
+CACHE_DIR = Path(os.getenv("EMBED_CACHE_DIR", "data/processed/embedding_cache"))
+LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", "10000"))  # vectors kept in memory per model
+ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") == "1"
+KEY_BYTES = 16
+MERGE_EVERY = 50_000  # recently added keys are folded into the sorted index in batches
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+def model_version(model_name: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_")
+    return f"{slug}-{artifact_fingerprint(model_name)}" if Path(model_name).exists() else slug
+
+
+class EmbeddingCache:
+    """Embeddings from one model, cached in an LRU and in append-only files shared by every process.
+
+    Texts are keyed by the hash of their normalized form; `encode` dedups the
+    batch, serves what it can from memory, then from disk, and sends only the
+    rest to the model.
+    """
+
+    def __init__(self, model_name: str = EMBED_MODEL, cache_dir: Path = CACHE_DIR, lru_size: int = LRU_SIZE,
+                 encoder=None):
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / model_version(model_name)
+        self.keys_path = self.dir / "keys.bin"
+        self.vectors_path = self.dir / "vectors.f32"
+        self.lru_size = lru_size
+        self._encoder = encoder
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.dim: Optional[int] = None
+        self._rows = 0                     # rows of the disk files this process has indexed
+        self._sorted_keys = np.empty(0, dtype=f"S{KEY_BYTES}")
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        self._recent: Dict[bytes, int] = {}
+        self._vectors = None               # memmap over the first `_rows` rows
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def encoder(self):
+        return self._encoder if self._encoder is not None else get_sentence_transformer(self.model_name)
+
+    # --- Disk tier ---
+    def _read_meta(self):
+        meta_path = self.dir / "meta.json"
+        if self.dim is None and meta_path.exists():
+            self.dim = json.loads(meta_path.read_text())["dim"]
+
+    def _complete_rows(self) -> int:
+        """Rows present in both files; a crash between the two appends leaves a vector without a key."""
+        if self.dim is None or not self.keys_path.exists():
+            return 0
+        keys = self.keys_path.stat().st_size // KEY_BYTES
+        vectors = self.vectors_path.stat().st_size // (4 * self.dim) if self.vectors_path.exists() else 0
+        return min(keys, vectors)
+
+    def _refresh(self):
+        """Index rows appended (by any process) since we last looked."""
+        self._read_meta()
+        total = self._complete_rows()
+        if total <= self._rows:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._rows * KEY_BYTES)
+            data = f.read((total - self._rows) * KEY_BYTES)
+        for i in range(0, len(data), KEY_BYTES):
+            self._recent[data[i:i + KEY_BYTES]] = self._rows + i // KEY_BYTES
+        self._rows = total
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(total, self.dim))
+        if len(self._recent) >= MERGE_EVERY:
+            self._merge_recent()
+
+    def _merge_recent(self):
+        keys = np.concatenate([self._sorted_keys, np.array(list(self._recent), dtype=f"S{KEY_BYTES}")])
+        rows = np.concatenate([self._sorted_rows, np.fromiter(self._recent.values(), dtype=np.int64)])
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys, self._sorted_rows = keys[order], rows[order]
+        self._recent = {}
+
+    def _find(self, key: bytes) -> int:
+        row = self._recent.get(key)
+        if row is not None:
+            return row
+        if len(self._sorted_keys):
+            needle = np.array(key, dtype=f"S{KEY_BYTES}")
+            i = np.searchsorted(self._sorted_keys, needle)
+            if i < len(self._sorted_keys) and self._sorted_keys[i] == needle:
+                return int(self._sorted_rows[i])
+        return -1
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            meta_path = self.dir / "meta.json"
+            if not meta_path.exists():
+                meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}))
+        with open(self.keys_path, "ab") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            self._read_meta()
+            # Drop a vector left without its key by a crashed writer, so rows stay aligned
+            rows = self._complete_rows()
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.truncate(rows * 4 * self.dim)
+                vectors_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                vectors_file.flush()
+            keys_file.truncate(rows * KEY_BYTES)
+            keys_file.write(b"".join(keys))
+            keys_file.flush()
+        self._refresh()
+
+    # --- Lookup ---
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """(len(texts), dim) float32 embeddings; only texts never seen before reach the model."""
+        if not texts:
+            self._read_meta()
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        keys = [text_key(t) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        missing = []
+        with self._lock:
+            pending = []
+            for key in dict.fromkeys(keys):
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                    self.hits += 1
+                else:
+                    pending.append(key)
+            if pending:
+                self._refresh()
+            for key in pending:
+                row = self._find(key)
+                if row < 0:
+                    missing.append(key)
+                    continue
+                found[key] = np.array(self._vectors[row])
+                self._remember(key, found[key])
+                self.hits += 1
+                self.disk_hits += 1
+
+        if missing:
+            text_of = dict(zip(keys, texts))
+            vectors = self.encoder.encode([text_of[key] for key in missing], batch_size=batch_size)
+            vectors = np.asarray(vectors, dtype=np.float32)
+            with self._lock:
+                self.misses += len(missing)
+                self._append(missing, vectors)
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._remember(key, vector)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._lru),
+            "disk_entries": self._rows,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class _Uncached:
+    """Stand-in when EMBED_CACHE_ENABLED=0: encodes every time but keeps the same interface."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.misses = 0
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        self.misses += len(texts)
+        return np.asarray(get_sentence_transformer(self.model_name).encode(texts, batch_size=batch_size),
+                          dtype=np.float32)
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, "disabled": True, "misses": self.misses, "hit_rate": 0.0}
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str = EMBED_MODEL):
+    """The process-wide cache for `model_name`."""
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name) if ENABLED else _Uncached(model_name)
+        return _caches[model_name]
+
+def cache_stats() -> list:
+    with _caches_lock:
+        return [cache.stats() for cache in _caches.values()]
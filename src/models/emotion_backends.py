@@ -0,0 +1,181 @@
+# emotion_backends.py
+
+import os
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+from src.models.emotion_cache import artifact_fingerprint
+from src.models.token_batching import MAX_BATCH_SIZE, MAX_BATCH_TOKENS, run_batched, run_texts
+
+# --- Config ---
+MODEL_PATH = os.getenv("EMOTION_MODEL_PATH", "models/emotion_classifier")
+ONNX_ROOT = Path(os.getenv("EMOTION_ONNX_ROOT", "models/emotion_classifier_onnx"))
+SMALL_MODEL_PATH = os.getenv("EMOTION_SMALL_MODEL_PATH", "models/emotion_classifier_small")  # distilled student
+INT8_MODEL_PATH = os.getenv("EMOTION_INT8_MODEL_PATH", "models/emotion_classifier_int8")
+BACKEND = os.getenv("EMOTION_BACKEND", "torch")  # torch | onnxruntime
+QUANTIZED = os.getenv("EMOTION_QUANTIZED", "0") == "1"  # serve the INT8 torch variant
+TORCH_THREADS = int(os.getenv("EMOTION_TORCH_THREADS", "0"))  # 0 keeps the runtime default
+TORCH_INTEROP_THREADS = int(os.getenv("EMOTION_TORCH_INTEROP_THREADS", "0"))
+INT8_WEIGHTS = "model_int8.pt"
+LATEST_POINTER = "LATEST"
+LABELS = [
+    "admiration", "amusement", "anger", "annoyance", "approval", "caring", "confusion", "curiosity",
+    "desire", "disappointment", "disapproval", "disgust", "embarrassment", "excitement", "fear",
+    "gratitude", "grief", "joy", "love", "nervousness", "optimism", "pride", "realization",
+    "relief", "remorse", "sadness", "surprise", "neutral"
+]
+
+def quantize_model(model):
+    """Dynamic INT8 quantization of every Linear layer (weights int8, activations quantized on the fly)."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_quantized_model(model_path: str):
+    # Rebuild the fp32 architecture, quantize it, then load the saved int8 weights into it
+    model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(model_path))
+    model = quantize_model(model.eval())
+    model.load_state_dict(torch.load(Path(model_path) / INT8_WEIGHTS, weights_only=True))
+    return model
+
+def configure_torch_threads(intra_op: int = TORCH_THREADS, inter_op: int = TORCH_INTEROP_THREADS):
+    """Pin torch's thread pools so inference does not oversubscribe cores shared with the server."""
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            pass  # can only be set before the first parallel op; keep whatever is active
+
+def sigmoid(logits: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-logits))
+
+# --- Shared predict interface ---
+class EmotionBackend:
+    """Tokenizer plus a forward pass; subclasses only implement `forward`.
+
+    Every backend consumes and returns numpy arrays, so callers get the same
+    (n_texts, len(LABELS)) sigmoid probabilities whichever runtime is loaded.
+    """
+
+    name = "base"
+
+    def __init__(self, tokenizer, artifact_path):
+        self.tokenizer = tokenizer
+        # Changes whenever the weights on disk change; used to key cached predictions
+        self.model_version = f"{self.name}:{artifact_fingerprint(artifact_path)}"
+
+    def forward(self, inputs: dict) -> np.ndarray:
+        raise NotImplementedError
+
+    def encode(self, text: str):
+        return self.tokenizer(text, truncation=True)
+
+    def predict_encoded(self, encodings: list) -> np.ndarray:
+        # One padded forward pass over already-tokenized inputs
+        inputs = self.tokenizer.pad(encodings, return_tensors="np")
+        return self._forward_proba(inputs)
+
+    def predict_proba(self, texts: List[str], max_batch_size: int = MAX_BATCH_SIZE,
+                      max_tokens: int = MAX_BATCH_TOKENS) -> np.ndarray:
+        """Sigmoid probabilities, run in length-sorted batches under a padded-token budget."""
+        if not texts:
+            return np.zeros((0, len(LABELS)), dtype=np.float32)
+        return run_texts(self.tokenizer, texts, self._forward_proba, "np", max_tokens, max_batch_size)
+
+    def _forward_proba(self, inputs) -> np.ndarray:
+        return sigmoid(self.forward(inputs))
+
+    def predict_proba_windows(
+        self, texts: List[str], aggregate: str = "max", stride: int = 128,
+        batch_size: int = MAX_BATCH_SIZE, max_tokens: int = MAX_BATCH_TOKENS,
+    ) -> np.ndarray:
+        """Classify full texts by splitting them into overlapping model-length windows.
+
+        Windows from every text are packed into shared token-budgeted batches,
+        then folded back per text with `aggregate` (max or mean).
+        `stride` is the number of tokens consecutive windows overlap by.
+        """
+        if aggregate not in ("max", "mean"):
+            raise ValueError(f"Unknown window aggregation: {aggregate!r} (expected 'max' or 'mean')")
+        if not texts:
+            return np.zeros((0, len(LABELS)), dtype=np.float32)
+        window = self.tokenizer.model_max_length - self.tokenizer.num_special_tokens_to_add()
+        stride = min(stride, window // 2)  # consecutive windows must still advance
+        encodings = self.tokenizer(texts, truncation=True, stride=stride, return_overflowing_tokens=True)
+        owners = np.asarray(encodings["overflow_to_sample_mapping"])
+        window_probs = run_batched(self.tokenizer, encodings, self._forward_proba, "np", max_tokens, batch_size)
+
+        probs = np.zeros((len(texts), len(LABELS)), dtype=np.float32)
+        if aggregate == "max":
+            np.maximum.at(probs, owners, window_probs)
+            return probs
+        np.add.at(probs, owners, window_probs)
+        return probs / np.bincount(owners, minlength=len(texts))[:, None]
+
+
+class TorchEmotionBackend(EmotionBackend):
+    name = "torch"
+
+    def __init__(self, model_path: str = MODEL_PATH, quantized: bool = False):
+        if quantized:
+            self.name = "torch-int8"
+            self.model = load_quantized_model(model_path)
+        else:
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        self.model.eval()
+        super().__init__(AutoTokenizer.from_pretrained(model_path), model_path)
+
+    def forward(self, inputs: dict) -> np.ndarray:
+        with torch.no_grad():
+            return self.model(**{k: torch.from_numpy(v) for k, v in inputs.items()}).logits.numpy()
+
+
+class OnnxEmotionBackend(EmotionBackend):
+    name = "onnxruntime"
+
+    def __init__(self, artifact_dir: Optional[Path] = None, intra_op_threads: Optional[int] = None):
+        import onnxruntime as ort  # optional dependency, only needed for this backend
+
+        self.artifact_dir = Path(artifact_dir) if artifact_dir else resolve_onnx_artifact()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(
+            str(self.artifact_dir / "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        super().__init__(AutoTokenizer.from_pretrained(self.artifact_dir), self.artifact_dir)
+
+    def forward(self, inputs: dict) -> np.ndarray:
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        return self.session.run(["logits"], feed)[0]
+
+# --- Artifact lookup ---
+def resolve_onnx_artifact(root: Path = ONNX_ROOT, version: Optional[str] = None) -> Path:
+    """Return `root/<version>`, defaulting to the version named in `root/LATEST`."""
+    if version is None:
+        pointer = root / LATEST_POINTER
+        if not pointer.exists():
+            raise FileNotFoundError(f"No ONNX export found under {root}; run `python -m src.models.export_onnx`")
+        version = pointer.read_text().strip()
+    path = root / version
+    if not (path / "model.onnx").exists():
+        raise FileNotFoundError(f"Missing {path / 'model.onnx'}")
+    return path
+
+def load_backend(name: Optional[str] = None, model_path: Optional[str] = None, quantized: Optional[bool] = None) -> EmotionBackend:
+    name = name or BACKEND
+    quantized = QUANTIZED if quantized is None else quantized
+    if name == "torch":
+        configure_torch_threads()
+        if quantized:
+            return TorchEmotionBackend(model_path or INT8_MODEL_PATH, quantized=True)
+        return TorchEmotionBackend(model_path or MODEL_PATH)
+    if quantized:
+        raise ValueError("EMOTION_QUANTIZED is only supported by the torch backend")
+    if name == "onnxruntime":
+        return OnnxEmotionBackend(Path(model_path) if model_path else None, TORCH_THREADS or None)
+    raise ValueError(f"Unknown emotion backend: {name!r} (expected 'torch' or 'onnxruntime')")
@@ -0,0 +1,123 @@
+# emotion_cache.py
+
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+def artifact_fingerprint(path) -> str:
+    """Cheap content-change fingerprint of a model artifact (file names, sizes and mtimes)."""
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for p in files:
+        stat = p.stat()
+        digest.update(f"{p.relative_to(path) if path.is_dir() else p.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class ProbabilityCache:
+    """LRU cache of raw sigmoid vectors keyed by hash(model version, normalized text).
+
+    Thresholding happens after lookup, so a hit serves any `threshold`. With
+    `disk_path` set, entries are also written through to a SQLite file that
+    survives restarts; rows from other model versions are purged on open.
+
+    The version is fixed for the cache's lifetime: the API loads the backend
+    once per process, so a new model artifact takes effect (and invalidates
+    the cache) on restart only.
+    """
+
+    def __init__(self, model_version: str, max_entries: int = 10000, disk_path: Optional[Path] = None):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if disk_path is not None:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS probs (key TEXT PRIMARY KEY, model_version TEXT, probs BLOB)"
+            )
+            self._purge_other_versions()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_version}\0{normalize_text(text)}".encode()).hexdigest()
+
+    # --- Lookup ---
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        with self._lock:
+            probs = self._memory.get(key)
+            if probs is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return probs
+            if self._db is not None:
+                row = self._db.execute("SELECT probs FROM probs WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    probs = np.frombuffer(row[0], dtype=np.float32)
+                    self._insert(key, probs)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return probs
+            self.misses += 1
+            return None
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        return [self.get(text) for text in texts]
+
+    # --- Insert ---
+    def put(self, text: str, probs: np.ndarray):
+        self.put_many([text], [probs])
+
+    def put_many(self, texts: List[str], probs: List[np.ndarray]):
+        rows = [(self.key(t), np.asarray(p, dtype=np.float32)) for t, p in zip(texts, probs)]
+        with self._lock:
+            for key, p in rows:
+                self._insert(key, p)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO probs VALUES (?, ?, ?)",
+                    [(key, self.model_version, p.tobytes()) for key, p in rows],
+                )
+                self._db.commit()
+
+    def _insert(self, key: str, probs: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = probs
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    # --- Invalidation ---
+    def _purge_other_versions(self):
+        self._db.execute("DELETE FROM probs WHERE model_version != ?", (self.model_version,))
+        self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
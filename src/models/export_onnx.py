@@ -0,0 +1,74 @@
+# export_onnx.py
+
+import argparse
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from src.models.emotion_backends import LABELS, LATEST_POINTER, MODEL_PATH, ONNX_ROOT
+
+# --- Config ---
+OPSET = 17
+
+# --- Export ---
+def export_onnx(model_path: str = MODEL_PATH, root: Path = ONNX_ROOT, version: str = None, opset: int = OPSET) -> Path:
+    """Write model.onnx, tokenizer files and a manifest to `root/<version>` and point LATEST at it."""
+    version = version or datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    out_dir = root / version
+    if out_dir.exists():
+        raise FileExistsError(f"{out_dir} already exists; pick a new --version")
+    out_dir.mkdir(parents=True)
+
+    # Eager attention traces to a graph that is valid for any padding mask
+    model = AutoModelForSequenceClassification.from_pretrained(model_path, attn_implementation="eager")
+    model.config.return_dict = False
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    sample = tokenizer(["export sample", "a longer export sample text"], return_tensors="pt", padding=True)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ("input_ids", "attention_mask")}
+    dynamic_axes["logits"] = {0: "batch"}
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        str(out_dir / "model.onnx"),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=opset,
+        dynamo=False,
+    )
+    tokenizer.save_pretrained(out_dir)
+
+    manifest = {
+        "version": version,
+        "source_model": str(model_path),
+        "opset": opset,
+        "labels": LABELS,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    with open(out_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Flip the pointer atomically so readers never see a half-written name
+    tmp_pointer = root / f".{LATEST_POINTER}.tmp"
+    tmp_pointer.write_text(version)
+    os.replace(tmp_pointer, root / LATEST_POINTER)
+    return out_dir
+
+# --- CLI Entry Point ---
+def main():
+    parser = argparse.ArgumentParser(description="Export the emotion classifier to ONNX")
+    parser.add_argument("--model-path", type=str, default=MODEL_PATH, help="Fine-tuned HF model directory")
+    parser.add_argument("--output-root", type=Path, default=ONNX_ROOT, help="Root of versioned ONNX artifacts")
+    parser.add_argument("--version", type=str, default=None, help="Artifact version (default: UTC timestamp)")
+    parser.add_argument("--opset", type=int, default=OPSET, help="ONNX opset version")
+    args = parser.parse_args()
+
+    out_dir = export_onnx(args.model_path, args.output_root, args.version, args.opset)
+    print(f"[✓] Exported ONNX model to {out_dir}")
+
+if __name__ == "__main__":
+    main()
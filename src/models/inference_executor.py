@@ -0,0 +1,85 @@
+# inference_executor.py
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class ExecutorSaturated(Exception):
+    """Raised instead of queueing when the executor already holds `max_pending` calls."""
+
+
+class InferenceExecutor:
+    """Dedicated, bounded thread pool for blocking model calls.
+
+    Keeps inference off the server's shared threadpool and caps the number of
+    queued + running calls, so overload turns into fast rejections instead of
+    unbounded queueing latency. Callers that can't reject (e.g. mid-stream)
+    submit with `block=True` and wait for a slot to free up instead.
+    """
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 64, name: str = "inference"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)
+        self._pending = 0
+        self._waiting = 0
+        self._running = 0
+        self._busy_seconds = 0.0
+        self._started = time.monotonic()
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable, *args, block: bool = False, timeout: Optional[float] = None) -> Future:
+        """Run `fn(*args)` on the pool; raises ExecutorSaturated if full (after `timeout`, when blocking)."""
+        with self._lock:
+            if block and self._pending >= self.max_pending:
+                self._waiting += 1
+                try:
+                    self._freed.wait_for(lambda: self._pending < self.max_pending, timeout)
+                finally:
+                    self._waiting -= 1
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated(f"{self._pending} inference calls already pending")
+            self._pending += 1
+        future = self._pool.submit(self._run, fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, fn: Callable, *args):
+        start = time.monotonic()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._busy_seconds += time.monotonic() - start
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            self._freed.notify()
+
+    def stats(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._pending - self._running,
+                "running": self._running,
+                "waiting": self._waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "busy_seconds": self._busy_seconds,
+                "utilization": self._busy_seconds / (elapsed * self.max_workers) if elapsed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
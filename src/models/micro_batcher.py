@@ -0,0 +1,165 @@
+# micro_batcher.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+# Sentinel used to stop the worker thread
+_STOP = object()
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item requests into batched model calls.
+
+    Callers `submit` an item and get back a Future. A single worker thread
+    drains the bounded queue, waiting at most `max_wait_ms` after the first
+    item for more to arrive, and stops early once `max_batch_size` items or
+    the padded `max_batch_tokens` budget is reached. `batch_fn` receives the
+    list of items and must return one result per item, in order; a call that
+    raises or returns a different number of results fails the whole batch.
+
+    After `close()` the batcher drains what was already queued and refuses
+    new items.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_wait_ms: float = 5.0,
+        max_batch_size: int = 32,
+        max_batch_tokens: Optional[int] = None,
+        max_queue_size: int = 1024,
+        name: str = "micro-batcher",
+    ):
+        self.batch_fn = batch_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._carry = None  # item that did not fit in the previous batch
+        self._batches = 0
+        self._items = 0
+        self._busy_seconds = 0.0
+        self._started = time.monotonic()
+        # Started on first submit, so a pre-fork parent can build the batcher
+        # without handing children a worker thread that does not survive fork()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    # --- Public API ---
+    def submit(self, item: Any, cost: int = 1, block: bool = True, timeout: Optional[float] = None) -> Future:
+        """Queue `item` for the next batch. Raises queue.Full if the queue stays full, RuntimeError once closed."""
+        if self._closed:
+            raise RuntimeError("micro-batcher is closed")
+        if not self._thread.is_alive():
+            self._start()
+        future = Future()
+        self._queue.put((item, cost, future), block=block, timeout=timeout)
+        if self._closed and not self._thread.is_alive():
+            self._fail_queued()  # close() finished between our check and put; nothing will run it
+        return future
+
+    def predict(self, item: Any, cost: int = 1) -> Any:
+        return self.submit(item, cost).result()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+            "busy_seconds": self._busy_seconds,
+            "utilization": self._busy_seconds / elapsed if elapsed else 0.0,
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        with self._start_lock:
+            self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._fail_queued()
+
+    def _start(self):
+        with self._start_lock:
+            if self._closed:
+                raise RuntimeError("micro-batcher is closed")
+            if self._thread.ident is None:
+                self._started = time.monotonic()
+                self._thread.start()
+
+    def _fail_queued(self):
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not _STOP and entry[2].set_running_or_notify_cancel():
+                entry[2].set_exception(RuntimeError("micro-batcher is closed"))
+
+    # --- Worker ---
+    def _fits(self, batch: list, max_cost: int, cost: int) -> bool:
+        if len(batch) >= self.max_batch_size:
+            return False
+        if self.max_batch_tokens is None:
+            return True
+        # Every row is padded to the longest one in the batch
+        return (len(batch) + 1) * max(max_cost, cost) <= self.max_batch_tokens
+
+    def _collect(self) -> Optional[list]:
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is _STOP:
+            return None
+
+        batch = [first]
+        max_cost = first[1]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP or not self._fits(batch, max_cost, item[1]):
+                self._carry = item
+                break
+            batch.append(item)
+            max_cost = max(max_cost, item[1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Drop requests whose callers already gave up
+            batch = [b for b in batch if b[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.monotonic()
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self._busy_seconds += time.monotonic() - start
+
+            if len(results) != len(batch):
+                error = ValueError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+                for _, _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+            self._batches += 1
+            self._items += len(batch)
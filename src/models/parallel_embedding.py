@@ -0,0 +1,119 @@
+# parallel_embedding.py
+#
+# Sentence embeddings across a pool of worker processes, each with its own
+# model copy and a fixed torch thread count. One process running torch with
+# every core stops scaling well past a few threads on small encoders, so a
+# bulk job (an index build) does better with several processes of a few
+# threads each:
+#
+#   with EmbeddingPool() as pool:          # EMBED_WORKERS x EMBED_THREADS, auto by default
+#       vectors = pool.encode(texts)       # shards go to the workers, results come back in order
+#
+# `choose_split` picks the split from the CPUs this process may use and the
+# memory available for model copies; scripts/benchmark_retrieval.py
+# embed-scaling measures entries/sec for each split on a given box.
+
+import multiprocessing as mp
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from src.models.registry import DEVICE, EMBED_MODEL
+
+# --- Config ---
+WORKERS = int(os.getenv("EMBED_WORKERS", "0"))  # 0 picks from the CPU count
+THREADS = int(os.getenv("EMBED_THREADS", "0"))  # torch threads per worker; 0 picks from the CPU count
+WORKER_MB = int(os.getenv("EMBED_WORKER_MB", "700"))  # resident size of one worker with its model loaded
+SHARDS_PER_WORKER = 4  # smaller shards even out workers that finish early
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def available_memory_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+def choose_split(cpus: Optional[int] = None, memory_mb: Optional[int] = None, worker_mb: int = WORKER_MB,
+                 workers: int = WORKERS, threads: int = THREADS) -> Tuple[int, int]:
+    """(processes, torch threads per process) for `cpus` cores; explicit `workers`/`threads` win."""
+    cpus = cpus or available_cpus()
+    if not threads:
+        # Matmuls on short sequences scale to a few threads; beyond that another process is worth more
+        threads = cpus // workers if workers else (1 if cpus < 4 else 2 if cpus < 16 else 4)
+    threads = max(1, threads)
+    if not workers:
+        workers = max(1, cpus // threads)
+        if memory_mb:
+            workers = max(1, min(workers, memory_mb // worker_mb))
+    return workers, threads
+
+
+# --- Worker side ---
+_model = None
+
+def _init_worker(model_name: str, threads: int):
+    global _model
+    import torch
+    from src.models.registry import get_sentence_transformer
+
+    torch.set_num_threads(threads)
+    _model = get_sentence_transformer(model_name, device="cpu")
+
+def _encode_shard(args) -> np.ndarray:
+    texts, batch_size = args
+    return np.asarray(_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+# --- Pool ---
+class EmbeddingPool:
+    """`encode` with the same signature as a SentenceTransformer, spread over worker processes.
+
+    With one worker (one core, or a GPU) it encodes in this process instead,
+    so callers can use it unconditionally.
+    """
+
+    def __init__(self, model_name: str = EMBED_MODEL, workers: int = WORKERS, threads: int = THREADS):
+        self.model_name = model_name
+        if DEVICE != "cpu":
+            workers, threads = 1, threads or available_cpus()  # one process drives the accelerator
+        self.workers, self.threads = choose_split(workers=workers, threads=threads, memory_mb=available_memory_mb())
+        self._pool = None
+
+    def start(self):
+        if self.workers > 1 and self._pool is None:
+            # spawn, not fork: torch's thread pools don't survive a fork
+            self._pool = mp.get_context("spawn").Pool(self.workers, _init_worker, (self.model_name, self.threads))
+        return self
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if self.workers == 1:
+            from src.models.registry import get_sentence_transformer
+
+            return np.asarray(get_sentence_transformer(self.model_name).encode(texts, batch_size=batch_size),
+                              dtype=np.float32)
+        self.start()
+        shard = max(batch_size, -(-len(texts) // (self.workers * SHARDS_PER_WORKER)))
+        shards = [(texts[i:i + shard], batch_size) for i in range(0, len(texts), shard)]
+        parts = self._pool.map(_encode_shard, shards)  # map keeps input order
+        return np.concatenate(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,50 +1,221 @@
 # predict_emotions.py
+#
+#   python -m src.models.predict_emotions --text "I finally slept well"
+#   python -m src.models.predict_emotions --input journals.jsonl --output tagged.jsonl --workers 4
+#   cat journals.jsonl | python -m src.models.predict_emotions --input - > tagged.jsonl
 
 import argparse
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import numpy as np
+import json
+import multiprocessing as mp
+import os
+import sys
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from src.models.emotion_backends import BACKEND, LABELS
+from src.models.registry import get_emotion_backend
 
 # --- Config ---
-MODEL_PATH = "models/emotion_classifier"
-LABELS = [
-    "admiration", "amusement", "anger", "annoyance", "approval", "caring", "confusion", "curiosity",
-    "desire", "disappointment", "disapproval", "disgust", "embarrassment", "excitement", "fear",
-    "gratitude", "grief", "joy", "love", "nervousness", "optimism", "pride", "realization",
-    "relief", "remorse", "sadness", "surprise", "neutral"
-]
+TEXT_FIELD = "entry"
+CHUNK_SIZE = 1024  # records read, scored and written per step; bounds memory
+BATCH_SIZE = 32    # texts per padded forward pass inside a chunk
+SKIPPED_OFFSETS_KEPT = 100  # byte offsets of malformed lines recorded in the checkpoint
 
 # --- Load model ---
-def load_model():
-    model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-    model.eval()
-    return model, tokenizer
+def load_model(backend_name=None):
+    return get_emotion_backend(backend_name)
 
 # --- Predict ---
-def predict_emotions(text, model, tokenizer, threshold=0.5):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.sigmoid(logits).numpy()[0]
+def predict_emotions(text, backend, threshold=0.5):
+    probs = backend.predict_proba([text])[0]
     predicted_labels = [LABELS[i] for i, p in enumerate(probs) if p >= threshold]
     return predicted_labels
 
+def tag_records(records: List[dict], backend, threshold=0.5, text_field=TEXT_FIELD, batch_size=BATCH_SIZE) -> List[dict]:
+    """Add `emotions` and `probabilities` to each record, scoring in token-budgeted batches."""
+    texts = [str(r.get(text_field) or "") for r in records]
+    probs = backend.predict_proba(texts, batch_size)
+    for record, p in zip(records, probs):
+        record["emotions"] = [LABELS[i] for i, v in enumerate(p) if v >= threshold]
+        record["probabilities"] = {label: round(float(v), 6) for label, v in zip(LABELS, p)}
+    return records
+
+# --- JSONL streaming ---
+def line_ranges(path: Path, workers: int) -> List[Tuple[int, int]]:
+    """Split a file into `workers` byte ranges; a line belongs to the range its first byte falls in."""
+    size = path.stat().st_size
+    step = -(-size // workers) if size else 0
+    return [(min(i * step, size), min((i + 1) * step, size)) for i in range(workers)]
+
+def read_lines(f: BinaryIO, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[bytes, int]]:
+    """Yield (line, offset after the line) for lines starting in [start, end)."""
+    pos = start
+    if start > 0:
+        # Back up one byte: if it is a newline we are on a line boundary, otherwise skip the partial line
+        if f.seekable():
+            f.seek(start - 1)
+        else:
+            f.read(start - 1)
+        pos = start - 1 + len(f.readline())
+    while end is None or pos < end:
+        line = f.readline()
+        if not line:
+            return
+        pos += len(line)
+        yield line, pos
+
+def read_chunks(f: BinaryIO, start: int, end: Optional[int], chunk_size: int) -> Iterator[Tuple[List[dict], int, List[int]]]:
+    """Yield (records, offset after them, byte offsets of the malformed lines skipped among them)."""
+    records, skipped, pos = [], [], start
+    for line, pos in read_lines(f, start, end):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if isinstance(record, dict):
+                records.append(record)
+            else:
+                print(f"[!] Skipping malformed line at byte {pos - len(line)}", file=sys.stderr)
+                skipped.append(pos - len(line))
+        if len(records) >= chunk_size:
+            yield records, pos, skipped
+            records, skipped = [], []
+    if records or skipped or pos > start:
+        yield records, pos, skipped
+
+# --- Checkpoints ---
+def checkpoint_path(output: Path) -> Path:
+    return output.with_name(output.name + ".ckpt")
+
+def load_checkpoint(output: Path) -> Optional[dict]:
+    path = checkpoint_path(output)
+    return json.loads(path.read_text()) if path.exists() else None
+
+def save_checkpoint(output: Path, state: dict):
+    path = checkpoint_path(output)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+def tag_file(input_path: str, output_path: str, backend, threshold=0.5, text_field=TEXT_FIELD,
+             start: int = 0, end: Optional[int] = None, resume: bool = False,
+             chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE) -> dict:
+    """Stream JSONL records from input_path[start:end) to output_path, one chunk at a time.
+
+    With a file output, a checkpoint (`<output>.ckpt`) records the next input
+    offset and the output size after every flushed chunk; `resume` truncates
+    the output back to that size and continues from that offset. '-' means
+    stdin/stdout, which cannot be resumed. Lines that aren't JSON objects are
+    skipped; the checkpoint counts them and keeps the first offsets.
+    """
+    to_file = output_path != "-"
+    output = Path(output_path)
+    state = {"input": input_path, "start": start, "end": end, "offset": start, "output_bytes": 0, "records": 0,
+             "skipped": 0, "skipped_offsets": []}
+    if resume and to_file:
+        saved = load_checkpoint(output)
+        if saved is not None:
+            if (saved["input"], saved["start"], saved["end"]) != (input_path, start, end):
+                raise ValueError(f"Checkpoint for {output} was written for a different input range")
+            state = {"skipped": 0, "skipped_offsets": [], **saved}
+
+    fin = sys.stdin.buffer if input_path == "-" else open(input_path, "rb")
+    if to_file:
+        fout = open(output, "r+b" if state["output_bytes"] else "wb")
+        fout.truncate(state["output_bytes"])
+        fout.seek(state["output_bytes"])
+    else:
+        fout = sys.stdout.buffer
+    try:
+        for records, offset, skipped in read_chunks(fin, state["offset"], end, chunk_size):
+            tagged = tag_records(records, backend, threshold, text_field, batch_size) if records else []
+            fout.write(b"".join(json.dumps(r, ensure_ascii=False).encode() + b"\n" for r in tagged))
+            fout.flush()
+            state["offset"] = offset
+            state["records"] += len(records)
+            state["skipped"] += len(skipped)
+            state["skipped_offsets"] = (state["skipped_offsets"] + skipped)[:SKIPPED_OFFSETS_KEPT]
+            if to_file:
+                os.fsync(fout.fileno())
+                state["output_bytes"] = fout.tell()
+                save_checkpoint(output, state)
+    finally:
+        if fin is not sys.stdin.buffer:
+            fin.close()
+        if to_file:
+            fout.close()
+    return state
+
+# --- Parallel ---
+def part_path(output: Path, index: int) -> Path:
+    return output.with_name(f"{output.name}.part{index}")
+
+def _tag_part(args) -> dict:
+    input_path, output_path, backend_name, start, end, options = args
+    backend = load_model(backend_name)  # once per worker process
+    return tag_file(input_path, output_path, backend, start=start, end=end, **options)
+
+def tag_file_parallel(input_path: str, output_path: str, workers: int, backend_name=None, **options) -> dict:
+    """Score byte ranges of input_path in `workers` processes, then concatenate the parts in order."""
+    output = Path(output_path)
+    ranges = line_ranges(Path(input_path), workers)
+    jobs = [(input_path, str(part_path(output, i)), backend_name, start, end, options)
+            for i, (start, end) in enumerate(ranges)]
+    with mp.get_context("spawn").Pool(workers) as pool:
+        states = pool.map(_tag_part, jobs)
+
+    with open(output, "wb") as fout:
+        for i in range(workers):
+            part = part_path(output, i)
+            with open(part, "rb") as fin:
+                while block := fin.read(1 << 20):
+                    fout.write(block)
+    for i in range(workers):
+        part_path(output, i).unlink()
+        checkpoint_path(part_path(output, i)).unlink(missing_ok=True)
+    return {"records": sum(s["records"] for s in states), "skipped": sum(s["skipped"] for s in states)}
+
 # --- CLI Entry Point ---
 def main():
     parser = argparse.ArgumentParser(description="Emotion Tagging for Journal Text")
-    parser.add_argument("--text", type=str, required=True, help="Journal entry text")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--text", type=str, help="Journal entry text")
+    source.add_argument("--input", type=str, help="JSONL file of records to tag ('-' for stdin)")
+    parser.add_argument("--output", type=str, default="-", help="JSONL output for --input ('-' for stdout)")
+    parser.add_argument("--text-field", type=str, default=TEXT_FIELD, help="Record field holding the text")
     parser.add_argument("--threshold", type=float, default=0.5, help="Prediction threshold")
+    parser.add_argument("--backend", type=str, default=BACKEND, choices=["torch", "onnxruntime"], help="Inference backend")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Records held in memory at a time")
+    parser.add_argument("--workers", type=int, default=1, help="Processes splitting the input by byte range")
+    parser.add_argument("--start-offset", type=int, default=0, help="Byte offset of the input to start from")
+    parser.add_argument("--resume", action="store_true", help="Continue from the output's checkpoint")
     args = parser.parse_args()
 
-    model, tokenizer = load_model()
-    emotions = predict_emotions(args.text, model, tokenizer, args.threshold)
+    if args.text is not None:
+        backend = load_model(args.backend)
+        emotions = predict_emotions(args.text, backend, args.threshold)
+
+        print("\nJournal Entry:")
+        print(args.text)
+        print("\nPredicted Emotions:")
+        print(emotions if emotions else "[No emotion above threshold]")
+        return
 
-    print("\nJournal Entry:")
-    print(args.text)
-    print("\nPredicted Emotions:")
-    print(emotions if emotions else "[No emotion above threshold]")
+    options = dict(threshold=args.threshold, text_field=args.text_field, resume=args.resume,
+                   chunk_size=args.chunk_size, batch_size=args.batch_size)
+    if args.workers > 1:
+        if args.input == "-" or args.output == "-":
+            parser.error("--workers needs file paths for --input and --output")
+        if args.start_offset:
+            parser.error("--start-offset cannot be combined with --workers; use --resume")
+        state = tag_file_parallel(args.input, args.output, args.workers, args.backend, **options)
+    else:
+        backend = load_model(args.backend)
+        state = tag_file(args.input, args.output, backend, start=args.start_offset, **options)
+    print(f"[✓] Tagged {state['records']} records -> {args.output}", file=sys.stderr)
+    if state["skipped"]:
+        print(f"[!] Skipped {state['skipped']} malformed lines", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
@@ -0,0 +1,125 @@
+# quantize_emotion_classifier.py
+
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from pathlib import Path
+import numpy as np
+import torch
+from sklearn.metrics import f1_score
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from src.models.emotion_backends import INT8_MODEL_PATH, INT8_WEIGHTS, LABELS, TorchEmotionBackend, quantize_model
+from src.models.train_emotion_classifier import DATA_PATH, OUTPUT_DIR, load_data, split_dataset
+
+# --- Config ---
+MODEL_PATH = OUTPUT_DIR
+INT8_OUTPUT_DIR = Path(INT8_MODEL_PATH)
+REPORT_PATH = Path("outputs/quantization_report.json")
+THRESHOLD = 0.5
+BATCH_SIZE = 32
+LATENCY_SAMPLES = 100
+
+# --- Quantize ---
+def quantize_and_save(model_path: Path, output_dir: Path):
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    qmodel = quantize_model(model.eval())
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model.config.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_dir)
+    torch.save(qmodel.state_dict(), output_dir / INT8_WEIGHTS)
+
+def weights_size_mb(model_dir: Path) -> float:
+    patterns = ("*.safetensors", "*.bin", "*.pt")
+    return sum(p.stat().st_size for pattern in patterns for p in Path(model_dir).glob(pattern)) / 2**20
+
+# --- Evaluate one variant (runs in a fresh process so RSS is not shared) ---
+def evaluate_variant(model_path: str, quantized: bool, texts: list) -> dict:
+    backend = TorchEmotionBackend(model_path, quantized=quantized)
+    rss_after_load = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    start = time.perf_counter()
+    probs = np.concatenate([backend.predict_proba(texts[i:i + BATCH_SIZE]) for i in range(0, len(texts), BATCH_SIZE)])
+    batch_seconds = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        backend.predict_proba([text])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "probs": probs,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+        "batch_throughput_per_s": len(texts) / batch_seconds,
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+# --- Report ---
+def build_report(y_true: np.ndarray, results: dict, sizes: dict) -> dict:
+    report = {"threshold": THRESHOLD, "n_heldout": int(len(y_true)), "variants": {}, "per_label_f1": {}}
+    per_label = {}
+    for variant, result in results.items():
+        y_pred = (result.pop("probs") >= THRESHOLD).astype(int)
+        per_label[variant] = f1_score(y_true, y_pred, average=None, labels=range(len(LABELS)), zero_division=0)
+        report["variants"][variant] = {
+            "micro_f1": float(f1_score(y_true, y_pred, average="micro", zero_division=0)),
+            "macro_f1": float(f1_score(y_true, y_pred, average="macro", zero_division=0)),
+            "weights_size_mb": sizes[variant],
+            **result,
+        }
+    for i, label in enumerate(LABELS):
+        row = {variant: float(scores[i]) for variant, scores in per_label.items()}
+        row["delta"] = row["int8"] - row["fp32"]
+        report["per_label_f1"][label] = row
+    return report
+
+def print_report(report: dict):
+    print(f"\n{'variant':<8}{'micro F1':>10}{'macro F1':>10}{'p50 ms':>9}{'p99 ms':>9}{'texts/s':>9}{'RSS MB':>9}{'size MB':>9}")
+    for variant, r in report["variants"].items():
+        print(
+            f"{variant:<8}{r['micro_f1']:>10.3f}{r['macro_f1']:>10.3f}{r['latency_p50_ms']:>9.1f}{r['latency_p99_ms']:>9.1f}"
+            f"{r['batch_throughput_per_s']:>9.1f}{r['peak_rss_mb']:>9.0f}{r['weights_size_mb']:>9.1f}"
+        )
+    worst = sorted(report["per_label_f1"].items(), key=lambda kv: kv[1]["delta"])[:5]
+    print("\nLargest per-label F1 drops (int8 - fp32):")
+    for label, row in worst:
+        print(f"  {label:<15}{row['fp32']:.3f} -> {row['int8']:.3f} ({row['delta']:+.3f})")
+
+# --- Main ---
+def main():
+    parser = argparse.ArgumentParser(description="Dynamic INT8 quantization of the emotion classifier")
+    parser.add_argument("--model-path", type=Path, default=MODEL_PATH, help="Fine-tuned fp32 model directory")
+    parser.add_argument("--output-dir", type=Path, default=INT8_OUTPUT_DIR, help="Where to write the int8 variant")
+    parser.add_argument("--report", type=Path, default=REPORT_PATH, help="Where to write the comparison report")
+    parser.add_argument("--skip-quantize", action="store_true", help="Only re-run the report on an existing int8 variant")
+    args = parser.parse_args()
+
+    if not args.skip_quantize:
+        print("[+] Quantizing Linear layers to INT8...")
+        quantize_and_save(args.model_path, args.output_dir)
+        print(f"[✓] Saved INT8 model to {args.output_dir}")
+
+    heldout = split_dataset(load_data(DATA_PATH))["test"]
+    texts, y_true = list(heldout["text"]), np.array(heldout["labels"])
+    print(f"[+] Evaluating fp32 and int8 on {len(texts)} held-out entries...")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for variant, path, quantized in [("fp32", args.model_path, False), ("int8", args.output_dir, True)]:
+        with ctx.Pool(1) as pool:
+            results[variant] = pool.apply(evaluate_variant, (str(path), quantized, texts))
+
+    sizes = {"fp32": weights_size_mb(args.model_path), "int8": weights_size_mb(args.output_dir)}
+    report = build_report(y_true, results, sizes)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\n[✓] Saved report to {args.report}")
+
+if __name__ == "__main__":
+    main()
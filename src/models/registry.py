@@ -0,0 +1,184 @@
+# registry.py
+#
+# Process-wide registry of loaded models. Every module asks the registry
+# instead of constructing its own copy, so one process holds one instance
+# per (kind, name, variant, device), e.g.:
+#
+#   embedder = get_sentence_transformer("all-MiniLM-L6-v2")
+#   backend = get_emotion_backend()
+
+import gc
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# --- Config ---
+DEVICE = os.getenv("MODEL_DEVICE", "cpu")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")  # shared by RAG, summaries and evaluation
+
+Key = Tuple[str, str, str, str]  # (kind, name, variant, device)
+
+
+class ModelEntry:
+    """One registry slot: the instance plus what loading it cost."""
+
+    def __init__(self):
+        self.model = None
+        self.load_seconds = 0.0
+        self.rss_delta_mb = None
+        self.param_mb = None
+        self.loaded_at = 0.0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+
+def rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+def param_mb(model: Any) -> Optional[float]:
+    """Size of the torch parameters and buffers reachable from `model`, or None if it holds none."""
+    import torch
+
+    if isinstance(model, torch.nn.Module):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors) / 2**20
+    if isinstance(model, (tuple, list)):
+        sizes = [s for s in (param_mb(m) for m in model) if s is not None]
+        return sum(sizes) if sizes else None
+    if hasattr(model, "model"):
+        return param_mb(model.model)
+    return None
+
+
+class ModelRegistry:
+    """Hands out one shared instance per (kind, name, variant, device).
+
+    `kind` selects a loader registered with `register_loader`. Loads of the
+    same key are serialized, so concurrent first calls share one load, while
+    different models can load in parallel. The returned objects are shared:
+    callers must treat them as read-only.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[str, str, str], Any]] = {}
+        self._entries: Dict[Key, ModelEntry] = {}
+        self._lock = threading.Lock()
+
+    def register_loader(self, kind: str, loader: Callable[[str, str, str], Any]):
+        """`loader(name, variant, device)` builds a fresh instance."""
+        self._loaders[kind] = loader
+
+    # --- Lookup ---
+    def get(self, kind: str, name: str, variant: str = "default", device: str = DEVICE) -> Any:
+        key = (kind, name, variant, device)
+        with self._lock:
+            if kind not in self._loaders:
+                raise KeyError(f"No loader registered for model kind {kind!r}")
+            entry = self._entries.setdefault(key, ModelEntry())
+        with entry.lock:
+            if entry.model is None:
+                self._load(key, entry)
+            entry.hits += 1
+            return entry.model
+
+    def _load(self, key: Key, entry: ModelEntry):
+        kind, name, variant, device = key
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        entry.model = self._loaders[kind](name, variant, device)
+        entry.load_seconds = time.perf_counter() - start
+        rss_after = rss_mb()
+        entry.rss_delta_mb = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        entry.param_mb = param_mb(entry.model)
+        entry.loaded_at = time.time()
+
+    # --- Lifecycle ---
+    def unload(self, kind: str, name: str, variant: str = "default", device: str = DEVICE) -> bool:
+        """Drop the registry's reference; memory is freed once callers release theirs too."""
+        with self._lock:
+            entry = self._entries.pop((kind, name, variant, device), None)
+        if entry is None:
+            return False
+        with entry.lock:
+            entry.model = None
+        gc.collect()
+        return True
+
+    def reload(self, kind: str, name: str, variant: str = "default", device: str = DEVICE) -> Any:
+        self.unload(kind, name, variant, device)
+        return self.get(kind, name, variant, device)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+        for key in keys:
+            self.unload(*key)
+
+    def stats(self) -> list:
+        with self._lock:
+            items = list(self._entries.items())
+        return [
+            {
+                "kind": kind, "name": name, "variant": variant, "device": device,
+                "loaded": entry.model is not None,
+                "load_seconds": entry.load_seconds,
+                "rss_delta_mb": entry.rss_delta_mb,
+                "param_mb": entry.param_mb,
+                "hits": entry.hits,
+            }
+            for (kind, name, variant, device), entry in items
+        ]
+
+
+# --- Loaders (imports deferred so the registry itself stays cheap to import) ---
+def _load_sentence_transformer(name: str, variant: str, device: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name, device=device)
+
+def _load_sequence_classifier(name: str, variant: str, device: str):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    model = AutoModelForSequenceClassification.from_pretrained(name).to(device).eval()
+    return model, AutoTokenizer.from_pretrained(name)
+
+def _load_emotion_backend(name: str, variant: str, device: str):
+    from src.models.emotion_backends import load_backend
+    backend, _, quantized = variant.partition(":")
+    return load_backend(backend, name or None, quantized == "int8")
+
+def _load_detoxify(name: str, variant: str, device: str):
+    from detoxify import Detoxify
+    return Detoxify(name, device=device)
+
+registry = ModelRegistry()
+registry.register_loader("sentence-transformer", _load_sentence_transformer)
+registry.register_loader("sequence-classifier", _load_sequence_classifier)
+registry.register_loader("emotion-backend", _load_emotion_backend)
+registry.register_loader("detoxify", _load_detoxify)
+
+# --- Shortcuts ---
+def get_sentence_transformer(name: str = EMBED_MODEL, device: str = DEVICE):
+    return registry.get("sentence-transformer", name, device=device)
+
+def get_sequence_classifier(name: str, device: str = DEVICE):
+    """(model in eval mode, tokenizer) for a HF sequence-classification checkpoint."""
+    return registry.get("sequence-classifier", name, device=device)
+
+def get_emotion_backend(backend: Optional[str] = None, model_path: Optional[str] = None,
+                        quantized: Optional[bool] = None):
+    """The emotion classifier, resolved with the same EMOTION_* defaults as `load_backend`."""
+    from src.models.emotion_backends import BACKEND, INT8_MODEL_PATH, MODEL_PATH, QUANTIZED
+
+    backend = backend or BACKEND
+    quantized = QUANTIZED if quantized is None else quantized
+    if model_path is None:
+        model_path = INT8_MODEL_PATH if quantized else (MODEL_PATH if backend == "torch" else "")
+    variant = f"{backend}:int8" if quantized else backend
+    return registry.get("emotion-backend", model_path, variant, device="cpu")
+
+def get_detoxify(name: str = "original", device: str = DEVICE):
+    return registry.get("detoxify", name, device=device)
@@ -0,0 +1,69 @@
+# token_batching.py
+#
+# Shared length-bucketed batching for HF tokenizer + model calls. Inputs are
+# sorted by token length and packed into batches whose padded size stays
+# under a token budget, so one long text no longer pads a whole batch; results
+# come back in the caller's original order.
+
+import os
+from typing import Callable, List, Sequence
+import numpy as np
+
+# --- Config ---
+MAX_BATCH_TOKENS = int(os.getenv("INFERENCE_MAX_BATCH_TOKENS", "8192"))  # padded tokens per forward pass
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "64"))
+
+# --- Planning ---
+def plan_batches(lengths: Sequence[int], max_tokens: int = MAX_BATCH_TOKENS,
+                 max_batch_size: int = MAX_BATCH_SIZE) -> List[List[int]]:
+    """Group indices into batches of similar length whose padded size fits `max_tokens`.
+
+    A single input longer than the budget still gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, batch = [], []
+    for i in order:
+        # Sorted ascending, so the newcomer is always the longest row
+        if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * lengths[i] > max_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def padding_stats(lengths: Sequence[int], batches: List[List[int]]) -> dict:
+    """Real vs padded token counts for running `lengths` as `batches`."""
+    real = int(sum(lengths))
+    padded = int(sum(len(b) * max(lengths[i] for i in b) for b in batches))
+    return {
+        "batches": len(batches),
+        "real_tokens": real,
+        "padded_tokens": padded,
+        "padding_waste": 1 - real / padded if padded else 0.0,
+    }
+
+# --- Running ---
+def run_batched(tokenizer, encodings, forward: Callable, return_tensors: str = "np",
+                max_tokens: int = MAX_BATCH_TOKENS, max_batch_size: int = MAX_BATCH_SIZE) -> np.ndarray:
+    """Run `forward` over already-tokenized (unpadded) `encodings` in token-budgeted batches.
+
+    `forward` gets one padded batch (as `return_tensors`) and returns an array
+    with one row per input; the rows are reassembled in the original order.
+    """
+    keys = [k for k in tokenizer.model_input_names if k in encodings]
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    outputs = None
+    for batch in plan_batches(lengths, max_tokens, max_batch_size):
+        inputs = tokenizer.pad([{k: encodings[k][i] for k in keys} for i in batch], return_tensors=return_tensors)
+        result = np.asarray(forward(inputs))
+        if outputs is None:
+            outputs = np.empty((len(lengths),) + result.shape[1:], dtype=result.dtype)
+        outputs[batch] = result
+    return outputs if outputs is not None else np.empty((0,))
+
+def run_texts(tokenizer, texts: List[str], forward: Callable, return_tensors: str = "np",
+              max_tokens: int = MAX_BATCH_TOKENS, max_batch_size: int = MAX_BATCH_SIZE) -> np.ndarray:
+    """Tokenize (truncating to the model length) and run `texts` through `run_batched`."""
+    encodings = tokenizer(list(texts), truncation=True)
+    return run_batched(tokenizer, encodings, forward, return_tensors, max_tokens, max_batch_size)
@@ -11,6 +11,8 @@ import torch
 MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
 DATA_PATH = Path("data/interim/journals.jsonl")
 OUTPUT_DIR = Path("models/emotion_classifier")
+TEST_SIZE = 0.2
+SPLIT_SEED = 42  # fixed so reports on the held-out split see the same rows as training
 LABELS = [  # Based on GoEmotions
     "admiration", "amusement", "anger", "annoyance", "approval", "caring", "confusion", "curiosity",
     "desire", "disappointment", "disapproval", "disgust", "embarrassment", "excitement", "fear",
@@ -35,6 +37,12 @@ def binarize_labels(data):
     Y = mlb.fit_transform([d["labels"] for d in data])
     return Y, mlb
 
+def split_dataset(raw_data):
+    Y, _ = binarize_labels(raw_data)
+    texts = [d["text"] for d in raw_data]
+    data = Dataset.from_dict({"text": texts, "labels": Y.tolist()})
+    return data.train_test_split(test_size=TEST_SIZE, seed=SPLIT_SEED)
+
 # --- Tokenization ---
 def tokenize_function(examples, tokenizer):
     return tokenizer(examples["text"], truncation=True, padding=True)
@@ -50,12 +58,7 @@ def compute_metrics(eval_pred):
 # --- Main ---
 def main():
     raw_data = load_data(DATA_PATH)
-    Y, mlb = binarize_labels(raw_data)
-
-    texts = [d["text"] for d in raw_data]
-    data = Dataset.from_dict({"text": texts, "labels": Y.tolist()})
-
-    train_test = data.train_test_split(test_size=0.2)
+    train_test = split_dataset(raw_data)
 
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
     tokenized = train_test.map(lambda x: tokenize_function(x, tokenizer), batched=True)
@@ -3,9 +3,10 @@ from pathlib import Path
 from collections import Counter
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import MultiLabelBinarizer
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import numpy as np
+from src.models.registry import get_sequence_classifier
+from src.models.token_batching import run_texts
 
 # --- Config ---
 DATA_PATH = Path("data/interim/journals.jsonl")
@@ -44,16 +45,15 @@ def plot_emotion_distribution(entries):
 
 # --- Load model and tokenizer ---
 def load_model():
-    model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-    return model, tokenizer
+    return get_sequence_classifier(str(MODEL_PATH))
 
 # --- Predict on unseen data ---
 def predict_emotions(model, tokenizer, texts, top_k=3):
-    inputs = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-        probs = torch.sigmoid(logits).numpy()
+    def forward(inputs):
+        with torch.no_grad():
+            return torch.sigmoid(model(**inputs.to(model.device)).logits).cpu().numpy()
+
+    probs = run_texts(tokenizer, texts, forward, return_tensors="pt")
     predictions = []
     for p in probs:
         top_labels = [LABELS[i] for i in np.argsort(p)[::-1][:top_k] if p[i] > 0.5]
@@ -1,15 +1,34 @@
-from sentence_transformers import SentenceTransformer
+import argparse
 import faiss
 import json
+import os
+import shutil
+import time
 from pathlib import Path
-from tqdm import tqdm
+from typing import Optional, Tuple
 import numpy as np
-import pickle
+from src.models.embedding_cache import ENABLED as CACHE_ENABLED, EmbeddingCache
+from src.models.parallel_embedding import THREADS, WORKERS, EmbeddingPool
+from src.models.registry import EMBED_MODEL
+from src.rag.metadata_store import write_metadata
 
 # --- Config ---
 DATA_PATH = Path("data/interim/journals.jsonl")
 INDEX_DIR = Path("data/processed/faiss_index")
-EMBED_MODEL = "all-MiniLM-L6-v2"
+INDEX_FILE = "journal_index.faiss"
+METADATA_FILE = "journal_metadata.cols"
+KEEP_VERSIONS = int(os.getenv("FAISS_KEEP_VERSIONS", "3"))  # published versions kept on disk, the current one included
+INDEX_TYPES = ("flat", "flat-fp16", "flat-sq8", "flat-pq", "ivf-flat", "ivf-pq", "hnsw")
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+TRAINED_TYPES = ("flat-sq8", "flat-pq", "ivf-flat", "ivf-pq")  # learn quantizers from a sample before adding
+METRICS = ("l2", "cosine")
+METRIC = os.getenv("FAISS_METRIC", "l2")  # cosine: unit-length vectors in an inner-product index
+NLIST = int(os.getenv("FAISS_NLIST", "0"))  # IVF lists; 0 picks one from the corpus size
+PQ_M = int(os.getenv("FAISS_PQ_M", "16"))  # PQ sub-quantizers (must divide the dimension)
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))  # graph neighbours per node
+TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))  # vectors used to train IVF centroids / PQ codebooks
+NPROBE = int(os.getenv("FAISS_NPROBE", "16"))  # IVF lists visited per query
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))  # HNSW candidate list size per query
 
 # --- Load journal entries ---
 def load_journal_entries(path):
@@ -22,41 +41,194 @@ def load_journal_entries(path):
     return entries
 
 # --- Embed all entries ---
-def embed_entries(model, entries):
-    texts = [e["entry"] for e in entries]
-    embeddings = model.encode(texts, batch_size=32, show_progress_bar=True)
+def make_embedder(pool: EmbeddingPool, model_name: str = EMBED_MODEL):
+    """The embedding cache with its misses encoded by `pool`, so a rebuild only encodes entries it hasn't seen."""
+    return EmbeddingCache(model_name, encoder=pool) if CACHE_ENABLED else pool
+
+def embed_entries(entries, model_name: str = EMBED_MODEL, workers: int = WORKERS, threads: int = THREADS):
+    with EmbeddingPool(model_name, workers, threads) as pool:
+        print(f"[+] Embedding with {pool.workers} process(es) x {pool.threads} thread(s)")
+        embedder = make_embedder(pool, model_name)
+        embeddings = embedder.encode([e["entry"] for e in entries], batch_size=32)
+    if CACHE_ENABLED:
+        stats = embedder.stats()
+        print(f"[+] Embedding cache: {stats['misses']} encoded, hit rate {stats['hit_rate']:.1%}")
     return embeddings
 
 # --- Build FAISS index ---
-def build_faiss_index(embeddings):
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
+def default_nlist(n_vectors: int) -> int:
+    # ~4 * sqrt(N) lists, but keep at least 39 training points per centroid
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+
+def pq_nbits(dim: int, pq_m: int, n_vectors: int) -> int:
+    if dim % pq_m:
+        raise ValueError(f"FAISS_PQ_M={pq_m} must divide the embedding dimension {dim}")
+    # 8-bit codes need ~39 * 256 training points; use smaller codebooks on small corpora
+    return 8 if not n_vectors or n_vectors >= 39 * 256 else max(1, int(np.log2(max(2, n_vectors // 39))))
+
+def make_index(dim: int, index_type: str = INDEX_TYPE, n_vectors: int = 0, nlist: int = NLIST,
+               pq_m: int = PQ_M, hnsw_m: int = HNSW_M, metric: str = METRIC):
+    """An empty index of `index_type`; IVF, SQ8 and PQ types still need `train_index` before adding.
+
+    The flat-* types store every vector, compressed: fp16 halves the memory,
+    sq8 quarters it, and pq keeps `pq_m` bytes per vector.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+    metric_type = faiss.METRIC_INNER_PRODUCT if metric == "cosine" else faiss.METRIC_L2
+    if index_type == "flat":
+        return faiss.IndexFlat(dim, metric_type)
+    if index_type == "flat-fp16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, metric_type)
+    if index_type == "flat-sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric_type)
+    if index_type == "flat-pq":
+        return faiss.IndexPQ(dim, pq_m, pq_nbits(dim, pq_m, n_vectors), metric_type)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric_type)
+        index.hnsw.efConstruction = max(40, 2 * hnsw_m)
+        return index
+    nlist = nlist or default_nlist(n_vectors)
+    if index_type == "ivf-flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlat(dim, metric_type), dim, nlist, metric_type)
+    if index_type == "ivf-pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlat(dim, metric_type), dim, nlist, pq_m,
+                                pq_nbits(dim, pq_m, n_vectors), metric_type)
+    raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+
+def is_cosine(index) -> bool:
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+def prepare_vectors(index, vectors) -> np.ndarray:
+    """float32 rows ready for `index`: scaled to unit length if it scores by inner product (cosine)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if is_cosine(index):
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def train_index(index, embeddings: np.ndarray, sample: int = TRAIN_SAMPLE, seed: int = 0):
+    """Train on a random sample of `embeddings` (a no-op for flat and HNSW indexes)."""
+    if index.is_trained:
+        return
+    if len(embeddings) > sample:
+        rows = np.sort(np.random.default_rng(seed).choice(len(embeddings), sample, replace=False))
+        embeddings = embeddings[rows]
+    index.train(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+def set_search_params(index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+    """Apply query-time knobs; they are saved with the index but can be changed after loading."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
     return index
 
+def flat_vectors(index) -> Optional[np.ndarray]:
+    """Zero-copy (ntotal, d) view of a flat (or HNSW-flat) index's vectors; None for other index types."""
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if not isinstance(index, faiss.IndexFlat) or index.ntotal == 0:
+        return None
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+def build_faiss_index(embeddings, index_type: str = INDEX_TYPE, nlist: int = NLIST, pq_m: int = PQ_M,
+                      hnsw_m: int = HNSW_M, train_sample: int = TRAIN_SAMPLE, metric: str = METRIC):
+    embeddings = np.asarray(embeddings)
+    index = make_index(embeddings.shape[1], index_type, len(embeddings), nlist, pq_m, hnsw_m, metric)
+    embeddings = prepare_vectors(index, embeddings)
+    train_index(index, embeddings, train_sample)
+    index.add(embeddings)
+    return set_search_params(index)
+
 # --- Save index + metadata ---
-def save_index(index, entries):
-    INDEX_DIR.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(INDEX_DIR / "journal_index.faiss"))
-    with open(INDEX_DIR / "journal_metadata.pkl", "wb") as f:
-        pickle.dump(entries, f)
+# Each save is a new, never-modified version directory; `current` is a symlink
+# to the live one, replaced atomically:
+#
+#   <index_dir>/versions/<version>/journal_index.faiss + journal_metadata.cols
+#   <index_dir>/current -> versions/<version>
+#
+# Readers resolve `current` once and open both files from that directory, so
+# they never pair an index with another version's metadata, and files they
+# have memory-mapped stay intact while newer versions are published.
+def current_version(index_dir: Path) -> Optional[Path]:
+    """The live version directory, None for an index saved before versioning (or none at all)."""
+    try:
+        return Path(index_dir) / os.readlink(Path(index_dir) / "current")
+    except OSError:
+        return None
+
+def resolve_index_files(index_path: Path, metadata_path: Path) -> Tuple[Path, Path]:
+    """Where the index and metadata named by these paths currently live."""
+    version = current_version(Path(index_path).parent)
+    if version is None:
+        return Path(index_path), Path(metadata_path)
+    return version / Path(index_path).name, version / Path(metadata_path).name
+
+def _fsync(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def save_index(index, entries, index_dir: Path = INDEX_DIR, keep: int = KEEP_VERSIONS) -> Path:
+    """Publish `index` and `entries` as the current version of `index_dir`; returns the version directory.
+
+    `entries` are the metadata rows in vector order: a list of dicts or metadata_store.Columns.
+    """
+    index_dir = Path(index_dir)
+    version = index_dir / "versions" / f"v{time.time_ns()}"
+    version.mkdir(parents=True)
+    faiss.write_index(index, str(version / INDEX_FILE))
+    _fsync(version / INDEX_FILE)
+    write_metadata(version / METADATA_FILE, entries)
+    _fsync(version)
+
+    pointer = index_dir / f"current.{os.getpid()}.tmp"
+    pointer.unlink(missing_ok=True)
+    os.symlink(os.path.relpath(version, index_dir), pointer)
+    os.replace(pointer, index_dir / "current")
+    _fsync(index_dir)
+
+    # Files from before versioning would otherwise linger next to the pointer
+    for name in (INDEX_FILE, METADATA_FILE):
+        (index_dir / name).unlink(missing_ok=True)
+    # Unlinking is safe for readers still using an old version: their mappings outlive the files
+    old = sorted(p for p in version.parent.iterdir() if p != version)  # names sort by publish time
+    for path in old[:max(0, len(old) - (keep - 1))]:
+        shutil.rmtree(path, ignore_errors=True)
+    return version
 
 # --- Main ---
 def main():
-    print("[+] Loading journal entries...")
-    entries = load_journal_entries(DATA_PATH)
-
-    print(f"[+] Loaded {len(entries)} entries. Embedding...")
-    model = SentenceTransformer(EMBED_MODEL)
-    embeddings = embed_entries(model, entries)
+    from src.rag.streaming_build import CHECKPOINT_SECONDS, CHUNK_SIZE, JsonlSource, MongoSource, StreamingIndexBuilder
 
-    print("[+] Building FAISS index...")
-    index = build_faiss_index(np.array(embeddings))
+    parser = argparse.ArgumentParser(description="Embed the journal corpus and build its FAISS index")
+    parser.add_argument("--source", choices=["jsonl", "mongo"], default="jsonl")
+    parser.add_argument("--path", type=Path, default=DATA_PATH, help="JSONL file for --source jsonl")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--metric", choices=METRICS, default=METRIC)
+    parser.add_argument("--nlist", type=int, default=NLIST, help="IVF lists (0 = from corpus size)")
+    parser.add_argument("--pq-m", type=int, default=PQ_M, help="IVF-PQ sub-quantizers")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M, help="HNSW neighbours per node")
+    parser.add_argument("--train-sample", type=int, default=TRAIN_SAMPLE, help="Vectors to train IVF on")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Entries embedded at a time")
+    parser.add_argument("--checkpoint-seconds", type=float, default=CHECKPOINT_SECONDS)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Embedding processes (0 = from CPU count)")
+    parser.add_argument("--threads", type=int, default=THREADS, help="Torch threads per process (0 = auto)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
 
-    print("[+] Saving index and metadata...")
-    save_index(index, entries)
+    source = JsonlSource(args.path) if args.source == "jsonl" else MongoSource()
+    print(f"[+] Building {args.index_type} ({args.metric}) FAISS index from {source.name}...")
+    builder = StreamingIndexBuilder(source, INDEX_DIR, args.index_type, args.chunk_size, args.checkpoint_seconds,
+                                    args.nlist, args.pq_m, args.hnsw_m, args.train_sample,
+                                    workers=args.workers, threads=args.threads, metric=args.metric)
+    index = builder.build(resume=not args.fresh)
 
-    print("[✓] FAISS index built and saved to data/processed/faiss_index/")
+    print(f"[✓] FAISS index of {index.ntotal} entries built and saved to {INDEX_DIR}/")
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,13 @@
 # generate_prompt.py
 
-from openai import OpenAI
 from typing import List
 import os
+from src.utils.llm_wrapper import get_client
 
 # --- Config ---
 MODEL_NAME = "gpt-4"
 MAX_ENTRIES = 3
 
-# Initialize OpenAI client
-client = OpenAI()
-
 # --- Prompt template ---
 PROMPT_TEMPLATE = """
 You are an empathetic journaling assistant. Based on the user's past journal entries, generate a thoughtful and supportive journaling prompt that encourages reflection.
@@ -30,7 +27,7 @@ def generate_prompt_from_entries(entries: List[str]) -> str:
     context_text = format_context(entries)
     final_prompt = PROMPT_TEMPLATE.format(context_entries=context_text)
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=MODEL_NAME,
         messages=[
             {"role": "user", "content": final_prompt}
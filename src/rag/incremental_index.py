@@ -0,0 +1,272 @@
+# incremental_index.py
+#
+# Keyed updates to the journal index without re-embedding the corpus. Writes
+# go to an append-only delta log next to the index files:
+#
+#   current -> versions/<version>  base (see build_faiss_index.save_index), republished by compaction
+#   journal_index.log              upserts/deletes since the base was written
+#   journal_index.log.merging      the log while a compaction folds it in
+#
+# Entries are keyed by the Mongo _id (the metadata row's "id"). Readers replay
+# the log over the base (see `Delta`), so an entry is searchable as soon as its
+# record is flushed and the Retriever next checks the files; compaction merges
+# the log into a new base once it passes DELTA_COMPACT_MB.
+#
+#   python -m src.rag.incremental_index compact
+
+import argparse
+import fcntl
+import os
+import pickle
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+import faiss
+import numpy as np
+from src.rag.build_faiss_index import (
+    INDEX_DIR, INDEX_FILE, METADATA_FILE, flat_vectors, is_cosine, make_index, resolve_index_files, save_index,
+)
+from src.rag.metadata_store import Columns, MetadataStore, load_metadata
+
+# --- Config ---
+COMPACT_BYTES = int(float(os.getenv("DELTA_COMPACT_MB", "16")) * 2**20)
+FSYNC = os.getenv("DELTA_FSYNC", "1") == "1"  # flush each record to disk before acknowledging it
+
+# Frame: magic, payload length, CRC32 of the payload, then a pickled
+# (op, keys, vectors, rows) record. The magic lets readers resync past a
+# frame torn by a crash.
+MAGIC = b"JDL1"
+HEADER = struct.Struct("<4sII")
+
+# --- Log files ---
+def log_paths(index_path: Path) -> Tuple[Path, Path]:
+    """(merging, live) log paths for an index file, in replay order."""
+    log = Path(index_path).with_suffix(".log")
+    return log.with_suffix(".log.merging"), log
+
+def encode_record(op: str, keys: List[str], vectors: Optional[np.ndarray] = None, rows: Optional[List[dict]] = None) -> bytes:
+    payload = pickle.dumps((op, keys, vectors, rows), protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+def read_log(path: Path) -> Tuple[list, int]:
+    """Records in `path` and the offset just past the last valid one; torn or corrupt frames are skipped."""
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return [], 0
+    records, pos, end = [], 0, 0
+    while pos + HEADER.size <= len(data):
+        magic, length, crc = HEADER.unpack_from(data, pos)
+        payload = data[pos + HEADER.size:pos + HEADER.size + length]
+        if magic != MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            pos = data.find(MAGIC, pos + 1)
+            if pos < 0:
+                break
+            continue
+        records.append(pickle.loads(payload))
+        pos += HEADER.size + length
+        end = pos
+    return records, end
+
+def read_delta_records(index_path: Path) -> list:
+    records = []
+    for path in log_paths(index_path):
+        records.extend(read_log(path)[0])
+    return records
+
+# --- Replay ---
+class Delta:
+    """The log replayed over a base index.
+
+    `dead` marks base rows that were deleted or replaced; `vectors`/`rows` are
+    the live entries added since the base was written, in log order. Replay
+    is idempotent per key, so replaying records already folded into the base
+    (a compaction that crashed before removing its log) changes nothing.
+    The log keeps vectors as embedded; `normalize` scales them to unit length
+    for a cosine index.
+    """
+
+    def __init__(self, records: list, metadata: MetadataStore, n_base: int, dim: int, normalize: bool = False):
+        self.dead = np.zeros(n_base, dtype=bool)
+        touched = list({key for _, record_keys, _, _ in records for key in record_keys})
+        keys = {key: row for key, row in zip(touched, metadata.find(touched)) if row >= 0}
+        live = {}  # key -> position in `vectors`/`rows` below
+        vectors, rows = [], []
+        for op, record_keys, record_vectors, record_rows in records:
+            for j, key in enumerate(record_keys):
+                if key in live:
+                    rows[live.pop(key)] = None
+                elif key in keys:
+                    self.dead[keys[key]] = True
+                if op == "upsert":
+                    live[key] = len(rows)
+                    vectors.append(record_vectors[j])
+                    rows.append(record_rows[j])
+        kept = sorted(live.values())
+        self.rows = [rows[i] for i in kept]
+        self.vectors = np.stack([vectors[i] for i in kept]).astype(np.float32) if kept else np.empty((0, dim), np.float32)
+        if normalize and kept:
+            faiss.normalize_L2(self.vectors)
+        self.n_dead = int(self.dead.sum())
+
+    def __len__(self):
+        return len(self.rows)
+
+def merge(index, metadata: MetadataStore, delta: Delta):
+    """Fold `delta` into the base, keeping the index type and its training; returns (index, Columns)."""
+    columns = None
+    if delta.n_dead:
+        kept = np.flatnonzero(~delta.dead)
+        vectors = flat_vectors(index)
+        if vectors is not None:
+            vectors = vectors[kept].copy()
+        else:
+            ivf = faiss.try_extract_index_ivf(index)
+            if ivf is not None:
+                ivf.make_direct_map()
+            vectors = index.reconstruct_batch(kept) if len(kept) else np.empty((0, index.d), np.float32)
+        # Not every index type supports remove_ids (HNSW doesn't), so re-add the survivors to an empty clone
+        rebuilt = faiss.clone_index(index)
+        rebuilt.reset()
+        if len(kept):
+            rebuilt.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        index, columns = rebuilt, metadata.take(kept)
+    columns = columns if columns is not None else metadata.columns()
+    if len(delta):
+        index.add(delta.vectors)
+        columns = Columns.concat([columns, Columns.from_rows(delta.rows)])
+    return index, columns
+
+
+# --- Writer ---
+class IncrementalIndex:
+    """Keyed writes to the journal index in `index_dir`.
+
+    `upsert` and `delete` append one CRC-framed record per call (a batch of
+    entries) to the delta log under an flock, so several worker processes
+    can write at once. Once the log passes `compact_bytes` a background
+    compaction merges it into the base.
+    """
+
+    def __init__(self, index_dir: Path = INDEX_DIR, compact_bytes: int = COMPACT_BYTES, fsync: bool = FSYNC):
+        self.index_dir = Path(index_dir)
+        self.index_path = self.index_dir / INDEX_FILE
+        self.metadata_path = self.index_dir / METADATA_FILE
+        self.merging_path, self.log_path = log_paths(self.index_path)
+        self.lock_path = self.index_dir / "journal_index.lock"
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self.records = 0
+        self.compactions = 0
+        self._checked = set()  # log inodes whose tail was checked for a torn frame
+        self._compacting = threading.Lock()
+
+    def upsert(self, embeddings: np.ndarray, rows: List[dict]):
+        """Add entries, or replace those whose "id" is already indexed."""
+        keys = [str(row["id"]) for row in rows]
+        self._append(encode_record("upsert", keys, np.ascontiguousarray(embeddings, dtype=np.float32), rows))
+
+    # The enrichment pipeline's appender interface
+    add = upsert
+
+    def delete(self, keys: List[str]):
+        self._append(encode_record("delete", [str(key) for key in keys]))
+
+    def _append(self, frame: bytes):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            with open(self.log_path, "ab") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # A compaction may have moved the log aside between open and flock
+                try:
+                    current = os.stat(self.log_path).st_ino == os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if not current:
+                    continue
+                self._truncate_torn_tail(f)
+                f.write(frame)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                size = f.tell()
+                break
+        self.records += 1
+        if size >= self.compact_bytes and self._compacting.acquire(blocking=False):
+            threading.Thread(target=self._compact_in_background, name="index-compact", daemon=True).start()
+
+    def _truncate_torn_tail(self, f):
+        # A writer that crashed mid-frame leaves garbage at the end; appending after it would still be
+        # readable (readers resync on the magic) but the garbage would never go away
+        inode = os.fstat(f.fileno()).st_ino
+        if inode in self._checked:
+            return
+        _, end = read_log(self.log_path)
+        if f.seek(0, os.SEEK_END) > end:
+            f.truncate(end)
+        self._checked.add(inode)
+
+    def _compact_in_background(self):
+        try:
+            self.compact(block=False)
+        except Exception as e:
+            print(f"[!] Index compaction failed: {e}")
+        finally:
+            self._compacting.release()
+
+    def load_base(self, dim: Optional[int] = None):
+        """The base (index, metadata), read into memory to be merged into; an empty flat index of `dim` if there is none yet."""
+        index_path, metadata_path = resolve_index_files(self.index_path, self.metadata_path)
+        if index_path.exists():
+            return faiss.read_index(str(index_path)), load_metadata(metadata_path)
+        return (make_index(dim, "flat") if dim else None), MetadataStore.from_rows([])
+
+    def compact(self, block: bool = True) -> bool:
+        """Merge the delta log into a new base; False if there was nothing to merge or another process is at it."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+            # A leftover .merging is a compaction that crashed; finish it before taking the live log
+            if not self.merging_path.exists():
+                if not self.log_path.exists():
+                    return False
+                with open(self.log_path, "ab") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)  # wait for an in-flight append
+                    os.replace(self.log_path, self.merging_path)
+
+            records, _ = read_log(self.merging_path)
+            dims = [vectors.shape[1] for op, _, vectors, _ in records if op == "upsert" and len(vectors)]
+            index, metadata = self.load_base(dims[0] if dims else None)
+            if index is not None:
+                delta = Delta(records, metadata, index.ntotal, index.d, normalize=is_cosine(index))
+                index, metadata = merge(index, metadata, delta)
+                save_index(index, metadata, self.index_dir)
+            os.remove(self.merging_path)
+        self.compactions += 1
+        return True
+
+    def stats(self) -> dict:
+        sizes = [p.stat().st_size if p.exists() else 0 for p in (self.merging_path, self.log_path)]
+        return {"log_bytes": sum(sizes), "records_written": self.records, "compactions": self.compactions}
+
+# --- CLI ---
+def main():
+    parser = argparse.ArgumentParser(description="Merge the journal index's delta log into its base")
+    parser.add_argument("command", choices=["compact", "stats"])
+    parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    args = parser.parse_args()
+
+    index = IncrementalIndex(args.index_dir)
+    if args.command == "compact":
+        merged = index.compact()
+        print(f"[✓] Merged the delta log into {args.index_dir}" if merged else "[!] Nothing to merge")
+    else:
+        print(index.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# metadata_store.py
+#
+# Columnar, memory-mapped metadata for the journal index, replacing the pickled
+# list of entry dicts. One file, `journal_metadata.cols`:
+#
+#   header   magic + JSON table of contents (row count, section offsets/dtypes)
+#   id       fixed-width bytes per row (Mongo _id), plus a sorted copy for lookups
+#   user_id  fixed-width bytes per row, plus the rows grouped by user (CSR)
+#   entry    utf-8 text blob with an int64 offset per row
+#   extra    JSON blob (date, emotions, ...) with an int64 offset per row
+#
+# Opening maps the file and parses the header only, so it costs the same at 10M
+# rows as at 1k; rows and user partitions are read from the page cache on demand.
+#
+#   python -m src.rag.metadata_store data/processed/faiss_index/journal_metadata.pkl  # convert an old index
+
+import io
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, Union
+import numpy as np
+
+MAGIC = b"JMETA1\0\0"
+ALIGN = 64
+KEY_FIELDS = ("id", "user_id", "entry")  # stored as their own columns; everything else goes to `extra`
+
+
+class Columns:
+    """Metadata held column-wise in memory, ready to be written or concatenated."""
+
+    def __init__(self, ids: np.ndarray, users: np.ndarray, entry: tuple, extra: tuple):
+        self.ids = ids      # S<width>, b"" where a row has no id
+        self.users = users  # S<width>, b"" where a row has no user
+        self.entry = entry  # (blob bytes, int64 offsets of length n + 1)
+        self.extra = extra
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: List[dict]) -> "Columns":
+        def text(value):
+            return b"" if value is None else str(value).encode()
+        extras = [
+            json.dumps({k: v for k, v in row.items() if k not in KEY_FIELDS}, default=str).encode()
+            for row in rows
+        ]
+        return cls(
+            np.array([text(row.get("id")) for row in rows], dtype=bytes) if rows else np.empty(0, "S1"),
+            np.array([text(row.get("user_id")) for row in rows], dtype=bytes) if rows else np.empty(0, "S1"),
+            _blob([text(row.get("entry")) for row in rows]),
+            _blob(extras),
+        )
+
+    @classmethod
+    def concat(cls, parts: List["Columns"]) -> "Columns":
+        parts = [p for p in parts if len(p)] or parts[:1]
+        return cls(
+            np.concatenate([p.ids for p in parts]),
+            np.concatenate([p.users for p in parts]),
+            _concat_blobs([p.entry for p in parts]),
+            _concat_blobs([p.extra for p in parts]),
+        )
+
+def _blob(values: List[bytes]) -> tuple:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return b"".join(values), offsets
+
+def _concat_blobs(blobs: List[tuple]) -> tuple:
+    offsets, base = [np.zeros(1, dtype=np.int64)], 0
+    for data, o in blobs:
+        offsets.append(o[1:] + base)
+        base += len(data)
+    return b"".join(bytes(data) for data, _ in blobs), np.concatenate(offsets)
+
+def _take_blob(data, offsets: np.ndarray, rows: np.ndarray) -> tuple:
+    return _blob([bytes(data[offsets[i]:offsets[i + 1]]) for i in rows])
+
+# --- Write ---
+def write_metadata(path: Path, rows: Union[List[dict], Columns, List[Columns]]):
+    """Write `rows` as a columnar metadata file at `path`.
+
+    `rows` are entry dicts, Columns, or a list of Columns (e.g. views of
+    mapped segment files) written one after another without concatenating them.
+    """
+    with open(path, "wb") as f:
+        serialize(rows, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def serialize(rows: Union[List[dict], Columns, List[Columns]], f: BinaryIO):
+    if isinstance(rows, Columns):
+        parts = [rows]
+    elif rows and all(isinstance(part, Columns) for part in rows):
+        parts = list(rows)
+    else:
+        parts = [Columns.from_rows(rows)]
+    # Only the fixed-width key columns are gathered (lookups need them sorted); the text blobs are streamed
+    ids = np.concatenate([part.ids for part in parts])
+    users = np.concatenate([part.users for part in parts])
+    n = len(ids)
+    id_order = np.argsort(ids, kind="stable")
+    user_order = np.argsort(users, kind="stable")  # rows grouped by user, ascending within a user
+    user_names, user_starts = np.unique(users[user_order], return_index=True)
+    sections = {
+        "ids": [ids],
+        "sorted_ids": [ids[id_order]],
+        "id_rows": [id_order.astype(np.int64)],
+        "users": [users],
+        "user_names": [user_names],
+        "user_starts": [np.append(user_starts, n).astype(np.int64)],
+        "user_rows": [user_order.astype(np.int64)],
+        "entry_offsets": _offset_pieces([part.entry for part in parts]),
+        "entry": [np.frombuffer(part.entry[0], dtype=np.uint8) for part in parts],
+        "extra_offsets": _offset_pieces([part.extra for part in parts]),
+        "extra": [np.frombuffer(part.extra[0], dtype=np.uint8) for part in parts],
+    }
+
+    toc, offset = {}, 0
+    for name, pieces in sections.items():
+        toc[name] = [offset, pieces[0].dtype.str, sum(len(piece) for piece in pieces)]
+        offset += -(-sum(piece.nbytes for piece in pieces) // ALIGN) * ALIGN
+    header = json.dumps({"rows": n, "sections": toc}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+    for name, pieces in sections.items():
+        f.write(b"\0" * (data_start + toc[name][0] - f.tell()))
+        for piece in pieces:
+            f.write(memoryview(np.ascontiguousarray(piece)).cast("B"))
+    f.write(b"\0" * (data_start + offset - f.tell()))
+
+def _offset_pieces(blobs: List[tuple]) -> List[np.ndarray]:
+    """The blobs' offsets as one sequence, shifted part by part."""
+    pieces, base = [np.zeros(1, dtype=np.int64)], 0
+    for data, offsets in blobs:
+        pieces.append(offsets[1:] + base)
+        base += len(data)
+    return pieces
+
+
+# --- Read ---
+class MetadataStore:
+    """Read-only view of a columnar metadata file (or of in-memory bytes in the same layout).
+
+    Indexing returns the row dict (`store[i]["entry"]`), decoding only that row.
+    """
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a journal metadata file")
+        (header_len,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+        header = json.loads(bytes(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_len]))
+        data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+        self.rows = header["rows"]
+        for name, (offset, dtype, count) in header["sections"].items():
+            array = np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=data_start + offset)
+            setattr(self, "_" + name, array)
+
+    @classmethod
+    def open(cls, path: Path) -> "MetadataStore":
+        with open(path, "rb") as f:
+            # The mapping outlives the file object; an os.replace of `path` leaves it intact
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Lookups hit scattered rows: skip readahead so a read maps the pages it needs, not their neighbours
+        buffer.madvise(mmap.MADV_RANDOM)
+        return cls(buffer)
+
+    @classmethod
+    def from_rows(cls, rows: List[dict]) -> "MetadataStore":
+        """An in-memory store, e.g. for a legacy pickle or a test fixture."""
+        buffer = io.BytesIO()
+        serialize(rows, buffer)
+        return cls(buffer.getvalue())
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, i: int) -> dict:
+        i = int(i)
+        if not 0 <= i < self.rows:
+            raise IndexError(i)
+        row = json.loads(bytes(self._extra[self._extra_offsets[i]:self._extra_offsets[i + 1]]))
+        row["id"] = self._ids[i].decode() or None
+        row["user_id"] = self._users[i].decode() or None
+        row["entry"] = self.entry(i)
+        return row
+
+    def __iter__(self) -> Iterable[dict]:
+        return (self[i] for i in range(self.rows))
+
+    def entry(self, i: int) -> str:
+        return bytes(self._entry[self._entry_offsets[i]:self._entry_offsets[i + 1]]).decode()
+
+    # --- Lookups ---
+    @property
+    def n_users(self) -> int:
+        names = self._user_names
+        return len(names) - (1 if len(names) and names[0] == b"" else 0)
+
+    def user_counts(self) -> np.ndarray:
+        """Number of entries per user."""
+        counts = np.diff(self._user_starts)
+        return counts[1:] if len(self._user_names) and self._user_names[0] == b"" else counts
+
+    def user_rows(self, user_id: str) -> np.ndarray:
+        """Ascending row ids of `user_id`'s entries (a view into the file)."""
+        key = str(user_id).encode()
+        k = np.searchsorted(self._user_names, key)
+        if not key or k == len(self._user_names) or self._user_names[k] != key:
+            return np.empty(0, dtype=np.int64)
+        return self._user_rows[self._user_starts[k]:self._user_starts[k + 1]]
+
+    def find(self, keys: List[str]) -> np.ndarray:
+        """Row of each id in `keys`, -1 where absent."""
+        if not len(keys) or not self.rows:
+            return np.full(len(keys), -1, dtype=np.int64)
+        wanted = np.array([str(k).encode() for k in keys], dtype=bytes)
+        k = np.minimum(np.searchsorted(self._sorted_ids, wanted), self.rows - 1)
+        found = (self._sorted_ids[k] == wanted) & (wanted != b"")
+        return np.where(found, self._id_rows[k], -1)
+
+    def take(self, rows: np.ndarray) -> Columns:
+        """The given rows as in-memory columns, without decoding them."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return Columns(
+            self._ids[rows], self._users[rows],
+            _take_blob(self._entry, self._entry_offsets, rows),
+            _take_blob(self._extra, self._extra_offsets, rows),
+        )
+
+    def columns(self) -> Columns:
+        """All rows as columns viewing this store's buffer (nothing is copied)."""
+        return Columns(self._ids, self._users, (self._entry, self._entry_offsets), (self._extra, self._extra_offsets))
+
+def metadata_file(path: Path) -> Path:
+    """`path`, or the legacy `.pkl` next to it when an index built before the columnar format has no `.cols` yet."""
+    path = Path(path)
+    legacy = path.with_suffix(".pkl")
+    if path.suffix != ".pkl" and not path.exists() and legacy.exists():
+        return legacy
+    return path
+
+def load_metadata(path: Path) -> MetadataStore:
+    """Open a columnar metadata file; a legacy `.pkl` list of dicts is converted in memory."""
+    requested = Path(path)
+    path = metadata_file(requested)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No index metadata at {requested}; convert a legacy journal_metadata.pkl with "
+            f"`python -m src.rag.metadata_store <path>.pkl` or rebuild the index"
+        )
+    if path != requested:
+        print(f"[!] {requested.name} not found; reading {path.name} (convert it with `python -m src.rag.metadata_store {path}`)")
+    if path.suffix == ".pkl":
+        import pickle
+
+        with open(path, "rb") as f:
+            return MetadataStore.from_rows(pickle.load(f))
+    return MetadataStore.open(path)
+
+# --- CLI ---
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a pickled metadata list to the columnar format")
+    parser.add_argument("pickle_path", type=Path, help="e.g. data/processed/faiss_index/journal_metadata.pkl")
+    parser.add_argument("--output", type=Path, default=None, help="Defaults to the same path with .cols")
+    args = parser.parse_args()
+
+    output = args.output or args.pickle_path.with_suffix(".cols")
+    store = load_metadata(args.pickle_path)
+    write_metadata(output.with_suffix(".cols.tmp"), store.columns())
+    os.replace(output.with_suffix(".cols.tmp"), output)
+    print(f"[✓] Wrote {len(store)} rows to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,292 @@
 # retrieve_user_history.py
 
 import faiss
-import pickle
+import os
+import threading
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import Dict, List, Optional, Union
 from pathlib import Path
+from src.models.registry import EMBED_MODEL, get_sentence_transformer
+from src.rag.build_faiss_index import (
+    EF_SEARCH, NPROBE, current_version, flat_vectors, is_cosine, make_index, prepare_vectors, resolve_index_files,
+    set_search_params,
+)
+from src.rag.incremental_index import Delta, log_paths, read_delta_records
+from src.rag.metadata_store import MetadataStore, load_metadata, metadata_file
 
 # --- Config ---
-MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_NAME = EMBED_MODEL
 INDEX_PATH = Path("data/processed/faiss_index/journal_index.faiss")
-METADATA_PATH = Path("data/processed/faiss_index/journal_metadata.pkl")
+METADATA_PATH = Path("data/processed/faiss_index/journal_metadata.cols")
 TOP_K = 3
+RELOAD_CHECK_SECONDS = float(os.getenv("RETRIEVER_RELOAD_CHECK_SECONDS", "5"))  # 0 checks on every query
+MMAP = os.getenv("FAISS_MMAP", "1") == "1"  # map the index file instead of reading a private copy
 
 # --- Load index and metadata ---
-def load_index_and_metadata():
-    index = faiss.read_index(str(INDEX_PATH))
-    with open(METADATA_PATH, "rb") as f:
-        metadata = pickle.load(f)
-    return index, metadata
+def load_index_and_metadata(index_path: Path = INDEX_PATH, metadata_path: Path = METADATA_PATH, mmap: bool = MMAP):
+    """The current version's index and metadata.
+
+    With `mmap` the index's vectors/codes stay in the file's pages, so every
+    worker process serving the same version shares one copy in the page cache.
+    """
+    index_path, metadata_path = resolve_index_files(index_path, metadata_path)
+    index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP_IFC if mmap else 0)
+    return set_search_params(index, NPROBE, EF_SEARCH), load_metadata(metadata_path)
 
 # --- Embed query using SBERT ---
 def embed_query(text: str, model) -> np.ndarray:
     return model.encode([text])
 
+# --- Per-user partition ---
+def partition_by_user(metadata: List[dict]) -> Dict[str, np.ndarray]:
+    """user_id -> ascending row ids of that user's entries (for delta rows; the base store keeps its own)."""
+    rows = {}
+    for i, row in enumerate(metadata):
+        user_id = row.get("user_id")
+        if user_id is not None:
+            rows.setdefault(user_id, []).append(i)
+    return {user_id: np.array(ids, dtype=np.int64) for user_id, ids in rows.items()}
+
+def squared_l2(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    diff = vectors - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+class IndexSnapshot:
+    """An index with its metadata rows, partitioned by user, plus the delta log replayed over it.
+
+    A search for one user scores only that user's vectors, exactly, so its
+    cost follows the size of the user's history rather than the corpus, and
+    it returns `top_k` rows whenever the user has that many. Searches without
+    a user go to the index as before. Row ids past the base index refer to
+    entries from the delta log (see `row`).
+
+    An inner-product index is searched by cosine similarity: the query is
+    normalized like the stored vectors, and compressed (SQ/PQ) vectors are
+    decoded before the exact per-user scoring.
+    """
+
+    def __init__(self, index, metadata: Union[MetadataStore, List[dict]], signature=None,
+                 delta: Optional[Delta] = None, base: Optional["IndexSnapshot"] = None):
+        self.index = index
+        self.metadata = metadata if isinstance(metadata, MetadataStore) else MetadataStore.from_rows(metadata)
+        self.signature = signature
+        self.cosine = is_cosine(index)
+        if base is not None:
+            self._vectors = base._vectors  # same base files
+        else:
+            self._vectors = flat_vectors(index)
+            ivf = faiss.try_extract_index_ivf(index)
+            if self._vectors is None and ivf is not None:
+                ivf.make_direct_map()  # lets reconstruct_batch look rows up by id
+        self.delta = delta if delta is not None else Delta([], self.metadata, index.ntotal, index.d, self.cosine)
+        n_base = index.ntotal
+        self.delta_user_rows = {u: rows + n_base for u, rows in partition_by_user(self.delta.rows).items()}
+
+    @property
+    def n_users(self) -> int:
+        new = [u for u in self.delta_user_rows if not len(self.metadata.user_rows(u))]
+        return self.metadata.n_users + len(new)
+
+    def with_delta(self, delta: Delta, signature) -> "IndexSnapshot":
+        return IndexSnapshot(self.index, self.metadata, signature, delta, base=self)
+
+    def __len__(self):
+        return self.index.ntotal - self.delta.n_dead + len(self.delta)
+
+    def row(self, i: int) -> dict:
+        n_base = self.index.ntotal
+        return self.metadata[i] if i < n_base else self.delta.rows[i - n_base]
+
+    def entry(self, i: int) -> str:
+        n_base = self.index.ntotal
+        return self.metadata.entry(i) if i < n_base else self.delta.rows[i - n_base]["entry"]
+
+    def user_vectors(self, rows: np.ndarray) -> np.ndarray:
+        if not len(rows):
+            return np.empty((0, self.index.d), dtype=np.float32)
+        if self._vectors is not None:
+            return self._vectors[rows]
+        return self.index.reconstruct_batch(rows)
+
+    def distances(self, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Smaller is closer: squared L2, or negated cosine similarity for an inner-product index."""
+        return -(vectors @ query[0]) if self.cosine else squared_l2(vectors, query)
+
+    def search(self, query: np.ndarray, user_id: str = None, top_k: int = TOP_K) -> np.ndarray:
+        """Row ids of the `top_k` nearest entries, closest first."""
+        query = prepare_vectors(self.index, np.asarray(query).reshape(1, -1))
+        delta = self.delta
+        if user_id is None:
+            # Over-fetch by the number of superseded base rows so filtering them out still leaves top_k
+            rows = np.empty(0, dtype=np.int64)
+            distances = np.empty(0, dtype=np.float32)
+            if self.index.ntotal:
+                d, i = self.index.search(query, top_k + delta.n_dead)
+                keep = i[0] >= 0
+                keep[keep] &= ~delta.dead[i[0][keep]]
+                rows, distances = i[0][keep], (-d[0] if self.cosine else d[0])[keep]
+            if len(delta):
+                rows = np.concatenate([rows, np.arange(len(delta)) + self.index.ntotal])
+                distances = np.concatenate([distances, self.distances(delta.vectors, query)])
+        else:
+            rows = self.metadata.user_rows(user_id)
+            if delta.n_dead and len(rows):
+                rows = rows[~delta.dead[rows]]
+            vectors = self.user_vectors(rows)
+            extra = self.delta_user_rows.get(user_id)
+            if extra is not None:
+                rows = np.concatenate([rows, extra])
+                vectors = np.concatenate([vectors, delta.vectors[extra - self.index.ntotal]])
+            distances = self.distances(vectors, query)
+        best = np.argpartition(distances, top_k)[:top_k] if len(rows) > top_k else np.arange(len(rows))
+        return rows[best[np.argsort(distances[best], kind="stable")]]
+
+
+class Retriever:
+    """Long-lived similarity search over the journal index.
+
+    The embedding model comes from the registry and the index is read once.
+    Queries take a reference to the current `IndexSnapshot`, so
+    they run concurrently without locks. At most every `reload_check_seconds`
+    a query checks the files' mtimes; if they changed, a background thread
+    reads them and swaps the snapshot in with a single assignment, while
+    queries keep using the old one. When only the delta log changed, the
+    base is kept and just the log is replayed.
+
+    A new base is noticed when the index directory's `current` pointer moves
+    to another version; both files are then read from that version.
+    """
+
+    def __init__(self, index_path: Path = INDEX_PATH, metadata_path: Path = METADATA_PATH,
+                 model_name: str = MODEL_NAME, reload_check_seconds: float = RELOAD_CHECK_SECONDS):
+        self.index_path = Path(index_path)
+        self.metadata_path = Path(metadata_path)
+        self.model_name = model_name
+        self.reload_check_seconds = reload_check_seconds
+        self.reloads = 0
+        self.queries = 0
+        self._snapshot = None  # IndexSnapshot
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _files(self, version: Optional[str]):
+        if version is None:
+            return self.index_path, metadata_file(self.metadata_path)
+        return Path(version) / self.index_path.name, metadata_file(Path(version) / self.metadata_path.name)
+
+    def _signature(self):
+        """Current version, then (mtime, size) of its files and of the delta logs, None for those that don't exist."""
+        def stat(p):
+            try:
+                s = p.stat()
+            except FileNotFoundError:
+                return None
+            return s.st_mtime_ns, s.st_size
+        version = current_version(self.index_path.parent)
+        version = str(version) if version is not None else None
+        files = (*self._files(version), *log_paths(self.index_path))
+        return (version, *(stat(p) for p in files))
+
+    def _load_base(self, signature, records):
+        if self._snapshot is not None and self._snapshot.signature[:3] == signature[:3]:
+            return self._snapshot
+        if signature[1] is None and signature[2] is None:
+            # No base yet: everything is in the log
+            dims = [vectors.shape[1] for op, _, vectors, _ in records if op == "upsert" and len(vectors)]
+            return IndexSnapshot(make_index(dims[0], "flat"), []) if dims else None
+        index_path, metadata_path = self._files(signature[0])
+        if not index_path.exists():
+            raise FileNotFoundError(index_path)  # a version pruned since we resolved it
+        index, metadata = load_index_and_metadata(index_path, metadata_path)
+        # An unversioned index replaces its two files one after the other; the caller retries if we caught the gap
+        return IndexSnapshot(index, metadata) if index.ntotal == len(metadata) else None
+
+    def load(self, missing_ok: bool = False) -> bool:
+        """(Re)read the index files and publish them; False if they are missing and `missing_ok`."""
+        with self._reload_lock:
+            for _ in range(3):
+                signature = self._signature()
+                if not any(signature):
+                    if missing_ok:
+                        return False
+                    raise FileNotFoundError(f"No index at {self.index_path}")
+                if self._snapshot is not None and self._snapshot.signature == signature:
+                    return True
+                try:
+                    records = read_delta_records(self.index_path)
+                    base, missing = self._load_base(signature, records), None
+                except FileNotFoundError as e:
+                    base, missing = None, e  # a new version was published under us, or a file really is missing
+                # Anything changed while reading (e.g. a compaction moved the log)? Read again
+                if base is not None and self._signature() == signature:
+                    delta = Delta(records, base.metadata, base.index.ntotal, base.index.d, base.cosine)
+                    self._snapshot = base.with_delta(delta, signature)
+                    self.reloads += 1
+                    return True
+                time.sleep(0.05)
+            if missing is not None:
+                raise missing
+            raise RuntimeError(f"{self.index_path} and {self.metadata_path} disagree on the number of entries")
+
+    def _maybe_reload(self):
+        if self._snapshot is None:
+            self.load()
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.reload_check_seconds:
+            return
+        self._last_check = now
+        signature = self._signature()
+        if not any(signature):
+            return  # keep serving the last good snapshot
+        if signature != self._snapshot.signature and not self._reload_lock.locked():
+            threading.Thread(target=self._reload_quietly, name="retriever-reload", daemon=True).start()
+
+    def _reload_quietly(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"[!] Keeping the previous index; reload failed: {e}")
+
+    @property
+    def model(self):
+        return get_sentence_transformer(self.model_name)
+
+    def search(self, query_text: str, user_id: str = None, top_k: int = TOP_K) -> List[str]:
+        self._maybe_reload()
+        snapshot = self._snapshot
+        self.queries += 1
+
+        query_embedding = embed_query(query_text, self.model)
+        return [snapshot.entry(i) for i in snapshot.search(query_embedding, user_id, top_k)]
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "entries": len(snapshot) if snapshot else 0,
+            "delta_entries": len(snapshot.delta) if snapshot else 0,
+            "superseded_entries": snapshot.delta.n_dead if snapshot else 0,
+            "users": snapshot.n_users if snapshot else 0,
+            "reloads": self.reloads,
+            "queries": self.queries,
+        }
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever() -> Retriever:
+    """The process-wide retriever over the default index files."""
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = Retriever()
+        return _retriever
+
 # --- Retrieve top-N similar entries for a user (optionally filtered by user_id) ---
 def retrieve_similar_entries(query_text: str, user_id: str = None, top_k: int = TOP_K) -> List[str]:
-    model = SentenceTransformer(MODEL_NAME)
-    index, metadata = load_index_and_metadata()
-
-    query_embedding = embed_query(query_text, model)
-    distances, indices = index.search(query_embedding, top_k * 2)  # retrieve more, filter later
-
-    retrieved = []
-    for idx in indices[0]:
-        if idx >= len(metadata):
-            continue
-        row = metadata[idx]
-        if user_id is None or row.get("user_id") == user_id:
-            retrieved.append(row["entry"])
-        if len(retrieved) == top_k:
-            break
-
-    return retrieved
+    return get_retriever().search(query_text, user_id, top_k)
 
 # --- Example usage ---
 if __name__ == "__main__":
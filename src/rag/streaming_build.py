@@ -0,0 +1,272 @@
+# streaming_build.py
+#
+# Builds the journal index chunk by chunk instead of loading and embedding the
+# whole corpus at once, so working memory is one chunk (plus the training
+# sample) however large the corpus grows. Progress is checkpointed, so an
+# interrupted build resumes where it stopped:
+#
+#   python -m src.rag.build_faiss_index --source jsonl --path data/interim/journals.jsonl
+#   python -m src.rag.build_faiss_index --source mongo --index-type ivf-pq
+#
+# Checkpoint directory, removed once the final index is saved:
+#
+#   state.json       source position (byte offset or last _id), rows indexed, build settings
+#   index-<n>.faiss  the partial index as of checkpoint n
+#   rows-<k>.cols    metadata segments of about BUILD_SEGMENT_ROWS rows each, in row order
+#
+# state.json is replaced last, so a crash mid-checkpoint leaves the previous
+# checkpoint intact; segments written after it are dropped on resume. The
+# final metadata file is written by streaming the mapped segments, so the
+# entry text never has to fit in memory. IVF, SQ8 and PQ indexes are trained on the first
+# FAISS_TRAIN_SAMPLE vectors of the stream; nothing is checkpointed before
+# then, but re-embedding that prefix after a crash is served by the
+# embedding cache.
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+import faiss
+import numpy as np
+from tqdm import tqdm
+from src.models.parallel_embedding import THREADS, WORKERS, EmbeddingPool
+from src.models.registry import EMBED_MODEL
+from src.rag.build_faiss_index import (
+    HNSW_M, INDEX_DIR, INDEX_TYPE, METRIC, NLIST, PQ_M, TRAIN_SAMPLE, TRAINED_TYPES, default_nlist, make_embedder,
+    make_index, prepare_vectors, save_index, set_search_params, train_index,
+)
+from src.rag.metadata_store import Columns, MetadataStore, write_metadata
+
+# --- Config ---
+CHUNK_SIZE = int(os.getenv("BUILD_CHUNK_SIZE", "2048"))  # entries read and embedded at a time
+CHECKPOINT_SECONDS = float(os.getenv("BUILD_CHECKPOINT_SECONDS", "300"))  # each checkpoint rewrites the partial index
+SEGMENT_ROWS = int(os.getenv("BUILD_SEGMENT_ROWS", "100000"))  # metadata rows held in memory before spilling to disk
+EMBED_BATCH_SIZE = 32
+
+
+# --- Sources ---
+class JsonlSource:
+    """Journal rows from a JSONL file; the position is a byte offset."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.name = f"jsonl:{self.path.resolve()}"
+
+    def estimated_rows(self) -> int:
+        with open(self.path, "rb") as f:
+            sample = f.read(1 << 20)
+        lines = sample.count(b"\n")
+        return int(self.path.stat().st_size * lines / len(sample)) if lines else 0
+
+    def read_chunk(self, position: Optional[int], chunk_size: int) -> Tuple[List[dict], int]:
+        """Up to `chunk_size` rows starting at byte `position`, and the offset just past them."""
+        offset = position or 0
+        rows = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while len(rows) < chunk_size:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    # A line still being written; pick it up on the next build
+                    try:
+                        json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                offset += len(line)
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[!] Skipping malformed line at byte {offset - len(line)}")
+                    continue
+                if "entry" in row and "user_id" in row:
+                    rows.append(row)
+        return rows, offset
+
+class MongoSource:
+    """Journal entries from Mongo in `_id` order; the position is the last `_id` read."""
+
+    FIELDS = {"user_id": 1, "date": 1, "entry": 1, "emotions": 1}
+
+    def __init__(self, collection=None):
+        self._collection = collection
+        self.name = "mongo:journal_entries"
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from src.utils.mongo_utils import get_collection
+
+            self._collection = get_collection("journal_entries")
+        return self._collection
+
+    def estimated_rows(self) -> int:
+        return self.collection.estimated_document_count()
+
+    def read_chunk(self, position: Optional[str], chunk_size: int) -> Tuple[List[dict], Optional[str]]:
+        from bson import ObjectId
+
+        # A fresh query per chunk, so a slow chunk can't time out a server-side cursor. Empty entries are
+        # filtered by the server, so every chunk is full until the collection runs out
+        query = {"entry": {"$nin": [None, ""]}}
+        if position:
+            query["_id"] = {"$gt": ObjectId(position)}
+        docs = list(self.collection.find(query, self.FIELDS, sort=[("_id", 1)], limit=chunk_size))
+        rows = [
+            {"id": str(doc["_id"]), "user_id": doc.get("user_id"), "date": doc.get("date"),
+             "entry": doc["entry"], "emotions": doc.get("emotions", [])}
+            for doc in docs
+        ]
+        return rows, str(docs[-1]["_id"]) if docs else position
+
+
+# --- Builder ---
+class StreamingIndexBuilder:
+    """Reads `source` in chunks, embeds each through the embedding cache and adds it to the index.
+
+    Cache misses are encoded by an `EmbeddingPool` of `workers` x `threads`
+    unless an `embedder` (anything with `encode(texts, batch_size)`) is given.
+
+    `build()` resumes from the checkpoint in `checkpoint_dir` if one exists for
+    the same source and settings, and starts over otherwise.
+    """
+
+    def __init__(self, source, index_dir: Path = INDEX_DIR, index_type: str = INDEX_TYPE,
+                 chunk_size: int = CHUNK_SIZE, checkpoint_seconds: float = CHECKPOINT_SECONDS,
+                 nlist: int = NLIST, pq_m: int = PQ_M, hnsw_m: int = HNSW_M, train_sample: int = TRAIN_SAMPLE,
+                 model_name: str = EMBED_MODEL, embedder=None, checkpoint_dir: Optional[Path] = None,
+                 workers: int = WORKERS, threads: int = THREADS, metric: str = METRIC,
+                 segment_rows: int = SEGMENT_ROWS):
+        self.source = source
+        self.index_dir = Path(index_dir)
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else self.index_dir / "build_checkpoint"
+        self.chunk_size = chunk_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.segment_rows = segment_rows
+        self.train_sample = train_sample
+        self.embedder = embedder
+        self.workers, self.threads = workers, threads
+        self.settings = {"source": source.name, "index_type": index_type, "nlist": nlist, "pq_m": pq_m,
+                         "hnsw_m": hnsw_m, "metric": metric, "model": model_name}
+        self.checkpoints = 0
+
+    # --- Checkpoints ---
+    def load_checkpoint(self) -> Optional[dict]:
+        state_path = self.checkpoint_dir / "state.json"
+        if not state_path.exists():
+            return None
+        state = json.loads(state_path.read_text())
+        if state["settings"] != self.settings:
+            print("[!] Checkpoint was made with different settings; starting over")
+            return None
+        # Files a crashed checkpoint wrote before it could replace state.json
+        keep = {state["index"], *state["segments"]}
+        for path in self.checkpoint_dir.iterdir():
+            if path.name != "state.json" and path.name not in keep:
+                path.unlink()
+        return state
+
+    def _spill(self, segments: List[str], pending: List[Columns]) -> List[str]:
+        """Write `pending` as the next metadata segment; returns the segment names including it."""
+        if not pending:
+            return segments
+        name = f"rows-{len(segments):06d}.cols"
+        write_metadata(self.checkpoint_dir / name, Columns.concat(pending))
+        return segments + [name]
+
+    def _checkpoint(self, index, position, rows: int, segments: List[str]) -> dict:
+        """Record the partial index and `segments` (already spilled) as of `position`."""
+        self.checkpoints += 1
+        n = self.checkpoints
+        index_name = f"index-{n}.faiss"
+        faiss.write_index(index, str(self.checkpoint_dir / index_name))
+        with open(self.checkpoint_dir / index_name, "rb+") as f:
+            os.fsync(f.fileno())
+        state = {"settings": self.settings, "position": position, "rows": rows, "checkpoint": n,
+                 "index": index_name, "segments": segments}
+        with open(self.checkpoint_dir / "state.json.tmp", "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.checkpoint_dir / "state.json.tmp", self.checkpoint_dir / "state.json")
+        previous = self.checkpoint_dir / f"index-{n - 1}.faiss"
+        if previous.exists():
+            previous.unlink()
+        return state
+
+    # --- Build ---
+    def _train(self, vectors: List[np.ndarray], estimate: int):
+        vectors = np.concatenate(vectors)
+        # Size the lists for the whole corpus, but no more than the sample can train
+        n_train = min(len(vectors), self.train_sample)
+        nlist = self.settings["nlist"] or max(1, min(default_nlist(max(estimate, n_train)), n_train // 39))
+        index = make_index(vectors.shape[1], self.settings["index_type"], n_train, nlist,
+                           self.settings["pq_m"], self.settings["hnsw_m"], self.settings["metric"])
+        vectors = prepare_vectors(index, vectors)
+        train_index(index, vectors, self.train_sample)
+        index.add(vectors)
+        return index
+
+    def build(self, resume: bool = True):
+        """Build the index, save it to `index_dir` and return it."""
+        if self.embedder is not None:
+            return self._build(self.embedder, resume)
+        with EmbeddingPool(self.settings["model"], self.workers, self.threads) as pool:
+            print(f"[+] Embedding with {pool.workers} process(es) x {pool.threads} thread(s)")
+            return self._build(make_embedder(pool, self.settings["model"]), resume)
+
+    def _build(self, embedder, resume: bool):
+        state = self.load_checkpoint() if resume else None
+        if state is None:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+            state = {"position": None, "rows": 0, "checkpoint": 0, "segments": []}
+            index = None
+        else:
+            index = faiss.read_index(str(self.checkpoint_dir / state["index"]))
+            print(f"[+] Resuming from checkpoint {state['checkpoint']}: {state['rows']} entries already indexed")
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoints = state["checkpoint"]
+
+        position, rows, segments = state["position"], state["rows"], state["segments"]
+        estimate = self.source.estimated_rows()
+        pending: List[Columns] = []        # metadata of rows added since the last spill
+        untrained: List[np.ndarray] = []  # vectors held back until the training sample is full
+        last_checkpoint = time.monotonic()
+        with tqdm(total=estimate or None, initial=rows, unit="entries") as progress:
+            while True:
+                chunk, next_position = self.source.read_chunk(position, self.chunk_size)
+                if not chunk:
+                    break
+                vectors = embedder.encode([row["entry"] for row in chunk], batch_size=EMBED_BATCH_SIZE)
+                vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                if index is None:
+                    untrained.append(vectors)
+                    if sum(len(v) for v in untrained) >= self.train_sample or self.settings["index_type"] not in TRAINED_TYPES:
+                        index, untrained = self._train(untrained, estimate), []
+                else:
+                    index.add(prepare_vectors(index, vectors))
+                pending.append(Columns.from_rows(chunk))
+                position, rows = next_position, rows + len(chunk)
+                progress.update(len(chunk))
+
+                if sum(len(part) for part in pending) >= self.segment_rows:
+                    segments, pending = self._spill(segments, pending), []
+                if index is not None and time.monotonic() - last_checkpoint >= self.checkpoint_seconds:
+                    segments, pending = self._spill(segments, pending), []
+                    self._checkpoint(index, position, rows, segments)
+                    last_checkpoint = time.monotonic()
+
+        if index is None:
+            if not untrained:
+                raise ValueError(f"No journal entries in {self.source.name}")
+            index = self._train(untrained, estimate)
+
+        segments = self._spill(segments, pending)
+        # Views of the mapped segments: the writer streams them one after another
+        parts = [MetadataStore.open(self.checkpoint_dir / name).columns() for name in segments]
+        save_index(set_search_params(index), parts or [], self.index_dir)
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        return index
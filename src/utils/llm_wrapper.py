@@ -0,0 +1,22 @@
+from openai import OpenAI
+import threading
+
+# --- OpenAI Client ---
+# One client (and HTTP connection pool) per process, created on first use so
+# importing a module never needs OPENAI_API_KEY
+_client = None
+_lock = threading.Lock()
+
+def get_client() -> OpenAI:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = OpenAI()
+        return _client
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -1,13 +1,45 @@
 from pymongo import MongoClient
 import os
+import threading
 
 # --- Mongo Connection ---
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGO_DB_NAME", "journaling_db")
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# One pooled client per process, created on first use: MongoClient starts
+# monitor threads, which must not be created before a pre-fork server forks
+_client = None
+_lock = threading.Lock()
 
-# Collection references
-journal_entries = db["journal_entries"]
-users = db["users"]
\ No newline at end of file
+def get_client() -> MongoClient:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = MongoClient(MONGO_URI, maxPoolSize=MAX_POOL_SIZE)
+        return _client
+
+def get_db():
+    return get_client()[DB_NAME]
+
+def get_collection(name: str):
+    return get_db()[name]
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+# Collection references (`from src.utils.mongo_utils import journal_entries` still works, lazily)
+COLLECTIONS = ("journal_entries", "users")
+
+def __getattr__(name):
+    if name == "client":
+        return get_client()
+    if name == "db":
+        return get_db()
+    if name in COLLECTIONS:
+        return get_collection(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,88 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from src.api.readiness import Readiness, add_health_routes
+
+def poll(client, path, status, seconds=10.0):
+    deadline = time.monotonic() + seconds
+    while True:
+        response = client.get(path)
+        if response.status_code == status or time.monotonic() > deadline:
+            return response
+        time.sleep(0.01)
+
+# --- Readiness ---
+def readiness_app(readiness):
+    app = FastAPI()
+    add_health_routes(app, readiness)
+
+    @app.get("/work", dependencies=[Depends(readiness.require)])
+    def work():
+        return {"ok": True}
+
+    return app
+
+def test_readyz_turns_200_once_loaded_and_warmed_up():
+    loading = threading.Event()
+    readiness = Readiness("model", lambda: loading.wait(5), lambda: None)
+    client = TestClient(readiness_app(readiness))
+    loader = threading.Thread(target=readiness.run)
+    loader.start()
+    while readiness.state == "starting":
+        time.sleep(0.001)
+
+    assert client.get("/healthz").json() == {"status": "ok"}
+    response = client.get("/readyz")
+    assert response.status_code == 503 and response.json()["status"] == "loading"
+    blocked = client.get("/work")
+    assert blocked.status_code == 503 and blocked.headers["Retry-After"] == "1"
+
+    loading.set()
+    loader.join(5)
+    response = poll(client, "/readyz", 200)
+    assert response.status_code == 200 and response.json()["status"] == "ready"
+    assert {"load_seconds", "warmup_seconds"} <= set(response.json())
+    assert client.get("/work").json() == {"ok": True}
+
+def test_failed_warm_up_is_reported_and_keeps_requests_out():
+    def warm_up():
+        raise RuntimeError("CUDA out of memory")
+
+    readiness = Readiness("model", lambda: None, warm_up)
+    readiness.run()
+    client = TestClient(readiness_app(readiness))
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "failed" and "CUDA out of memory" in response.json()["error"]
+    assert client.get("/work").status_code == 503
+
+# --- Combined app ---
+def test_combined_app_becomes_ready_with_every_router_mounted(monkeypatch):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.api import enrichment_pipeline, main
+
+    # The smoke test is about wiring, not models: each service "loads" instantly. Routes hold on to the
+    # Readiness objects themselves, so patch them in place (monkeypatch restores them afterwards)
+    for readiness in [main.readiness, *(service.readiness for service in main.SERVICES)]:
+        for attr, value in {"state": "starting", "error": None, "loaded": False, "warmed": False, "timings": {}}.items():
+            monkeypatch.setattr(readiness, attr, value)
+    for service in main.SERVICES:
+        monkeypatch.setattr(service.readiness, "load", lambda: None)
+        monkeypatch.setattr(service.readiness, "warmup", None)
+    monkeypatch.setattr(enrichment_pipeline, "BACKFILL", False)
+
+    with TestClient(main.app) as client:
+        response = poll(client, "/readyz", 200)
+        assert response.status_code == 200, response.json()
+        paths = set(client.get("/openapi.json").json()["paths"])
+        assert {"/submit_entry", "/get_entries", "/enrichment/metrics", "/predict_emotions", "/predict_emotions/batch",
+                "/healthz", "/readyz", "/models"} <= paths
+        assert len(paths) > 10
+        assert client.get("/enrichment/metrics").json()["submitted"] == 0  # built by the lifespan
+    assert enrichment_pipeline.pipeline is None
@@ -0,0 +1,78 @@
+import pytest
+
+# --- Streaming classification ---
+def test_stream_lines_with_a_bad_threshold_get_their_own_error():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.api.emotion_api import parse_stream_line
+
+    assert parse_stream_line(b'{"text": "x", "threshold": 0.3}', 1)["threshold"] == 0.3
+    assert parse_stream_line(b'{"text": "x"}', 2) == {"text": "x"}
+    for bad in ('"high"', "1.5", "-0.1", "true", "null"):
+        item = parse_stream_line(f'{{"id": 7, "text": "x", "threshold": {bad}}}'.encode(), 3)
+        assert item["id"] == 7 and item["line"] == 3 and "threshold" in item["error"]
+
+# --- Backpressure ---
+@pytest.fixture
+def saturated_api(monkeypatch):
+    """The emotion app, ready, with an executor whose single slot is held until the returned event is set."""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    import threading
+    from fastapi.testclient import TestClient
+    from src.api import emotion_api
+    from src.models.inference_executor import InferenceExecutor
+
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+    monkeypatch.setattr(emotion_api, "executor", executor)
+    monkeypatch.setattr(emotion_api.readiness, "state", "ready")
+    monkeypatch.setattr(emotion_api, "classify_stream_chunk", lambda items, *_: [{"emotions": []} for _ in items])
+    release = threading.Event()
+    executor.submit(release.wait, 5)
+    yield TestClient(emotion_api.app), executor, release
+    release.set()
+    executor.shutdown()
+
+def test_saturated_executor_answers_429_with_retry_after(saturated_api):
+    from src.api.emotion_api import RETRY_AFTER_SECONDS
+
+    client, executor, _ = saturated_api
+    response = client.post("/predict_emotions/batch", json={"texts": ["a", "b"]})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == RETRY_AFTER_SECONDS
+    assert client.get("/metrics").json()["executor"]["rejected"] == 1
+
+def test_stream_waits_for_a_free_slot_instead_of_failing(saturated_api):
+    import threading
+
+    client, executor, release = saturated_api
+    responses = []
+    upload = threading.Thread(target=lambda: responses.append(
+        client.post("/predict_emotions/stream", content=b'{"text": "a"}\n{"text": "b"}\n')))
+    upload.start()
+    for _ in range(500):
+        if executor.stats()["waiting"] == 1:
+            break
+        upload.join(0.01)
+    assert executor.stats()["waiting"] == 1 and not responses
+    release.set()
+    upload.join(5)
+    assert responses[0].status_code == 200
+    assert responses[0].text.splitlines() == ['{"emotions": []}'] * 2
+    assert executor.stats()["rejected"] == 0
+
+def test_batch_and_stream_reject_out_of_range_thresholds(monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from fastapi.testclient import TestClient
+    from src.api import emotion_api
+
+    monkeypatch.setattr(emotion_api.readiness, "state", "ready")
+    client = TestClient(emotion_api.app)
+    for body in ({"texts": ["a"], "thresholds": [5]}, {"texts": ["a"], "thresholds": [-0.1]}, {"texts": ["a"], "threshold": 1.5}):
+        assert client.post("/predict_emotions/batch", json=body).status_code == 422
+    assert client.post("/predict_emotions", json={"text": "a", "threshold": 2}).status_code == 422
+    assert client.post("/predict_emotions/stream?threshold=5", content=b'{"text": "a"}\n').status_code == 422
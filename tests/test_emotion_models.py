@@ -0,0 +1,136 @@
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip("numpy")
+
+TEXTS = [
+    "Today was exhausting but fulfilling.",
+    "I felt lost again today. I kept comparing myself to my classmates and couldn't focus during lectures.",
+    "Relieved.",
+]
+
+# --- ONNX parity ---
+@pytest.fixture(scope="module")
+def backends():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    pytest.importorskip("onnxruntime")
+    from src.models import emotion_backends
+    if not (Path(emotion_backends.MODEL_PATH) / "config.json").exists():
+        pytest.skip(f"No fine-tuned classifier at {emotion_backends.MODEL_PATH}")
+    return emotion_backends
+
+@pytest.fixture(scope="module")
+def torch_backend(backends):
+    return backends.TorchEmotionBackend(backends.MODEL_PATH)
+
+@pytest.fixture(scope="module")
+def onnx_backend(tmp_path_factory, backends):
+    from src.models.export_onnx import export_onnx
+    root = tmp_path_factory.mktemp("onnx")
+    export_onnx(backends.MODEL_PATH, root, version="v1")
+    return backends.OnnxEmotionBackend(backends.resolve_onnx_artifact(root))
+
+def test_export_writes_versioned_artifact(onnx_backend):
+    assert onnx_backend.artifact_dir.name == "v1"
+    assert (onnx_backend.artifact_dir / "manifest.json").exists()
+    assert (onnx_backend.artifact_dir / "tokenizer_config.json").exists()
+
+def test_onnx_matches_torch_probabilities(backends, torch_backend, onnx_backend):
+    expected = torch_backend.predict_proba(TEXTS)
+    actual = onnx_backend.predict_proba(TEXTS)
+    assert actual.shape == (len(TEXTS), len(backends.LABELS))
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
+
+def test_onnx_single_text_matches_padded_batch(onnx_backend):
+    batched = onnx_backend.predict_proba(TEXTS)
+    for i, text in enumerate(TEXTS):
+        np.testing.assert_allclose(onnx_backend.predict_proba([text])[0], batched[i], atol=1e-4)
+
+# --- Tiny classifier ---
+@pytest.fixture(scope="module")
+def tiny_classifier(tmp_path_factory):
+    """A randomly initialized 4-layer BERT over a word-level vocabulary, with a 16-token context, saved to disk."""
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import BertConfig, BertForSequenceClassification, PreTrainedTokenizerFast
+    from src.models.emotion_backends import LABELS
+
+    words = sorted({w.strip(".,").lower() for t in TEXTS for w in t.split()})
+    vocab = {token: i for i, token in enumerate(["[PAD]", "[UNK]", "[CLS]", "[SEP]", *words])}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])])
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, model_max_length=16, pad_token="[PAD]",
+                                        unk_token="[UNK]", cls_token="[CLS]", sep_token="[SEP]")
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=4, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=32, num_labels=len(LABELS),
+                        problem_type="multi_label_classification")
+    path = tmp_path_factory.mktemp("tiny_classifier")
+    BertForSequenceClassification(config).eval().save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
+
+def window_encodings(tokenizer, text, stride):
+    encodings = tokenizer([text], truncation=True, stride=stride, return_overflowing_tokens=True)
+    keys = [k for k in tokenizer.model_input_names if k in encodings]
+    return [{k: encodings[k][i] for k in keys} for i in range(len(encodings["input_ids"]))]
+
+# --- Long entries ---
+def test_windows_fold_back_to_their_texts_with_max_or_mean(tiny_classifier):
+    from src.models.emotion_backends import TorchEmotionBackend
+
+    backend = TorchEmotionBackend(str(tiny_classifier))
+    long_text = " ".join(TEXTS * 4)  # ~80 tokens against a 14-token window
+    texts = [TEXTS[0], long_text, TEXTS[2]]
+    windows = window_encodings(backend.tokenizer, long_text, 7)  # the clamped stride: half a window
+    assert len(windows) > 3
+    per_window = np.stack([backend.predict_encoded([w])[0] for w in windows])
+
+    for aggregate, fold in (("max", per_window.max(axis=0)), ("mean", per_window.mean(axis=0))):
+        # A stride past half the window is clamped rather than stalling or raising
+        probs = backend.predict_proba_windows(texts, aggregate, stride=100, batch_size=4)
+        np.testing.assert_allclose(probs[1], fold, atol=1e-5)
+        np.testing.assert_allclose(probs[[0, 2]], backend.predict_proba([TEXTS[0], TEXTS[2]]), atol=1e-5)
+    with pytest.raises(ValueError):
+        backend.predict_proba_windows(texts, "median")
+
+# --- Quantization ---
+def test_quantized_model_round_trips_through_save_and_load(tiny_classifier, tmp_path):
+    import torch
+    from src.models.emotion_backends import INT8_WEIGHTS, TorchEmotionBackend, load_quantized_model
+    from src.models.quantize_emotion_classifier import quantize_and_save
+
+    quantize_and_save(tiny_classifier, tmp_path)
+    assert (tmp_path / INT8_WEIGHTS).exists() and (tmp_path / "config.json").exists()
+    model = load_quantized_model(str(tmp_path))
+    assert isinstance(model.classifier, torch.ao.nn.quantized.dynamic.Linear)
+
+    fp32 = TorchEmotionBackend(str(tiny_classifier)).predict_proba(TEXTS)
+    int8 = TorchEmotionBackend(str(tmp_path), quantized=True)
+    assert int8.name == "torch-int8"
+    # A randomly initialized model of this size differs by ~1e-2; int8 error stays well below that
+    np.testing.assert_allclose(int8.predict_proba(TEXTS), fp32, atol=2e-3)
+
+# --- Distillation ---
+def test_student_copies_evenly_spaced_teacher_layers_embeddings_and_head(tiny_classifier):
+    import torch
+    from transformers import AutoModelForSequenceClassification
+    from src.models.distill_emotion_classifier import student_from_teacher
+
+    teacher = AutoModelForSequenceClassification.from_pretrained(tiny_classifier)
+    student = student_from_teacher(teacher, 2)
+    assert student.config.num_hidden_layers == 2 and teacher.config.num_hidden_layers == 4
+
+    def same(a, b):
+        return all(torch.equal(x, y) for x, y in zip(a.state_dict().values(), b.state_dict().values()))
+
+    # linspace(0, 3, 2): the first and last of the teacher's 4 layers
+    layers_s, layers_t = student.bert.encoder.layer, teacher.bert.encoder.layer
+    assert same(layers_s[0], layers_t[0]) and same(layers_s[1], layers_t[3])
+    assert not same(layers_s[1], layers_t[1])
+    assert same(student.bert.embeddings, teacher.bert.embeddings) and same(student.classifier, teacher.classifier)
+    with pytest.raises(ValueError):
+        student_from_teacher(teacher, 5)
@@ -0,0 +1,121 @@
+import threading
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.api.enrichment_pipeline import EnrichmentPipeline, PipelineSaturated, Stage
+
+# --- Enrichment pipeline ---
+def test_pipeline_batches_marks_failures_and_stores_every_entry():
+    stored = []
+
+    def classify(items):
+        for item in items:
+            item["emotions"] = ["joy"]
+
+    def embed(items):
+        if any(item["entry"] == "boom" for item in items):
+            raise RuntimeError("embedder down")
+
+    stages = [
+        Stage("classify", classify, batch_size=4, max_wait_ms=5),
+        Stage("embed", embed, batch_size=4, max_wait_ms=50),
+        Stage("store", lambda items: stored.append(list(items)), batch_size=4, max_wait_ms=5, handle_errors=True),
+    ]
+    pipeline = EnrichmentPipeline(stages)
+    for i, text in enumerate(["a", "boom", "c"]):
+        pipeline.submit({"_id": i, "entry": text}, block=True)
+    pipeline.close(timeout=10)
+
+    items = {item["_id"]: item for batch in stored for item in batch}
+    assert sorted(items) == [0, 1, 2]
+    # Only the failing entry is marked, not the batch it was embedded with
+    assert "error" in items[1] and "error" not in items[0] and "error" not in items[2]
+    stats = pipeline.stats()
+    assert stats["completed"] == 3 and stats["stages"][1]["errors"] == 1
+
+def test_pipeline_rejects_when_first_queue_is_full():
+    release = threading.Event()
+    pipeline = EnrichmentPipeline([Stage("slow", lambda items: release.wait(), queue_size=1, batch_size=1)])
+    pipeline.submit({"_id": 0, "entry": "a"})
+    with pytest.raises(PipelineSaturated):
+        for i in range(1, 4):
+            pipeline.submit({"_id": i, "entry": "b"})
+    release.set()
+    pipeline.close(timeout=10)
+    assert pipeline.stats()["rejected"] == 1
+
+class FakeJournalCollection:
+    """The find_one_and_update subset `backfill` uses, over docs in `_id` order."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.lock = threading.Lock()
+
+    def _matches(self, doc, query):
+        if "$or" in query:
+            return any(self._matches(doc, q) for q in query["$or"])
+        for key, cond in query.items():
+            if isinstance(cond, dict):
+                if key not in doc or not doc[key] < cond["$lt"]:
+                    return False
+            elif doc.get(key) != cond:
+                return False
+        return True
+
+    def find_one_and_update(self, query, update, projection=None, sort=None):
+        with self.lock:
+            for doc in self.docs:
+                if self._matches(doc, query):
+                    doc.update(update["$set"])
+                    return {k: v for k, v in doc.items() if k == "_id" or k in projection}
+        return None
+
+def test_backfill_claims_each_pending_entry_once():
+    from datetime import datetime, timedelta
+
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    collection = FakeJournalCollection(
+        [{"_id": i, "entry": f"e{i}", "enrichment_status": "pending"} for i in range(20)]
+        + [{"_id": 20, "entry": "abandoned", "enrichment_status": "processing", "enrichment_claimed_at": long_ago},
+           {"_id": 21, "entry": "in flight", "enrichment_status": "processing", "enrichment_claimed_at": datetime.utcnow()},
+           {"_id": 22, "entry": "finished", "enrichment_status": "done"}]
+    )
+    queued = []
+    pipelines = [EnrichmentPipeline([Stage("record", lambda items: queued.extend(i["_id"] for i in items), max_wait_ms=5)])
+                 for _ in range(2)]
+    counts = []
+    threads = [threading.Thread(target=lambda p=p: counts.append(p.backfill(collection))) for p in pipelines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for p in pipelines:
+        p.close(timeout=10)
+
+    assert sum(counts) == 21 and sorted(queued) == list(range(21))
+    assert all(doc["enrichment_status"] == "processing" for doc in collection.docs[:21])
+
+def test_classify_stage_uses_the_apis_cached_prediction_path(monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.api import emotion_api
+    from src.api.enrichment_pipeline import classify_batch
+    from src.models.emotion_backends import LABELS
+    from src.models.emotion_cache import ProbabilityCache
+
+    computed = []
+
+    def predict(texts, batch_size):
+        computed.extend(texts)
+        return np.stack([np.eye(len(LABELS), dtype=np.float32)[len(t)] for t in texts])
+
+    monkeypatch.setattr(emotion_api, "backend", object())
+    monkeypatch.setattr(emotion_api, "cache", ProbabilityCache("v1"))
+    monkeypatch.setattr(emotion_api, "_predict_bucketed", predict)
+    emotion_api.cache.put("a", np.eye(len(LABELS), dtype=np.float32)[5])
+    items = [{"entry": "a"}, {"entry": "bb"}]
+    classify_batch(items)
+    assert computed == ["bb"]
+    assert [item["emotions"] for item in items] == [[LABELS[5]], [LABELS[2]]]
@@ -0,0 +1,100 @@
+import threading
+import time
+import pytest
+
+from src.models.micro_batcher import MicroBatcher
+
+# --- Micro-batcher ---
+def blocked_batcher(batch_fn=None, **kwargs):
+    """A batcher whose first batch waits on the returned event, so later submits queue up behind it."""
+    release, started, batches = threading.Event(), threading.Event(), []
+
+    def run(items):
+        batches.append(list(items))
+        if len(batches) == 1:
+            started.set()
+            release.wait(5)
+        return batch_fn(items) if batch_fn else [item.upper() for item in items]
+
+    return MicroBatcher(run, **kwargs), started, release, batches
+
+def test_batches_stay_within_the_token_budget_and_carry_the_item_that_did_not_fit():
+    batcher, started, release, batches = blocked_batcher(max_wait_ms=50, max_batch_size=8, max_batch_tokens=100)
+    first = batcher.submit("a", cost=10)
+    assert started.wait(5)
+    futures = [batcher.submit(text, cost) for text, cost in [("b", 10), ("c", 10), ("d", 40), ("e", 10)]]
+    release.set()
+    assert [f.result(5) for f in [first, *futures]] == ["A", "B", "C", "D", "E"]
+    # (2 + 1) rows x 40 tokens would pass 100, so "d" opens the next batch
+    assert batches == [["a"], ["b", "c"], ["d", "e"]]
+    assert batcher.stats()["batches"] == 3 and batcher.stats()["items"] == 5
+    batcher.close(timeout=5)
+
+def test_batch_failures_reach_every_caller_and_the_worker_keeps_going():
+    def flaky(items):
+        if "boom" in items:
+            raise RuntimeError("model down")
+        return [] if "short" in items else items
+
+    batcher, started, release, _ = blocked_batcher(flaky, max_wait_ms=50)
+    batcher.submit("warm")
+    assert started.wait(5)
+    failed = [batcher.submit(text) for text in ("boom", "x")]
+    release.set()
+    for future in failed:
+        with pytest.raises(RuntimeError, match="model down"):
+            future.result(5)
+
+    # Too few results must not leave callers waiting forever
+    with pytest.raises(ValueError, match="returned 0 results"):
+        batcher.submit("short").result(5)
+    assert batcher.predict("z") == "z"
+    batcher.close(timeout=5)
+
+def test_close_drains_queued_items_then_refuses_new_ones():
+    batcher, started, release, _ = blocked_batcher(max_wait_ms=1, max_batch_size=1)
+    first = batcher.submit("a")
+    assert started.wait(5)
+    queued = batcher.submit("b")
+    closer = threading.Thread(target=batcher.close, kwargs={"timeout": 5})
+    closer.start()
+    release.set()
+    closer.join()
+    assert first.result(5) == "A" and queued.result(5) == "B"
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit("c")
+    never_started = MicroBatcher(lambda items: items)
+    never_started.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        never_started.submit("d")
+
+# --- Inference executor ---
+def wait_until(condition, seconds=5.0):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def test_executor_rejects_past_max_pending_or_waits_for_a_slot():
+    from src.models.inference_executor import ExecutorSaturated, InferenceExecutor
+
+    executor = InferenceExecutor(max_workers=1, max_pending=1)
+    release = threading.Event()
+    first = executor.submit(release.wait, 5)
+    wait_until(lambda: executor.stats()["running"] == 1)
+    with pytest.raises(ExecutorSaturated):
+        executor.submit(str, "rejected")
+    with pytest.raises(ExecutorSaturated):
+        executor.submit(str, "timed out", block=True, timeout=0.01)
+
+    queued = []
+    waiter = threading.Thread(target=lambda: queued.append(executor.submit(str, "waited", block=True)))
+    waiter.start()
+    wait_until(lambda: executor.stats()["waiting"] == 1)
+    release.set()
+    waiter.join(5)
+    assert first.result(5) and queued[0].result(5) == "waited"
+    wait_until(lambda: executor.stats()["completed"] == 2)
+    stats = executor.stats()
+    assert stats["rejected"] == 2 and stats["running"] == 0 and stats["queue_depth"] == 0 and stats["waiting"] == 0
+    executor.shutdown()
@@ -0,0 +1,95 @@
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.models.emotion_cache import ProbabilityCache, artifact_fingerprint
+from src.models.token_batching import padding_stats, plan_batches
+
+TEXTS = [
+    "Today was exhausting but fulfilling.",
+    "I felt lost again today. I kept comparing myself to my classmates and couldn't focus during lectures.",
+    "Relieved.",
+]
+
+# --- Probability cache ---
+def test_cache_hits_ignore_whitespace_and_count_evictions():
+    cache = ProbabilityCache("v1", max_entries=2)
+    cache.put("I felt  calm ", np.full(28, 0.3))
+    assert cache.get("I felt calm") is not None
+    assert cache.get("something else") is None
+
+    cache.put("b", np.zeros(28))
+    cache.put("c", np.zeros(28))
+    assert cache.get("I felt calm") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 1
+
+def test_cache_disk_tier_survives_restart_and_invalidates_on_new_version(tmp_path):
+    db = tmp_path / "cache.sqlite"
+    probs = np.linspace(0, 1, 28, dtype=np.float32)
+    ProbabilityCache("v1", disk_path=db).put("entry", probs)
+
+    reopened = ProbabilityCache("v1", disk_path=db)
+    np.testing.assert_array_equal(reopened.get("entry"), probs)
+    assert reopened.stats()["disk_hits"] == 1
+
+    # A restart with a new artifact purges the old version's rows
+    assert ProbabilityCache("v2", disk_path=db).get("entry") is None
+    assert ProbabilityCache("v1", disk_path=db).get("entry") is None
+
+def test_artifact_fingerprint_changes_with_weights(tmp_path):
+    (tmp_path / "config.json").write_text("{}")
+    before = artifact_fingerprint(tmp_path)
+    (tmp_path / "model.safetensors").write_bytes(b"weights")
+    assert artifact_fingerprint(tmp_path) != before
+
+# --- Token-budget batching ---
+def test_plan_batches_respects_budget_and_isolates_long_inputs():
+    lengths = [5, 500, 7, 6, 512, 8, 5]
+    batches = plan_batches(lengths, max_tokens=1024, max_batch_size=4)
+    assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+    assert all(len(b) * max(lengths[i] for i in b) <= 1024 for b in batches)
+    assert padding_stats(lengths, batches)["padding_waste"] < padding_stats(lengths, [list(range(7))])["padding_waste"]
+
+# --- Batch CLI ---
+def test_byte_ranges_cover_every_line_once(tmp_path):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.models.predict_emotions import line_ranges, read_lines
+
+    path = tmp_path / "entries.jsonl"
+    path.write_bytes(b"".join(f'{{"entry": "{t * (i + 1)}"}}\n'.encode() for i, t in enumerate(TEXTS * 5)))
+    lines = []
+    for start, end in line_ranges(path, 4):
+        with open(path, "rb") as f:
+            lines += [line for line, _ in read_lines(f, start, end)]
+    assert b"".join(lines) == path.read_bytes()
+
+def test_malformed_lines_are_skipped_counted_and_not_retried_on_resume(tmp_path):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from src.models.emotion_backends import LABELS
+    from src.models.predict_emotions import load_checkpoint, tag_file
+
+    class FakeBackend:
+        def __init__(self, fail_after=None):
+            self.calls, self.fail_after = 0, fail_after
+
+        def predict_proba(self, texts, batch_size=32):
+            self.calls += 1
+            if self.calls == self.fail_after:
+                raise KeyboardInterrupt
+            return np.zeros((len(texts), len(LABELS)), dtype=np.float32)
+
+    path, output = tmp_path / "entries.jsonl", tmp_path / "tagged.jsonl"
+    lines = [b'{"entry": "a"}', b'{"entry": "b"', b'{"entry": "c"}', b'[1, 2]', b'{"entry": "d"}', b'{"entry": "e"}']
+    path.write_bytes(b"\n".join(lines) + b"\n")
+    with pytest.raises(KeyboardInterrupt):
+        tag_file(str(path), str(output), FakeBackend(fail_after=2), chunk_size=2)
+    assert load_checkpoint(output)["skipped_offsets"] == [len(lines[0]) + 1]
+
+    state = tag_file(str(path), str(output), FakeBackend(), chunk_size=2, resume=True)
+    assert state["records"] == 4 and state["skipped"] == 2
+    assert state["skipped_offsets"] == [len(b"".join(lines[:i])) + i for i in (1, 3)]
+    assert [json.loads(line)["entry"] for line in output.read_bytes().splitlines()] == ["a", "c", "d", "e"]
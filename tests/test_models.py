@@ -0,0 +1,64 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+# --- Model registry ---
+def test_registry_loads_each_key_once_across_threads_and_reloads_after_unload():
+    import threading
+    from src.models.registry import ModelRegistry
+
+    calls = []
+    registry = ModelRegistry()
+    registry.register_loader("fake", lambda name, variant, device: calls.append(name) or object())
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("fake", "m"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len({id(r) for r in results}) == 1
+    assert registry.stats()[0]["hits"] == 8
+
+    assert registry.unload("fake", "m")
+    assert registry.get("fake", "m") is not results[0]
+    assert len(calls) == 2
+
+# --- Embedding cache ---
+def test_embedding_cache_encodes_only_unseen_texts_and_shares_the_disk_tier(tmp_path):
+    from src.models.embedding_cache import EmbeddingCache
+
+    class CountingEncoder:
+        def __init__(self):
+            self.seen = []
+
+        def encode(self, texts, batch_size=32):
+            self.seen += texts
+            return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+
+    encoder = CountingEncoder()
+    cache = EmbeddingCache("fake-model", tmp_path, lru_size=2, encoder=encoder)
+    first = cache.encode(["a cat", "a dog", "a cat"])
+    assert encoder.seen == ["a cat", "a dog"] and first.shape == (3, 3)
+    assert np.array_equal(cache.encode(["a  cat ", "banana"])[0], first[0])
+    assert encoder.seen[2:] == ["banana"]
+
+    # A vector written without its key (a crash between the two appends) is dropped on the next write
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes())
+    cache.encode(["a bird"])
+
+    restarted = EmbeddingCache("fake-model", tmp_path, encoder=CountingEncoder())
+    assert np.array_equal(restarted.encode(["a dog", "banana", "a bird"]), cache.encode(["a dog", "banana", "a bird"]))
+    assert restarted._encoder.seen == [] and restarted.stats()["disk_hits"] == 3
+    assert cache.stats()["evictions"] > 0
+
+# --- Parallel embedding ---
+def test_choose_split_fills_the_cores_and_respects_memory_and_overrides():
+    from src.models.parallel_embedding import choose_split
+
+    assert choose_split(cpus=1) == (1, 1)
+    assert choose_split(cpus=8) == (4, 2)
+    assert choose_split(cpus=32) == (8, 4)
+    assert choose_split(cpus=32, memory_mb=1500, worker_mb=700) == (2, 4)
+    assert choose_split(cpus=8, workers=2) == (2, 4)
+    assert choose_split(cpus=8, threads=1) == (8, 1)
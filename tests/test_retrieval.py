@@ -0,0 +1,317 @@
+import threading
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+
+# --- Retriever ---
+class FakeEncoder:
+    def encode(self, texts):
+        return np.array([[float(len(t)), 0.0] for t in texts], dtype=np.float32)
+
+def write_index(index_dir, entries):
+    faiss = pytest.importorskip("faiss")
+    from src.rag.build_faiss_index import save_index
+
+    index = faiss.IndexFlatL2(2)
+    index.add(FakeEncoder().encode([e["entry"] for e in entries]))
+    save_index(index, entries, index_dir)
+
+def test_retriever_hot_reloads_when_index_files_change(tmp_path, monkeypatch):
+    pytest.importorskip("faiss")
+    from src.rag.retrieve_user_history import Retriever
+
+    monkeypatch.setattr(Retriever, "model", FakeEncoder())
+    write_index(tmp_path, [{"user_id": "u1", "entry": "abc"}])
+    retriever = Retriever(tmp_path / "journal_index.faiss", tmp_path / "journal_metadata.cols", reload_check_seconds=0)
+    assert retriever.search("xyz", "u1") == ["abc"]
+
+    write_index(tmp_path, [{"user_id": "u1", "entry": "abc"}, {"user_id": "u2", "entry": "defg"}])
+    retriever.search("xyz")  # notices the change and reloads in the background
+    for _ in range(100):
+        if retriever.stats()["entries"] == 2:
+            break
+        time.sleep(0.02)
+    assert retriever.search("wxyz", "u2", top_k=1) == ["defg"]
+    assert retriever.stats()["reloads"] == 2
+
+def test_retriever_falls_back_to_legacy_pickle_metadata(tmp_path, monkeypatch):
+    import pickle
+    faiss = pytest.importorskip("faiss")
+    from src.rag.retrieve_user_history import Retriever
+
+    monkeypatch.setattr(Retriever, "model", FakeEncoder())
+    index = faiss.IndexFlatL2(2)
+    index.add(FakeEncoder().encode(["abc"]))
+    faiss.write_index(index, str(tmp_path / "journal_index.faiss"))
+    retriever = Retriever(tmp_path / "journal_index.faiss", tmp_path / "journal_metadata.cols", reload_check_seconds=0)
+    with pytest.raises(FileNotFoundError, match="src.rag.metadata_store"):
+        retriever.load()
+
+    with open(tmp_path / "journal_metadata.pkl", "wb") as f:
+        pickle.dump([{"user_id": "u1", "entry": "abc"}], f)
+    assert retriever.search("xyz", "u1") == ["abc"]
+
+def test_readers_see_whole_versions_while_new_ones_are_published(tmp_path, monkeypatch):
+    pytest.importorskip("faiss")
+    from src.rag.build_faiss_index import KEEP_VERSIONS
+    from src.rag.retrieve_user_history import Retriever
+
+    monkeypatch.setattr(Retriever, "model", FakeEncoder())
+
+    def publish(version):
+        write_index(tmp_path, [{"user_id": "u1", "entry": f"{version}:" + "x" * i} for i in range(5)])
+
+    publish(0)
+    retriever = Retriever(tmp_path / "journal_index.faiss", tmp_path / "journal_metadata.cols", reload_check_seconds=0)
+    retriever.load()
+    seen, errors = [], []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            try:
+                found = retriever.search("xyz", "u1", top_k=5)
+                versions = {entry.split(":")[0] for entry in found}
+                assert len(found) == 5 and len(versions) == 1, found
+                seen.append(versions.pop())
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for t in readers:
+        t.start()
+    for version in range(1, 20):
+        publish(version)
+        time.sleep(0.01)
+    for _ in range(200):
+        if seen and seen[-1] == "19":
+            break
+        time.sleep(0.01)
+    stop.set()
+    for t in readers:
+        t.join()
+
+    assert not errors
+    assert seen[-1] == "19" and len(set(seen)) > 2
+    assert len(list((tmp_path / "versions").iterdir())) == KEEP_VERSIONS
+    assert not (tmp_path / "journal_index.faiss").exists()
+
+def test_user_search_returns_top_k_from_the_users_own_entries():
+    faiss = pytest.importorskip("faiss")
+    from src.rag.retrieve_user_history import IndexSnapshot
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, 8), dtype=np.float32)
+    index = faiss.IndexFlatL2(8)
+    index.add(vectors)
+    # u1 owns a handful of rows; a global top_k * 2 search would almost never reach them
+    metadata = [{"user_id": "u1" if i % 100 == 7 else "u2"} for i in range(500)]
+    snapshot = IndexSnapshot(index, metadata)
+
+    query = rng.standard_normal(8, dtype=np.float32)
+    rows = snapshot.search(query, "u1", top_k=3)
+    own = np.arange(7, 500, 100)
+    nearest = own[np.argsort(((vectors[own] - query) ** 2).sum(axis=1))]
+    assert rows.tolist() == nearest[:3].tolist()
+    assert snapshot.search(query, "u1", top_k=10).tolist() == nearest.tolist()  # all 5 the user has
+    assert len(snapshot.search(query, "nobody")) == 0
+
+def test_cosine_index_ranks_by_angle_and_normalizes_delta_vectors():
+    pytest.importorskip("faiss")
+    from src.rag.build_faiss_index import build_faiss_index
+    from src.rag.incremental_index import Delta
+    from src.rag.retrieve_user_history import IndexSnapshot
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 8), dtype=np.float32) * rng.uniform(0.1, 10, (300, 1)).astype(np.float32)
+    metadata = [{"id": str(i), "user_id": "u1" if i % 10 == 3 else "u2"} for i in range(300)]
+    index = build_faiss_index(vectors, "flat-fp16", metric="cosine")
+    query = rng.standard_normal(8, dtype=np.float32)
+    cosine = vectors @ query / np.linalg.norm(vectors, axis=1)
+    own = np.arange(3, 300, 10)
+    assert IndexSnapshot(index, metadata).search(query, top_k=3).tolist() == np.argsort(-cosine)[:3].tolist()
+    assert IndexSnapshot(index, metadata).search(query, "u1", top_k=3).tolist() == own[np.argsort(-cosine[own])][:3].tolist()
+
+    # A short vector pointing at the query beats long ones pointing elsewhere
+    store = IndexSnapshot(index, metadata).metadata
+    delta = Delta([("upsert", ["new"], 0.01 * query[None], [{"id": "new", "user_id": "u1"}])], store, 300, 8, True)
+    snapshot = IndexSnapshot(index, metadata, delta=delta)
+    assert snapshot.search(query, "u1", top_k=1).tolist() == [300]
+    assert snapshot.search(query, top_k=1).tolist() == [300]
+
+# --- Index types ---
+@pytest.mark.parametrize("index_type,min_recall", [("ivf-flat", 0.9), ("ivf-pq", 0.6), ("hnsw", 0.9)])
+def test_approximate_indexes_round_trip_through_the_retriever(tmp_path, monkeypatch, index_type, min_recall):
+    faiss = pytest.importorskip("faiss")
+    from src.rag import retrieve_user_history
+    from src.rag.build_faiss_index import build_faiss_index, save_index
+    from src.rag.retrieve_user_history import Retriever
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 16)).astype(np.float32) * 4
+    vectors = centers[rng.integers(0, 20, 2000)] + rng.standard_normal((2000, 16)).astype(np.float32)
+    queries = centers[rng.integers(0, 20, 50)] + rng.standard_normal((50, 16)).astype(np.float32)
+
+    class TableEncoder:
+        # Entries are their row number, queries "q<n>"
+        def encode(self, texts):
+            return np.stack([queries[int(t[1:])] if t.startswith("q") else vectors[int(t)] for t in texts])
+
+    save_index(build_faiss_index(vectors, index_type, pq_m=8), [{"user_id": "u1", "entry": str(i)} for i in range(2000)], tmp_path)
+    monkeypatch.setattr(Retriever, "model", TableEncoder())
+    monkeypatch.setattr(retrieve_user_history, "NPROBE", 8)
+    monkeypatch.setattr(retrieve_user_history, "EF_SEARCH", 48)
+    retriever = Retriever(tmp_path / "journal_index.faiss", tmp_path / "journal_metadata.cols")
+    retriever.load()
+
+    index = retriever._snapshot.index
+    assert index.ntotal == 2000
+    if index_type == "hnsw":
+        assert index.hnsw.efSearch == 48
+    else:
+        assert faiss.extract_index_ivf(index).nprobe == 8
+
+    exact = faiss.IndexFlatL2(16)
+    exact.add(vectors)
+    _, truth = exact.search(queries, 10)
+    found = [retriever.search(f"q{j}", top_k=10) for j in range(len(queries))]
+    recall = np.mean([len(set(map(int, rows)) & set(truth[j].tolist())) / 10 for j, rows in enumerate(found)])
+    assert recall >= min_recall, recall
+
+# --- Incremental index ---
+def entries_of(retriever, user_id=None):
+    return sorted(retriever.search("x", user_id, top_k=10))
+
+def test_incremental_index_upserts_deletes_and_compacts(tmp_path, monkeypatch):
+    pytest.importorskip("faiss")
+    from src.rag.incremental_index import IncrementalIndex
+    from src.rag.retrieve_user_history import Retriever
+
+    monkeypatch.setattr(Retriever, "model", FakeEncoder())
+    write_index(tmp_path, [{"id": "a", "user_id": "u1", "entry": "abc"}, {"id": "b", "user_id": "u1", "entry": "abcdef"}])
+    index = IncrementalIndex(tmp_path, compact_bytes=2**30)
+    retriever = Retriever(tmp_path / "journal_index.faiss", tmp_path / "journal_metadata.cols")
+
+    index.add(FakeEncoder().encode(["abcd"]), [{"id": "c", "user_id": "u2", "entry": "abcd"}])
+    index.upsert(FakeEncoder().encode(["abcdefgh"]), [{"id": "a", "user_id": "u1", "entry": "abcdefgh"}])
+    index.delete(["b"])
+    retriever.load()
+    assert entries_of(retriever) == ["abcd", "abcdefgh"]
+    assert entries_of(retriever, "u1") == ["abcdefgh"]
+    assert retriever.stats()["delta_entries"] == 2
+
+    assert index.compact()
+    assert not (tmp_path / "journal_index.log").exists()
+    retriever.load()
+    assert entries_of(retriever) == ["abcd", "abcdefgh"]
+    assert entries_of(retriever, "u2") == ["abcd"]
+    assert retriever.stats()["delta_entries"] == 0 and retriever.stats()["entries"] == 2
+
+def test_delta_log_survives_torn_writes_and_interrupted_compaction(tmp_path, monkeypatch):
+    pytest.importorskip("faiss")
+    from src.rag.incremental_index import IncrementalIndex, encode_record, read_log
+    from src.rag.retrieve_user_history import Retriever
+
+    monkeypatch.setattr(Retriever, "model", FakeEncoder())
+
+    def row(key):
+        return FakeEncoder().encode([key]), [{"id": key, "user_id": "u1", "entry": key}]
+
+    log = tmp_path / "journal_index.log"
+    IncrementalIndex(tmp_path).add(*row("a"))
+    with open(log, "ab") as f:  # a writer died halfway through a frame
+        f.write(encode_record("upsert", ["zz"], *row("zz"))[:20])
+    IncrementalIndex(tmp_path).add(*row("bb"))  # a restarted writer drops the torn tail first
+    records, end = read_log(log)
+    assert [r[1] for r in records] == [["a"], ["bb"]] and end == log.stat().st_size
+
+    # Crash after a compaction moved the log aside, with new writes since
+    log.rename(tmp_path / "journal_index.log.merging")
+    index = IncrementalIndex(tmp_path)
+    index.add(*row("ccc"))
+    retriever = Retriever(tmp_path / "journal_index.faiss", tmp_path / "journal_metadata.cols")
+    retriever.load()
+    assert entries_of(retriever) == ["a", "bb", "ccc"]
+
+    # Crash after the merged base was written but before the merged log was removed: replay is idempotent
+    merged_log = (tmp_path / "journal_index.log.merging").read_bytes()
+    assert index.compact()
+    (tmp_path / "journal_index.log.merging").write_bytes(merged_log)
+    retriever.load()
+    assert entries_of(retriever) == ["a", "bb", "ccc"]
+    assert index.compact() and index.compact()  # finishes the leftover, then merges the live log
+    retriever.load()
+    assert entries_of(retriever) == ["a", "bb", "ccc"] and retriever.stats()["delta_entries"] == 0
+
+# --- Metadata store ---
+def test_metadata_store_round_trips_rows_and_indexes_users_and_ids(tmp_path):
+    import pickle
+    from src.rag.metadata_store import Columns, MetadataStore, load_metadata, write_metadata
+
+    rows = [
+        {"id": "b", "user_id": "u2", "entry": "zwei", "emotions": ["joy"]},
+        {"id": "a", "user_id": "u1", "entry": "één"},
+        {"user_id": None, "entry": "anonymous"},
+        {"id": "c", "user_id": "u2", "entry": ""},
+    ]
+    write_metadata(tmp_path / "m.cols", rows)
+    store = MetadataStore.open(tmp_path / "m.cols")
+    assert len(store) == 4 and store.n_users == 2
+    assert store[0] == {"id": "b", "user_id": "u2", "entry": "zwei", "emotions": ["joy"]}
+    assert store.entry(1) == "één" and store[2]["id"] is None
+    assert store.user_rows("u2").tolist() == [0, 3] and len(store.user_rows("nobody")) == 0
+    assert store.find(["c", "a", "missing"]).tolist() == [3, 1, -1]
+
+    merged = MetadataStore.from_rows(Columns.concat([store.take([3, 1]), Columns.from_rows([{"id": "d", "entry": "neu"}])]))
+    assert [row["id"] for row in merged] == ["c", "a", "d"]
+
+    # Several parts are written as one file, their blobs streamed from the mapped source
+    write_metadata(tmp_path / "parts.cols", [store.columns(), Columns.from_rows([{"id": "d", "user_id": "u1", "entry": "neu"}])])
+    parts = MetadataStore.open(tmp_path / "parts.cols")
+    assert [parts.entry(i) for i in range(5)] == ["zwei", "één", "anonymous", "", "neu"]
+    assert parts.user_rows("u1").tolist() == [1, 4] and parts.find(["d"]).tolist() == [4]
+
+    with open(tmp_path / "m.pkl", "wb") as f:
+        pickle.dump(rows, f)
+    assert load_metadata(tmp_path / "m.pkl").user_rows("u1").tolist() == [1]
+
+# --- Streaming build ---
+def test_streaming_build_resumes_from_its_last_checkpoint(tmp_path):
+    pytest.importorskip("faiss")
+    from src.rag.build_faiss_index import current_version
+    from src.rag.metadata_store import MetadataStore
+    from src.rag.streaming_build import JsonlSource, StreamingIndexBuilder
+
+    class CountingEncoder:
+        def __init__(self):
+            self.seen = []
+
+        def encode(self, texts, batch_size=32):
+            self.seen += texts
+            return FakeEncoder().encode(texts)
+
+    class CrashingSource(JsonlSource):
+        def read_chunk(self, position, chunk_size):
+            if position and position > path.stat().st_size // 2:
+                raise KeyboardInterrupt
+            return super().read_chunk(position, chunk_size)
+
+    path = tmp_path / "journals.jsonl"
+    texts = ["x" * (i + 1) for i in range(20)]
+    path.write_text("".join(f'{{"user_id": "u{i % 3}", "entry": "{t}"}}\n' for i, t in enumerate(texts)) + "not json\n")
+    first = CountingEncoder()
+    with pytest.raises(KeyboardInterrupt):
+        StreamingIndexBuilder(CrashingSource(path), tmp_path, "flat", chunk_size=4, checkpoint_seconds=0,
+                              embedder=first, segment_rows=4).build()
+    assert (tmp_path / "build_checkpoint" / "state.json").exists()
+
+    second = CountingEncoder()
+    # Checkpoint rarely but spill every chunk: metadata must not wait for the timer
+    index = StreamingIndexBuilder(JsonlSource(path), tmp_path, "flat", chunk_size=4, checkpoint_seconds=3600,
+                                  embedder=second, segment_rows=4).build()
+    assert first.seen + second.seen == texts
+    assert index.ntotal == 20 and not (tmp_path / "build_checkpoint").exists()
+    metadata = MetadataStore.open(current_version(tmp_path) / "journal_metadata.cols")
+    assert [metadata.entry(i) for i in range(20)] == texts
+    assert len(metadata.user_rows("u0")) == 7